@@ -3,26 +3,30 @@ import os
 import json
 import uuid
 import logging
-import asyncio
 from datetime import datetime
 from pydantic import BaseModel
-from typing import Any, List, Dict
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
+from typing import Any, List, Dict, Optional
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.responses import PlainTextResponse
 
 repo_root = os.path.dirname(__file__)
 if repo_root not in os.sys.path:
     os.sys.path.insert(0, repo_root)
 
 # import pipelines
-from eval_pipeline.eval_1_3 import pipeline as pipeline_1_3
-from eval_pipeline.eval_1_2 import pipeline as pipeline_1_2
+from eval_pipeline.eval_1_3 import pipeline_async as pipeline_1_3
+from eval_pipeline.eval_1_2 import pipeline_async as pipeline_1_2
+from modules.llm_clients import close_async_clients
+from modules.storage import DATA_DIR
+from modules.job_queue import JobQueue, JobStore, JOB_WORKERS, pipeline_limit_from_env, job_summary
+from modules.metrics import metrics
 
 from dotenv import load_dotenv
 load_dotenv(os.path.join(repo_root, ".env"))
 
 API_KEY = os.getenv("EVAL_API_KEY", "change-me")
-INPUT_DIR = os.getenv("EVAL_INPUT_DIR", "/home/azureuser/eval_data/inputs")
-OUTPUT_DIR = os.getenv("EVAL_OUTPUT_DIR", "/home/azureuser/eval_data/outputs")
+INPUT_DIR = os.getenv("EVAL_INPUT_DIR", os.path.join(DATA_DIR, "inputs"))
+OUTPUT_DIR = os.getenv("EVAL_OUTPUT_DIR", os.path.join(DATA_DIR, "outputs"))
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -38,12 +42,38 @@ class AdCopyEvalRequest(BaseModel):
     brand: str
     date: str
     data: List[Any]  # same as top_k_trends
+    bypass_cache: bool = False  # re-run every judge call instead of reusing cached results
 
 
 class KeywordEvalRequest(BaseModel):
     brand: str
     date: str
     data: Dict[str, Any]  # search_volume_analysis + trend_analysis
+    bypass_cache: bool = False
+
+
+# ---------- Lifecycle ----------
+
+@app.on_event("startup")
+async def startup():
+    # resumes jobs that were queued or running when the server last stopped
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+    # release the pooled keep-alive connections held by the shared LLM clients
+    await close_async_clients()
+
+
+# ---------- Auth ----------
+
+def _check_api_key(x_api_key: Optional[str]):
+    if API_KEY == "change-me":
+        logger.warning("EVAL_API_KEY is the default; set a secure value in .env")
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
 
 # ---------- Routes ----------
@@ -53,12 +83,15 @@ async def health():
     return {"status": "ok", "time": datetime.utcnow().isoformat()}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Call latency/token/cost, stage and job metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/run-ad-copy-eval")
-async def run_ad_copy_eval(req: AdCopyEvalRequest, background_tasks: BackgroundTasks, x_api_key: str = Header(None)):
-    if API_KEY == "change-me":
-        logger.warning("EVAL_API_KEY is the default; set a secure value in .env")
-    if x_api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+async def run_ad_copy_eval(req: AdCopyEvalRequest, x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
 
     job_id = uuid.uuid4().hex[:8]
     input_filename = f"adcopy_input_{req.brand}_{req.date}_{job_id}.json"
@@ -71,17 +104,14 @@ async def run_ad_copy_eval(req: AdCopyEvalRequest, background_tasks: BackgroundT
         json.dump(payload, f, ensure_ascii=False, indent=2)
 
     logger.info("Received Ad Copy job %s: brand=%s date=%s input=%s", job_id, req.brand, req.date, input_path)
-    background_tasks.add_task(_run_pipeline_background, pipeline_1_3, input_path, output_path, req.brand, job_id)
+    job_queue.submit(job_id, "ad_copy", req.brand, req.date, input_path, output_path, {"bypass_cache": req.bypass_cache})
 
     return {"status": "accepted", "job_id": job_id}
 
 
 @app.post("/run-keyword-eval")
-async def run_keyword_eval(req: KeywordEvalRequest, background_tasks: BackgroundTasks, x_api_key: str = Header(None)):
-    if API_KEY == "change-me":
-        logger.warning("EVAL_API_KEY is the default; set a secure value in .env")
-    if x_api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+async def run_keyword_eval(req: KeywordEvalRequest, x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
 
     job_id = uuid.uuid4().hex[:8]
     input_filename = f"keyword_input_{req.brand}_{req.date}_{job_id}.json"
@@ -94,17 +124,49 @@ async def run_keyword_eval(req: KeywordEvalRequest, background_tasks: Background
         json.dump(payload, f, ensure_ascii=False, indent=2)
 
     logger.info("Received Keyword job %s: brand=%s date=%s input=%s", job_id, req.brand, req.date, input_path)
-    background_tasks.add_task(_run_pipeline_background, pipeline_1_2, input_path, output_path, req.brand, job_id)
+    job_queue.submit(job_id, "keyword", req.brand, req.date, input_path, output_path, {"bypass_cache": req.bypass_cache})
 
     return {"status": "accepted", "job_id": job_id}
 
 
-# ---------- Background runner ----------
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    job = job_queue.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job_summary(job)
+
+
+@app.get("/jobs")
+async def list_jobs(
+    brand: Optional[str] = None,
+    date: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+    jobs = job_queue.store.list(brand=brand, date=date, status=status, limit=limit)
+    return {"jobs": [job_summary(job) for job in jobs]}
+
+
+# ---------- Job runner ----------
 
-async def _run_pipeline_background(pipeline_func, input_path: str, output_path: str, brand: str, job_id: str):
+async def _run_job(pipeline_func, job: Dict[str, Any]):
+    job_id = job["job_id"]
+    output_path = job["output_path"]
     try:
         logger.info("Starting pipeline for job %s", job_id)
-        result = await asyncio.to_thread(pipeline_func, input_path, output_path, brand)
+        result = await pipeline_func(
+            job["input_path"],
+            output_path,
+            job["brand"],
+            progress_callback=lambda done, total: job_queue.store.update_progress(job_id, done, total),
+            # a job re-queued after a restart picks up from its checkpoint
+            resume=job["attempts"] > 1,
+            **job["options"],
+        )
         status_path = output_path + ".status.json"
         with open(status_path, "w", encoding="utf-8") as f:
             json.dump(
@@ -113,8 +175,24 @@ async def _run_pipeline_background(pipeline_func, input_path: str, output_path:
                 indent=2,
             )
         logger.info("Pipeline finished for job %s, result saved to %s", job_id, output_path)
+        return result
     except Exception as e:
         logger.exception("Pipeline failed for job %s: %s", job_id, str(e))
         fail_path = output_path + ".failed.json"
         with open(fail_path, "w", encoding="utf-8") as f:
             json.dump({"job_id": job_id, "error": str(e), "time": datetime.utcnow().isoformat()}, f, indent=2)
+        raise
+
+
+job_queue = JobQueue(
+    JobStore(),
+    runners={
+        "ad_copy": lambda job: _run_job(pipeline_1_3, job),
+        "keyword": lambda job: _run_job(pipeline_1_2, job),
+    },
+    workers=JOB_WORKERS,
+    pipeline_limits={
+        "ad_copy": pipeline_limit_from_env("ad_copy", JOB_WORKERS),
+        "keyword": pipeline_limit_from_env("keyword", JOB_WORKERS),
+    },
+)
@@ -1,20 +1,36 @@
 import json
 import os
-import re
+import asyncio
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-import pandas as pd
-from langfuse import observe, get_client
+from langfuse import get_client
 
 from prompts.prompts import instruction_prompt_newsletter_summary,instruction_prompt_newsletter_trend
-from modules.eval_functions import evaluate
-from modules.get_company_context import get_company_context
+from modules.quarantine import QUARANTINED, QuarantinedError, evaluate_or_quarantine
+from modules.cassettes import CassetteMissError
+from modules.get_company_context import get_company_context_async
+from modules.result_cache import result_cache
+from modules.concurrency import gather_bounded, resolve_concurrency
+from modules.checkpoint import Checkpoint, item_key, run_checkpointed
+from modules.result_sink import ResultSink, WRITE_NDJSON, ndjson_path_for
+from modules.batch import batch_judge_outputs, check_mode
+from modules.rubrics import get_rubric, score_output
+from modules.tracing import TraceScores, traced, update_current_trace
+from modules.metrics import metrics
+from modules.preflight import SKIPPED, screen_summary, screen_trend, skip_counts
 
 langfuse = get_client()
 
+# Scoring rubric per evaluation type; also the schema of the structured judge output
+RUBRICS = {"trend": get_rubric("keyword_trend"), "summary": get_rubric("keyword_summary")}
 
-@observe(as_type="retriever", name="Load Keyword Data")
+# CSV column order of the result rows (summary rows leave "trend" empty, trend rows "summary").
+# "trend" stays last, where the original DataFrame output put it; consumers may read by position.
+RESULT_FIELDS = ["type", "summary", "normalized_score", "score_summary", "reasoning", "status", "trend"]
+
+
+@traced(as_type="retriever", name="Load Keyword Data")
 def load_suggestion_data(file_path: str):
     """Load keyword JSON (with search_volume_analysis + trend_analysis)."""
     with open(file_path, "r", encoding="utf-8") as f:
@@ -22,80 +38,29 @@ def load_suggestion_data(file_path: str):
     return data
 
 
-@observe(as_type="span", name="Parse Evaluation Scores")
+def summary_datapoint(summary_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a top_branded/top_non_branded block that is sent to the judge."""
+    return {"summary": summary_data.get("summary", ""), "keywords": summary_data.get("keywords", [])}
+
+
+@traced(as_type="span", name="Parse Evaluation Scores")
 def parse_scores_for_single_output(llm_output: str, evaluation_type: str ="trend"):
     """
     Parse dimension scores and return all scores for comprehensive logging.
     Returns detailed breakdown for CSV + all individual scores for Langfuse.
     """
-    if evaluation_type == "trend":
-        dimensions = {
-            "strategic": 0.2,
-            "non_obvious": 0.15,
-            "specificity": 0.15,
-            "impactful": 0.2,
-            "actionable": 0.3
-        }
-    elif evaluation_type == "summary":
-        dimensions = {
-            "clarity": 0.33,
-            "coverage": 0.34,
-            "correctness": 0.33
-        }
-    else:
+    if evaluation_type not in RUBRICS:
         raise ValueError(f"Unknown evaluation_type: {evaluation_type}")
-    
-    parsed_scores = {}
-    weighted_scores = {}
-
-    llm_output = llm_output.strip()
-    if llm_output.startswith("```"):
-        llm_output = re.sub(r"^```(?:json)?", "", llm_output, flags=re.IGNORECASE).strip()
-        llm_output = re.sub(r"```$", "", llm_output).strip()
-    
-    try:
-        output_dict = json.loads(llm_output)
-    except json.JSONDecodeError as e:
-        with open("broken_llm_output_1_2.json", "w", encoding="utf-8") as f:
-            f.write(llm_output)
-        raise ValueError(f"Invalid JSON from LLM: {e}")
-
-    for dim, weight in dimensions.items():
-        if dim in output_dict and "score" in output_dict[dim]:
-            parsed_scores[dim] = int(output_dict[dim]["score"])
-            weighted_scores[dim] = parsed_scores[dim] * weight
-        else:
-            parsed_scores[dim] = None
-            weighted_scores[dim] = 0.0
-
-    weighted_total = sum(weighted_scores.values())
-    avg_score = weighted_total / len(dimensions)
-    normalized_pct = (weighted_total / 3.0) * 100
- 
-    summary_lines = []
-    for dim, weight in dimensions.items():
-        summary_lines.append(
-            f"{dim}: {parsed_scores[dim]} × {weight} = {weighted_scores[dim]:.2f}"
-        )
-    summary_lines.append(f"\nWeighted Total: {weighted_total:.2f}")
-    summary_lines.append(f"Average Score: {avg_score:.2f} out of 3.0")
-    summary_lines.append(f"Normalized Score: {normalized_pct:.2f}%")
-
-    return {
-        "normalized_score": normalized_pct,
-        "detailed_summary": "\n".join(summary_lines),
-        "raw_scores": parsed_scores,
-        "weighted_total": weighted_total,
-        "avg_score": avg_score
-    }
+    return score_output(RUBRICS[evaluation_type], llm_output)
 
 
-@observe(as_type="chain", name="Branded Evaluation")
-def evaluate_branded_summary(branded_data: Dict[str, Any], full_instruction_prompt: str, brand: str, trace_id: str):
+@traced(as_type="chain", name="Branded Evaluation", capture_input="hash")
+async def evaluate_branded_summary(branded_data: Dict[str, Any], full_instruction_prompt: List[str], brand: str, trace_id: str, bypass_cache: bool = False,
+                                   batch_output: Optional[str] = None):
     """Evaluate the top_branded summary + keywords context."""
     summary = branded_data.get("summary", "")
     keywords = branded_data.get("keywords", [])
-    langfuse.update_current_trace(
+    update_current_trace(
        name=f"{brand} Keyword Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={
             "brand": brand,
@@ -106,49 +71,55 @@ def evaluate_branded_summary(branded_data: Dict[str, Any], full_instruction_prom
         user_id=f"raghvendra"
     )
     try:
-        datapoint = {"summary": summary, "keywords": keywords}
-        llm_output = evaluate(datapoint, full_instruction_prompt)
+        datapoint = summary_datapoint(branded_data)
+        cache_key, llm_output = result_cache.lookup(full_instruction_prompt, datapoint, bypass=bypass_cache)
+        from_cache = llm_output is not None
+        if not from_cache and batch_output is not None:
+            llm_output = batch_output
+        elif not from_cache:
+            llm_output = await evaluate_or_quarantine(
+                datapoint, full_instruction_prompt, RUBRICS["summary"].dimensions, label=f"{brand} branded summary"
+            )
         score_results = parse_scores_for_single_output(llm_output,evaluation_type="summary")
+        if not from_cache:
+            result_cache.put(cache_key, llm_output)
         normalized_score = score_results["normalized_score"]
 
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
 
-        # Attach all scores to the same top-level trace
+        # Attach scores to this item's span so concurrently evaluated items stay distinguishable
         for dim, score in score_results["raw_scores"].items():
             if score is not None:
-                langfuse.create_score(
+                scores.add(
                     name=f"branded_{dim}_score",
                     value=score,
-                    trace_id=trace_id,
                     data_type="NUMERIC",
                 )
 
         # Log weighted total score
-        langfuse.create_score(
+        scores.add(
             name="branded_weighted_total_score",
             value=score_results["weighted_total"],
-            trace_id=trace_id,
             data_type="NUMERIC", 
             comment=f"Weighted total score for Branded (Brand: {brand}). Sum of all dimension scores × weights."
         )
         
         # Log average score
-        langfuse.create_score(
+        scores.add(
             name="branded_average_score",
             value=score_results["avg_score"],
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Average weighted score for Branded (Brand: {brand}). Weighted total ÷ number of dimensions."
         )
         
         # Log final normalized percentage score
-        langfuse.create_score(
+        scores.add(
             name="branded_normalized_percentage",
             value=normalized_score,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Final normalized percentage score (0-100%) for Branded (Brand: {brand}). Primary evaluation metric."
         )
+        scores.emit()
         
         print(f" Branded Keywords summary scored: {normalized_score:.1f}%")
         
@@ -161,47 +132,46 @@ def evaluate_branded_summary(branded_data: Dict[str, Any], full_instruction_prom
             "status": "success",
         }
         
+    except CassetteMissError:
+        # replay needs every request recorded; a miss fails the run, not just the item
+        raise
     except Exception as e:
         # Log failed evaluation with zero scores for all dimensions
         print(f" Error evaluating trend Branded Summary: {e}")
         
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
         
         # Log zero scores for all dimensions
-        dimensions = ["clarity", "coverage", "correctness"]
-        for dim in dimensions:
-            langfuse.create_score(
+        for dim in RUBRICS["summary"].dimensions:
+            scores.add(
                 name=f"branded_{dim}_score",
                 value=0,
-                trace_id=trace_id,
                 data_type="NUMERIC",
                 comment=f"Failed evaluation - {dim} score set to 0 for Branded Summary. Error: {str(e)}"
             )
         
         # Log zero aggregate scores
-        langfuse.create_score(
+        scores.add(
             name="branded_weighted_total_score",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - weighted total set to 0 for Branded Summary. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="branded_average_score", 
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - average score set to 0 for Branded Summary. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="branded_normalized_percentage",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - normalized percentage set to 0 for Branded Summary. Error: {str(e)}"
         )
+        scores.emit()
         
         return {
             "type": "branded_summary",
@@ -209,17 +179,18 @@ def evaluate_branded_summary(branded_data: Dict[str, Any], full_instruction_prom
             "normalized_score": 0.0,
             "score_summary": f"Error: {str(e)}",
             "reasoning":"EVALUATION FAILED",
-            "status": "success",
+            "status": QUARANTINED if isinstance(e, QuarantinedError) else "failed",
         }
 
         
 
-@observe(as_type="chain", name="Non Branded Evaluation")
-def evaluate_nonbranded_summary(nonbranded_data: Dict[str, Any], full_instruction_prompt: str, brand: str, trace_id: str):
+@traced(as_type="chain", name="Non Branded Evaluation", capture_input="hash")
+async def evaluate_nonbranded_summary(nonbranded_data: Dict[str, Any], full_instruction_prompt: List[str], brand: str, trace_id: str, bypass_cache: bool = False,
+                                      batch_output: Optional[str] = None):
     """Evaluate the top_non_branded summary + keywords context."""
     summary = nonbranded_data.get("summary", "")
     keywords = nonbranded_data.get("keywords", [])
-    langfuse.update_current_trace(
+    update_current_trace(
        name=f"{brand} Keyword Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={
             "brand": brand,
@@ -230,49 +201,55 @@ def evaluate_nonbranded_summary(nonbranded_data: Dict[str, Any], full_instructio
         user_id=f"raghvendra"
     )
     try:
-        datapoint = {"summary": summary, "keywords": keywords}
-        llm_output = evaluate(datapoint, full_instruction_prompt)
+        datapoint = summary_datapoint(nonbranded_data)
+        cache_key, llm_output = result_cache.lookup(full_instruction_prompt, datapoint, bypass=bypass_cache)
+        from_cache = llm_output is not None
+        if not from_cache and batch_output is not None:
+            llm_output = batch_output
+        elif not from_cache:
+            llm_output = await evaluate_or_quarantine(
+                datapoint, full_instruction_prompt, RUBRICS["summary"].dimensions, label=f"{brand} non-branded summary"
+            )
         score_results = parse_scores_for_single_output(llm_output, evaluation_type="summary")
+        if not from_cache:
+            result_cache.put(cache_key, llm_output)
         normalized_score = score_results["normalized_score"]
 
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
 
-        # Attach all scores to the same top-level trace
+        # Attach scores to this item's span so concurrently evaluated items stay distinguishable
         for dim, score in score_results["raw_scores"].items():
             if score is not None:
-                langfuse.create_score(
+                scores.add(
                     name=f"non_branded_{dim}_score",
                     value=score,
-                    trace_id=trace_id,
                     data_type="NUMERIC",
                 )
 
         # Log weighted total score
-        langfuse.create_score(
+        scores.add(
             name="non_branded_weighted_total_score",
             value=score_results["weighted_total"],
-            trace_id=trace_id,
             data_type="NUMERIC", 
             comment=f"Weighted total score for Non Branded (Brand: {brand}). Sum of all dimension scores × weights."
         )
         
         # Log average score
-        langfuse.create_score(
+        scores.add(
             name="non_branded_average_score",
             value=score_results["avg_score"],
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Average weighted score for Non Branded (Brand: {brand}). Weighted total ÷ number of dimensions."
         )
         
         # Log final normalized percentage score
-        langfuse.create_score(
+        scores.add(
             name="non_branded_normalized_percentage",
             value=normalized_score,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Final normalized percentage score (0-100%) for Non Branded (Brand: {brand}). Primary evaluation metric."
         )
+        scores.emit()
         
         print(f"Non Branded Keywords summary scored: {normalized_score:.1f}%")
         
@@ -285,47 +262,46 @@ def evaluate_nonbranded_summary(nonbranded_data: Dict[str, Any], full_instructio
             "status": "success",
         }
         
+    except CassetteMissError:
+        # replay needs every request recorded; a miss fails the run, not just the item
+        raise
     except Exception as e:
         # Log failed evaluation with zero scores for all dimensions
         print(f" Error evaluating trend Non Branded Summary: {e}")
         
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
         
         # Log zero scores for all dimensions
-        dimensions = ["clarity", "coverage", "correctness"]
-        for dim in dimensions:
-            langfuse.create_score(
+        for dim in RUBRICS["summary"].dimensions:
+            scores.add(
                 name=f"non_branded_{dim}_score",
                 value=0,
-                trace_id=trace_id,
                 data_type="NUMERIC",
                 comment=f"Failed evaluation - {dim} score set to 0 for Non Branded Summary. Error: {str(e)}"
             )
         
         # Log zero aggregate scores
-        langfuse.create_score(
+        scores.add(
             name="non_branded_weighted_total_score",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - weighted total set to 0 for Non Branded Summary. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="non_branded_average_score", 
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - average score set to 0 for Non Branded Summary. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="non_branded_normalized_percentage",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - normalized percentage set to 0 for Non Branded Summary. Error: {str(e)}"
         )
+        scores.emit()
         
         return {
             "type": "non branded_summary",
@@ -333,16 +309,17 @@ def evaluate_nonbranded_summary(nonbranded_data: Dict[str, Any], full_instructio
             "normalized_score": 0.0,
             "score_summary": f"Error: {str(e)}",
             "reasoning":"EVALUATION FAILED",
-            "status": "success",
+            "status": QUARANTINED if isinstance(e, QuarantinedError) else "failed",
         }
         
 
-@observe(as_type="chain", name="Single Trend Evaluation")
-def evaluate_single_trend(datapoint: Dict[str, Any], full_instruction_prompt: str, trend_index: int, total_trends: int, brand: str, trace_id: str):
+@traced(as_type="chain", name="Single Trend Evaluation", capture_input="hash")
+async def evaluate_single_trend(datapoint: Dict[str, Any], full_instruction_prompt: List[str], trend_index: int, total_trends: int, brand: str, trace_id: str, bypass_cache: bool = False,
+                                batch_output: Optional[str] = None):
     """Evaluate a single trend analysis datapoint."""
     trend_text = datapoint.get("trend", "N/A")
 
-    langfuse.update_current_trace(
+    update_current_trace(
        name=f"{brand} Keyword Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={
             "brand": brand,
@@ -358,53 +335,59 @@ def evaluate_single_trend(datapoint: Dict[str, Any], full_instruction_prompt: st
     # Step 2: Run the actual evaluation process (this creates sub-traces)
     try:
         # Get LLM evaluation (this will be traced as sub-process)
-        llm_output = evaluate(datapoint, full_instruction_prompt)
+        cache_key, llm_output = result_cache.lookup(full_instruction_prompt, datapoint, bypass=bypass_cache)
+        from_cache = llm_output is not None
+        if not from_cache and batch_output is not None:
+            llm_output = batch_output
+        elif not from_cache:
+            llm_output = await evaluate_or_quarantine(
+                datapoint, full_instruction_prompt, RUBRICS["trend"].dimensions, label=f"{brand} trend {trend_index}"
+            )
         
         # Parse scores (this will be traced as sub-process) 
         score_results = parse_scores_for_single_output(llm_output, evaluation_type="trend")
+        if not from_cache:
+            result_cache.put(cache_key, llm_output)
         
         normalized_score = score_results["normalized_score"]
         
         # Step 3: Log ALL scores to Langfuse
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
         
         # Log individual dimension scores (1-3 scale)
         for dim, score in score_results["raw_scores"].items():
             if score is not None:
-                langfuse.create_score(
+                scores.add(
                     name=f"{dim}_score",
                     value=score,
-                    trace_id=trace_id,
                     data_type="NUMERIC",
                     comment=f"{dim.replace('_', ' ').title()} evaluation score (1-3 scale) for trend: {trend_index}"
                 )
         
         # Log weighted total score
-        langfuse.create_score(
+        scores.add(
             name="weighted_total_score",
             value=score_results["weighted_total"],
-            trace_id=trace_id,
             data_type="NUMERIC", 
             comment=f"Weighted total score for {trend_index} (Brand: {brand}). Sum of all dimension scores × weights."
         )
         
         # Log average score
-        langfuse.create_score(
+        scores.add(
             name="average_score",
             value=score_results["avg_score"],
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Average weighted score for {trend_index} (Brand: {brand}). Weighted total ÷ number of dimensions."
         )
         
         # Log final normalized percentage score
-        langfuse.create_score(
+        scores.add(
             name="normalized_percentage",
             value=normalized_score,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Final normalized percentage score (0-100%) for {trend_index} (Brand: {brand}). Primary evaluation metric."
         )
+        scores.emit()
         
         print(f" Trend '{trend_index}' scored: {normalized_score:.1f}%")
         
@@ -417,47 +400,46 @@ def evaluate_single_trend(datapoint: Dict[str, Any], full_instruction_prompt: st
             "status": "success",
         }
         
+    except CassetteMissError:
+        # replay needs every request recorded; a miss fails the run, not just the item
+        raise
     except Exception as e:
         # Log failed evaluation with zero scores for all dimensions
         print(f" Error evaluating trend '{trend_index}': {e}")
         
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
         
         # Log zero scores for all dimensions
-        dimensions = ["strategic", "non_obvious", "specificity", "impactful", "actionable"]
-        for dim in dimensions:
-            langfuse.create_score(
+        for dim in RUBRICS["trend"].dimensions:
+            scores.add(
                 name=f"{dim}_score",
                 value=0,
-                trace_id=trace_id,
                 data_type="NUMERIC",
                 comment=f"Failed evaluation - {dim} score set to 0 for {trend_index}. Error: {str(e)}"
             )
         
         # Log zero aggregate scores
-        langfuse.create_score(
+        scores.add(
             name="weighted_total_score",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - weighted total set to 0 for {trend_index}. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="average_score", 
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - average score set to 0 for {trend_index}. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="normalized_percentage",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - normalized percentage set to 0 for {trend_index}. Error: {str(e)}"
         )
+        scores.emit()
         
         return {
             "type": "trend_analysis",
@@ -465,19 +447,79 @@ def evaluate_single_trend(datapoint: Dict[str, Any], full_instruction_prompt: st
             "normalized_score": 0.0,
             "score_summary": f"Error: {str(e)}",
             "reasoning": "EVALUATION FAILED",
-            "status": "failed"
+            "status": QUARANTINED if isinstance(e, QuarantinedError) else "failed"
         }
 
 
-@observe(as_type="chain", name="Keyword Evaluation Pipeline 1.2")
-def pipeline(input_path: str, output_path: str, brand: str):
-    """Main pipeline for keyword analysis evaluation (1.2)."""
-    data = load_suggestion_data(input_path)
+def preflight_reason(evaluate_item, item: Any) -> Optional[str]:
+    """Pre-flight screening for one entry of the pipeline's evaluation list."""
+    if evaluate_item is evaluate_single_trend:
+        # keyword trends carry their content alongside "trend" rather than under "analysis"
+        return screen_trend(item, require_analysis=False)
+    return screen_summary(item)
+
+
+def skipped_row(evaluate_item, item: Any, reason: str) -> Dict[str, Any]:
+    """Result row for an item rejected by pre-flight screening; no judge call is made."""
+    item = item if isinstance(item, dict) else {}
+    row = {"normalized_score": None, "score_summary": f"Skipped: {reason}", "reasoning": "", "status": SKIPPED}
+    if evaluate_item is evaluate_single_trend:
+        return {"type": "trend_analysis", "trend": item.get("trend", "N/A"), **row}
+    row_type = "branded_summary" if evaluate_item is evaluate_branded_summary else "non branded_summary"
+    return {"type": row_type, "summary": item.get("summary", ""), **row}
 
-    results = []
+
+def pipeline(input_path: str, output_path: str, brand: str, **options):
+    """Blocking entry point for scripts; runs pipeline_async on a fresh event loop."""
+    return asyncio.run(pipeline_async(input_path, output_path, brand, **options))
+
+
+@traced(as_type="chain", name="Keyword Evaluation Pipeline 1.2")
+async def pipeline_async(input_path: str, output_path: str, brand: str, max_concurrency: int = None, bypass_cache: bool = False,
+                         progress_callback=None, resume: bool = False, ndjson: bool = None, mode: str = "interactive"):
+    """
+    Main pipeline for keyword analysis evaluation (1.2).
+
+    Every segment's branded/non-branded summary and every trend is an
+    independent judge call; they all run concurrently with up to
+    max_concurrency calls in flight (defaults to EVAL_MAX_CONCURRENCY).
+    CSV rows keep the order in which the items appear in the input.
+    bypass_cache forces fresh judge calls instead of reusing cached results.
+    progress_callback(done, total) is called as each summary/trend finishes.
+
+    Successful items are checkpointed to <output_path>.checkpoint.jsonl as
+    they complete; resume=True only evaluates the items that are missing.
+    The checkpoint is removed once a run has no failed items.
+
+    Rows are streamed to the CSV (and, with ndjson=True or
+    EVAL_RESULT_NDJSON=1, to a sibling .ndjson file) as they finish.
+    Returns a job summary rather than the rows themselves.
+
+    mode="batch" submits every item not already checkpointed or cached
+    through the Message Batches API before scoring (see modules.batch).
+
+    Items failing pre-flight screening (empty summary/keywords, missing
+    trend, oversized payload) are written as "skipped" rows without a
+    judge call.
+    """
+    check_mode(mode)
+    # The context fetch is the slowest setup step and depends on nothing but
+    # the brand, so it runs while the input and checkpoint are loaded.
+    context_task = asyncio.create_task(get_company_context_async(brand))
+    try:
+        with metrics.stage("load_input"):
+            data, checkpoint = await asyncio.gather(
+                asyncio.to_thread(load_suggestion_data, input_path),
+                asyncio.to_thread(Checkpoint.for_output, output_path, resume),
+            )
+    except BaseException:
+        context_task.cancel()
+        raise
+    if resume:
+        print(f" Resuming: {len(checkpoint.completed)} items already checkpointed")
 
     # Create a single top-level trace for the whole pipeline
-    trace_id = langfuse.update_current_trace(
+    trace_id = update_current_trace(
         name=f"{brand} Keyword Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={"brand": brand, "evaluation_type": "pipeline"},
         tags=["pipeline", "keyword-analysis", brand.lower()],
@@ -487,53 +529,95 @@ def pipeline(input_path: str, output_path: str, brand: str):
     search_volume_analysis = data.get("search_volume_analysis", {})
     is_segmented = search_volume_analysis.get("is_segmented", False)
 
-    full_prompt = instruction_prompt_newsletter_summary + "\n\n" + get_company_context(brand)
+    with metrics.stage("company_context"):
+        company_context = await context_task
+    # kept as separate segments so evaluate() can cache the shared prefix
+    summary_prompt = [instruction_prompt_newsletter_summary, company_context]
+    trend_prompt = [instruction_prompt_newsletter_trend, company_context]
+
+    # Collect every evaluation first so progress can report a fixed total;
+    # each entry also carries the (datapoint, prompt) its judge call receives
+    evaluations = []
     if is_segmented:
         segmented = search_volume_analysis.get("segmented_analysis", {})
         for segment_name, segment_data in segmented.items():
             # Branded inside segment
             branded = segment_data.get("top_branded", {})
             if branded:
-                results.append(
-                    evaluate_branded_summary(
-                        branded, 
-                        full_prompt, 
-                        f"{brand} - {segment_name}",
-                        trace_id
-                    )
-                )
+                evaluations.append((item_key(f"branded:{segment_name}", 0, branded), evaluate_branded_summary, (branded, summary_prompt, f"{brand} - {segment_name}", trace_id, bypass_cache), (summary_datapoint(branded), summary_prompt, RUBRICS["summary"].dimensions)))
 
             # Non-branded inside segment
             nonbranded = segment_data.get("top_non_branded", {})
             if nonbranded:
-                results.append(
-                    evaluate_nonbranded_summary(
-                        nonbranded, 
-                        full_prompt, 
-                        f"{brand} - {segment_name}",
-                        trace_id
-                    )
-                )
+                evaluations.append((item_key(f"non_branded:{segment_name}", 0, nonbranded), evaluate_nonbranded_summary, (nonbranded, summary_prompt, f"{brand} - {segment_name}", trace_id, bypass_cache), (summary_datapoint(nonbranded), summary_prompt, RUBRICS["summary"].dimensions)))
 
     else:
         # Existing normal mode
         branded = search_volume_analysis.get("top_branded", {})
         if branded:
-            results.append(evaluate_branded_summary(branded, full_prompt, brand,trace_id))
+            evaluations.append((item_key("branded", 0, branded), evaluate_branded_summary, (branded, summary_prompt, brand, trace_id, bypass_cache), (summary_datapoint(branded), summary_prompt, RUBRICS["summary"].dimensions)))
 
         nonbranded = search_volume_analysis.get("top_non_branded", {})
         if nonbranded:
-            results.append(evaluate_nonbranded_summary(nonbranded, full_prompt, brand,trace_id))
+            evaluations.append((item_key("non_branded", 0, nonbranded), evaluate_nonbranded_summary, (nonbranded, summary_prompt, brand, trace_id, bypass_cache), (summary_datapoint(nonbranded), summary_prompt, RUBRICS["summary"].dimensions)))
+
     # Trend Analysis
-    
-    full_prompt = instruction_prompt_newsletter_trend + "\n\n" + get_company_context(brand)
-    
     trends = data.get("trend_analysis", [])
     for idx, trend in enumerate(trends, 1):
-        results.append(evaluate_single_trend(trend, full_prompt, idx, len(trends), brand, trace_id))
+        evaluations.append((item_key("trend", idx, trend), evaluate_single_trend, (trend, trend_prompt, idx, len(trends), brand, trace_id, bypass_cache), (trend, trend_prompt, RUBRICS["trend"].dimensions)))
+
+    skip_reasons = [preflight_reason(evaluate_item, args[0]) for _, evaluate_item, args, _ in evaluations]
+    skipped = skip_counts(skip_reasons)
+    if skipped:
+        print(f" Pre-flight: skipping {sum(skipped.values())} items {skipped}")
+
+    batch_outputs = [None] * len(evaluations)
+    if mode == "batch":
+        with metrics.stage("batch_prefetch"):
+            batch_outputs = await batch_judge_outputs(
+                [judge_input for _, _, _, judge_input in evaluations],
+                skip=[
+                    reason is not None or checkpoint.get(key) is not None
+                    for (key, _, _, _), reason in zip(evaluations, skip_reasons)
+                ],
+                bypass_cache=bypass_cache,
+            )
 
-    # Save results to CSV
-    df = pd.DataFrame(results)
-    df.to_csv(output_path, index=False)
+    write_ndjson = WRITE_NDJSON if ndjson is None else ndjson
+    ndjson_path = ndjson_path_for(output_path) if write_ndjson else None
+
+    total_items = len(evaluations)
+    if progress_callback is not None:
+        progress_callback(0, total_items)
+    with ResultSink(RESULT_FIELDS, csv_path=output_path, ndjson_path=ndjson_path) as sink:
+        async def evaluate_and_write(i, key, evaluate_item, args, batch_output):
+            await sink.wait_for_room(i)
+            if skip_reasons[i] is not None:
+                row = skipped_row(evaluate_item, args[0], skip_reasons[i])
+            else:
+                row = await run_checkpointed(checkpoint, key, evaluate_item, *args, batch_output)
+            sink.add(i, row)
+            return row["status"]
+
+        with metrics.stage("evaluate_items"):
+            statuses = await gather_bounded(
+                evaluate_and_write,
+                [(i, key, evaluate_item, args, batch_output)
+                 for i, ((key, evaluate_item, args, _), batch_output) in enumerate(zip(evaluations, batch_outputs))],
+                max_concurrency=resolve_concurrency(max_concurrency),
+                progress_callback=progress_callback,
+            )
+    if not checkpoint.finish(statuses):
+        print(f" Some items failed; rerun with resume=True to retry only those ({checkpoint.path})")
+    successful = statuses.count("success")
 
-    return results
+    return {
+        "status": "success",
+        "total_items": total_items,
+        "successful": successful,
+        "skipped": sum(skipped.values()),
+        "quarantined": statuses.count(QUARANTINED),
+        "skipped_reasons": skipped,
+        "output_path": output_path,
+        "success_rate": (successful / total_items) * 100 if total_items > 0 else 0,
+    }
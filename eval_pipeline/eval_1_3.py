@@ -3,17 +3,32 @@ import anthropic
 import json
 import sys
 import os
-import pandas as pd
-import re
-from langfuse import observe,get_client
+import asyncio
+from langfuse import get_client
 from prompts.prompts import instruction_prompt_1_3
-from modules.eval_functions import evaluate
-from modules.get_company_context import get_company_context
+from modules.quarantine import QUARANTINED, QuarantinedError, evaluate_or_quarantine
+from modules.cassettes import CassetteMissError
+from modules.get_company_context import get_company_context_async
+from modules.concurrency import gather_bounded, resolve_concurrency
+from modules.result_cache import result_cache
+from modules.checkpoint import Checkpoint, item_key, run_checkpointed
+from modules.result_sink import ResultSink, WRITE_NDJSON, ndjson_path_for
+from modules.batch import batch_judge_outputs, check_mode
+from modules.rubrics import get_rubric, score_output
+from modules.tracing import TraceScores, traced, update_current_trace
+from modules.metrics import metrics
+from modules.preflight import SKIPPED, screen_trend, skip_counts
 from datetime import datetime
 
 langfuse = get_client()
 
-@observe(as_type="retriever", name="Load Trend Data")
+# Scoring rubric (dimensions, weights, scale); also the schema of the structured judge output
+RUBRIC = get_rubric("ad_copy_trend")
+
+# CSV column order of the result rows built by evaluate_single_trend
+RESULT_FIELDS = ["trend", "industry_score", "normalized_score", "analysis", "score_summary", "reasoning", "status"]
+
+@traced(as_type="retriever", name="Load Trend Data")
 def load_suggestion_data(file_path: str):
     """Load Ad copy analysis json and return list of top_k_trends as dicts."""
     
@@ -22,73 +37,24 @@ def load_suggestion_data(file_path: str):
     return data.get("top_k_trends", [])
 
 
-@observe(as_type="span", name="Parse Evaluation Scores")
+@traced(as_type="span", name="Parse Evaluation Scores")
 def parse_scores_for_single_output(llm_output: str):
     """
     Parse dimension scores and return all scores for comprehensive logging.
     Returns detailed breakdown for CSV + all individual scores for Langfuse.
     """
-    dimensions = {
-        "strategic": 0.2,
-        "non_obvious": 0.1,
-        "specificity": 0.2,
-        "impactful": 0.2,
-        "clarity": 0.1,
-        "actionable": 0.2
-    }
-    
-    parsed_scores = {}
-    weighted_scores = {}
+    return score_output(RUBRIC, llm_output)
 
-    llm_output = llm_output.strip()
-    if llm_output.startswith("```"):
-        llm_output = re.sub(r"^```(?:json)?", "", llm_output, flags=re.IGNORECASE).strip()
-        llm_output = re.sub(r"```$", "", llm_output).strip()
-    
-    try:
-        output_dict = json.loads(llm_output)
-    except json.JSONDecodeError as e:
-        with open("broken_llm_output.json", "w", encoding="utf-8") as f:
-            f.write(llm_output)
-        raise ValueError(f"Invalid JSON from LLM: {e}")
-
-    for dim, weight in dimensions.items():
-        if dim in output_dict and "score" in output_dict[dim]:
-            parsed_scores[dim] = int(output_dict[dim]["score"])
-            weighted_scores[dim] = parsed_scores[dim] * weight
-        else:
-            parsed_scores[dim] = None
-            weighted_scores[dim] = 0.0
-
-    weighted_total = sum(weighted_scores.values())
-    avg_score = weighted_total / len(dimensions)
-    normalized_pct = (weighted_total / 3.0) * 100
-
- 
-    summary_lines = []
-    for dim, weight in dimensions.items():
-        summary_lines.append(
-            f"{dim}: {parsed_scores[dim]} × {weight} = {weighted_scores[dim]:.2f}"
-        )
-    summary_lines.append(f"\nWeighted Total: {weighted_total:.2f}")
-    summary_lines.append(f"Average Score: {avg_score:.2f} out of 3.0")
-    summary_lines.append(f"Normalized Score: {normalized_pct:.2f}%")
 
-    return {
-        "normalized_score": normalized_pct,
-        "detailed_summary": "\n".join(summary_lines),
-        "raw_scores": parsed_scores,
-        "weighted_total": weighted_total,
-        "avg_score": avg_score
-    }
-
-
-@observe(as_type="chain", name="Single Trend Evaluation")
-def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total_trends, brand):
+@traced(as_type="chain", name="Single Trend Evaluation", capture_input="hash")
+async def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total_trends, brand, bypass_cache=False,
+                                batch_output=None):
     """
     Complete evaluation flow for a single trend with comprehensive Langfuse scoring:
     1. Log trace with metadata
-    2. Run evaluation 
+    2. Run evaluation (served from the result cache when this exact trend,
+       prompt and context were judged before, unless bypass_cache is set;
+       batch_output is the judge response already fetched in batch mode)
     3. Log ALL individual dimension scores + aggregate scores
     """
     
@@ -98,7 +64,7 @@ def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total
     print(f"=== Evaluating trend {trend_index}/{total_trends}: {trend_name} ===")
     
     # Step 1: Update trace with comprehensive metadata
-    langfuse.update_current_trace(
+    update_current_trace(
        name=f"{brand} Ad Copy Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={
             "brand": brand,
@@ -116,53 +82,62 @@ def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total
     # Step 2: Run the actual evaluation process (this creates sub-traces)
     try:
         # Get LLM evaluation (this will be traced as sub-process)
-        llm_output = evaluate(datapoint, full_instruction_prompt)
+        cache_key, llm_output = result_cache.lookup(full_instruction_prompt, datapoint, bypass=bypass_cache)
+        from_cache = llm_output is not None
+        if from_cache:
+            print(f" Trend '{trend_name}' served from result cache")
+        elif batch_output is not None:
+            llm_output = batch_output
+        else:
+            llm_output = await evaluate_or_quarantine(
+                datapoint, full_instruction_prompt, RUBRIC.dimensions, label=f"{brand} trend {trend_name}"
+            )
         
         # Parse scores (this will be traced as sub-process) 
         score_results = parse_scores_for_single_output(llm_output)
+        if not from_cache:
+            result_cache.put(cache_key, llm_output)
         
         normalized_score = score_results["normalized_score"]
         
         # Step 3: Log ALL scores to Langfuse
-        trace_id = langfuse.get_current_trace_id()
+        # Attach scores to this trend's span so concurrent trends stay distinguishable
+        scores = TraceScores.current()
         
         # Log individual dimension scores (1-3 scale)
         for dim, score in score_results["raw_scores"].items():
             if score is not None:
-                langfuse.create_score(
+                scores.add(
                     name=f"{dim}_score",
                     value=score,
-                    trace_id=trace_id,
                     data_type="NUMERIC",
                     comment=f"{dim.replace('_', ' ').title()} evaluation score (1-3 scale) for trend: {trend_name}"
                 )
         
         # Log weighted total score
-        langfuse.create_score(
+        scores.add(
             name="weighted_total_score",
             value=score_results["weighted_total"],
-            trace_id=trace_id,
             data_type="NUMERIC", 
             comment=f"Weighted total score for {trend_name} (Brand: {brand}). Sum of all dimension scores × weights."
         )
         
         # Log average score
-        langfuse.create_score(
+        scores.add(
             name="average_score",
             value=score_results["avg_score"],
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Average weighted score for {trend_name} (Brand: {brand}). Weighted total ÷ number of dimensions."
         )
         
         # Log final normalized percentage score
-        langfuse.create_score(
+        scores.add(
             name="normalized_percentage",
             value=normalized_score,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Final normalized percentage score (0-100%) for {trend_name} (Brand: {brand}). Primary evaluation metric."
         )
+        scores.emit()
         
         print(f" Trend '{trend_name}' scored: {normalized_score:.1f}%")
         
@@ -176,47 +151,46 @@ def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total
             "status": "success"
         }
         
+    except CassetteMissError:
+        # replay needs every request recorded; a miss fails the run, not just the item
+        raise
     except Exception as e:
         # Log failed evaluation with zero scores for all dimensions
         print(f" Error evaluating trend '{trend_name}': {e}")
         
-        trace_id = langfuse.get_current_trace_id()
+        scores = TraceScores.current()
         
         # Log zero scores for all dimensions
-        dimensions = ["strategic", "non_obvious", "specificity", "impactful", "clarity", "actionable"]
-        for dim in dimensions:
-            langfuse.create_score(
+        for dim in RUBRIC.dimensions:
+            scores.add(
                 name=f"{dim}_score",
                 value=0,
-                trace_id=trace_id,
                 data_type="NUMERIC",
                 comment=f"Failed evaluation - {dim} score set to 0 for {trend_name}. Error: {str(e)}"
             )
         
         # Log zero aggregate scores
-        langfuse.create_score(
+        scores.add(
             name="weighted_total_score",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - weighted total set to 0 for {trend_name}. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="average_score", 
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - average score set to 0 for {trend_name}. Error: {str(e)}"
         )
         
-        langfuse.create_score(
+        scores.add(
             name="normalized_percentage",
             value=0.0,
-            trace_id=trace_id,
             data_type="NUMERIC",
             comment=f"Failed evaluation - normalized percentage set to 0 for {trend_name}. Error: {str(e)}"
         )
+        scores.emit()
         
         return {
             "trend": trend_name,
@@ -225,28 +199,71 @@ def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total
             "analysis": "EVALUATION FAILED",
             "score_summary": f"Error: {str(e)}",
             "reasoning": "EVALUATION FAILED",
-            "status": "failed"
+            "status": QUARANTINED if isinstance(e, QuarantinedError) else "failed"
         }
 
 
-@observe(as_type="chain", name="Ad Copy Evaluation Pipeline")
-def pipeline(input_path, output_path, brand):
+def skipped_trend_row(datapoint, reason):
+    """Result row for a trend rejected by pre-flight screening; no judge call is made."""
+    datapoint = datapoint if isinstance(datapoint, dict) else {}
+    return {
+        "trend": datapoint.get("trend", ""),
+        "industry_score": datapoint.get("industry_score", "N/A"),
+        "normalized_score": None,
+        "analysis": json.dumps(datapoint.get("analysis", {}), indent=2, ensure_ascii=False),
+        "score_summary": f"Skipped: {reason}",
+        "reasoning": "",
+        "status": SKIPPED
+    }
+
+
+def pipeline(input_path, output_path, brand, **options):
+    """Blocking entry point for scripts; runs pipeline_async on a fresh event loop."""
+    return asyncio.run(pipeline_async(input_path, output_path, brand, **options))
+
+
+@traced(as_type="chain", name="Ad Copy Evaluation Pipeline")
+async def pipeline_async(input_path, output_path, brand, max_concurrency=None, bypass_cache=False, progress_callback=None,
+                         resume=False, ndjson=None, mode="interactive"):
     """
     Main pipeline with comprehensive Langfuse scoring.
     Each trend gets its own trace with all dimension scores + aggregate scores.
     Pipeline gets its own aggregate metrics.
+
+    Trends are evaluated concurrently with up to max_concurrency calls in
+    flight (defaults to EVAL_MAX_CONCURRENCY); CSV rows keep the input order.
+    bypass_cache forces fresh judge calls instead of reusing cached results.
+    progress_callback(done, total) is called as each trend finishes.
+
+    Every successful trend is checkpointed to <output_path>.checkpoint.jsonl
+    as it completes; resume=True reuses those rows and only evaluates the
+    trends that are missing. The checkpoint is removed once a run has no
+    failed trends.
+
+    Rows are streamed to the CSV (and, with ndjson=True or
+    EVAL_RESULT_NDJSON=1, to a sibling .ndjson file) as they finish, so
+    memory stays flat and partial output is readable mid-run.
+
+    Trends failing pre-flight screening (missing trend, empty analysis,
+    oversized payload) are written as "skipped" rows without a judge call.
+
+    mode="batch" submits every trend not already checkpointed or cached
+    through the Message Batches API, waits for the batch and then scores
+    the results through the normal path (failed batch items are evaluated
+    interactively).
     """
+    check_mode(mode)
     
     print(f"\n Starting Ad Copy Evaluation Pipeline for {brand}")
     
-    langfuse.update_current_trace(
+    update_current_trace(
         name=f"{brand} Ad Copy Pipeline - {datetime.now().strftime('%Y-%m-%d')}",
         metadata={
             "brand": brand,
             "input_file": os.path.basename(input_path),
             "output_file": os.path.basename(output_path),
             "pipeline_version": "1.3",
-            "evaluation_dimensions": ["strategic", "non_obvious", "specificity", "impactful", "clarity", "actionable"],
+            "evaluation_dimensions": RUBRIC.dimensions,
             "scoring_method": "weighted_normalized"
         },
         tags=["pipeline", "ad-copy-analysis", brand.lower()],
@@ -254,41 +271,88 @@ def pipeline(input_path, output_path, brand):
     )
     
     try:
+        # The context fetch depends only on the brand, so it runs while the
+        # trends and checkpoint are loaded instead of ahead of them.
         print(f" Fetching company context for {brand}...")
-        company_context = get_company_context(brand)
-        full_instruction_prompt = instruction_prompt_1_3 + f"\n\nAdditional context about Brand:\n{company_context}"
-        
+        context_task = asyncio.create_task(get_company_context_async(brand))
         print(f" Loading trends from {os.path.basename(input_path)}...")
-        suggestion_data = load_suggestion_data(input_path)
+        try:
+            with metrics.stage("load_input"):
+                suggestion_data, checkpoint = await asyncio.gather(
+                    asyncio.to_thread(load_suggestion_data, input_path),
+                    asyncio.to_thread(Checkpoint.for_output, output_path, resume),
+                )
+        except BaseException:
+            context_task.cancel()
+            raise
         total_trends = len(suggestion_data)
+        skip_reasons = [screen_trend(datapoint) for datapoint in suggestion_data]
+        skipped = skip_counts(skip_reasons)
+        if skipped:
+            print(f" Pre-flight: skipping {sum(skipped.values())} trends {skipped}")
         
-        print(f" Found {total_trends} trends to evaluate")
-        
-        results = []
-        successful_evaluations = 0
+        workers = resolve_concurrency(max_concurrency)
+        print(f" Found {total_trends} trends to evaluate ({workers} concurrent calls)")
+        if progress_callback is not None:
+            progress_callback(0, total_trends)
 
-        for i, datapoint in enumerate(suggestion_data, 1):
-            result = evaluate_single_trend(
-                datapoint, 
-                full_instruction_prompt, 
-                i, 
-                total_trends,
-                brand
-            )
-            results.append(result)
-            
-            if result["status"] == "success":
-                successful_evaluations += 1
-        
-        print(f" Saving results to {os.path.basename(output_path)}...")
-        df = pd.DataFrame(results)
-        df.to_csv(output_path, index=False, encoding="utf-8")
-        
+        if resume:
+            print(f" Resuming: {len(checkpoint.completed)} trends already checkpointed")
+
+        with metrics.stage("company_context"):
+            company_context = await context_task
+        # kept as separate segments so evaluate() can cache the shared prefix
+        full_instruction_prompt = [instruction_prompt_1_3, f"Additional context about Brand:\n{company_context}"]
+
+        batch_outputs = [None] * total_trends
+        if mode == "batch":
+            with metrics.stage("batch_prefetch"):
+                batch_outputs = await batch_judge_outputs(
+                    [(datapoint, full_instruction_prompt, RUBRIC.dimensions) for datapoint in suggestion_data],
+                    skip=[
+                        skip_reasons[i - 1] is not None or checkpoint.get(item_key("trend", i, dp)) is not None
+                        for i, dp in enumerate(suggestion_data, 1)
+                    ],
+                    bypass_cache=bypass_cache,
+                )
+
+        write_ndjson = WRITE_NDJSON if ndjson is None else ndjson
+        ndjson_path = ndjson_path_for(output_path) if write_ndjson else None
+        print(f" Streaming results to {os.path.basename(output_path)}...")
+
+        with ResultSink(RESULT_FIELDS, csv_path=output_path, ndjson_path=ndjson_path) as sink:
+            async def evaluate_and_write(i, datapoint):
+                await sink.wait_for_room(i - 1)
+                if skip_reasons[i - 1] is not None:
+                    row = skipped_trend_row(datapoint, skip_reasons[i - 1])
+                else:
+                    row = await run_checkpointed(
+                        checkpoint, item_key("trend", i, datapoint), evaluate_single_trend,
+                        datapoint, full_instruction_prompt, i, total_trends, brand, bypass_cache, batch_outputs[i - 1],
+                    )
+                sink.add(i - 1, row)
+                # only the fields needed for the job summary are kept in memory
+                return row["status"], row["normalized_score"]
+
+            with metrics.stage("evaluate_items"):
+                outcomes = await gather_bounded(
+                    evaluate_and_write,
+                    enumerate(suggestion_data, 1),
+                    max_concurrency=workers,
+                    progress_callback=progress_callback,
+                )
+        if not checkpoint.finish(status for status, _ in outcomes):
+            print(f" Some trends failed; rerun with resume=True to retry only those ({checkpoint.path})")
+
+        success_scores = [score for status, score in outcomes if status == "success"]
+        successful_evaluations = len(success_scores)
         success_rate = (successful_evaluations / total_trends) * 100 if total_trends > 0 else 0
-        avg_pipeline_score = df[df['status'] == 'success']['normalized_score'].mean() if successful_evaluations > 0 else 0
+        avg_pipeline_score = sum(success_scores) / successful_evaluations if successful_evaluations > 0 else 0
         
         print(f"\n Pipeline completed successfully!")
         print(f" Results: {successful_evaluations}/{total_trends} trends evaluated ({success_rate:.1f}% success)")
+        if skipped:
+            print(f" Skipped by pre-flight: {sum(skipped.values())} {skipped}")
         print(f" Average score: {avg_pipeline_score:.1f}%" if successful_evaluations > 0 else "No successful evaluations")
         print(f" Output saved to: {output_path}")
         print(f" Check Langfuse dashboard for comprehensive scoring data!")
@@ -297,12 +361,13 @@ def pipeline(input_path, output_path, brand):
             "status": "success",
             "total_trends": total_trends,
             "successful": successful_evaluations,
+            "skipped": sum(skipped.values()),
+            "quarantined": sum(status == QUARANTINED for status, _ in outcomes),
+            "skipped_reasons": skipped,
             "output_path": output_path,
             "success_rate": success_rate
         }
         
     except Exception as e:
         print(f" Pipeline failed: {e}")
-        raise e
-    finally:
-        langfuse.flush()
\ No newline at end of file
+        raise e
\ No newline at end of file
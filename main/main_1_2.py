@@ -7,6 +7,8 @@ from langfuse import observe, get_client
 repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, repo_path)
 from eval_pipeline.eval_1_2 import pipeline
+from modules.tracing import flush_tracing, tracing_stats
+from modules.metrics import metrics
 
 repo_root = os.path.dirname(os.path.dirname(__file__))
 dotenv_path = os.path.join(repo_root, ".env")
@@ -75,10 +77,18 @@ def main():
             print(f"\n EVALUATION COMPLETED SUCCESSFULLY!")
             print(f"")
             print(f" Summary:")
-            print(f"    Datapoints processed: {result['total_datapoints']}")
+            print(f"    Datapoints processed: {result['total_items']}")
             print(f"    Successful evaluations: {result['successful']}")  
             print(f"    Success rate: {result.get('success_rate', 0):.1f}%")
-            print(f"    Processing speed: {result['total_datapoints']/processing_time*60:.1f} datapoints/minute")
+            print(f"    Processing speed: {result['total_items']/processing_time*60:.1f} datapoints/minute")
+            print(f"")
+            usage = metrics.summary()
+            print(f" Calls (estimated cost ${usage['cost_usd']:.4f}):")
+            for call, stats in usage["calls"].items():
+                latency = stats.get("latency") or {}
+                p50, p99 = latency.get("p50_seconds"), latency.get("p99_seconds")
+                timing = f", p50 {p50:.2f}s, p99 {p99:.2f}s" if p50 is not None else ""
+                print(f"    {call}: {stats['count']} calls, {stats['errors']} errors{timing}, ${stats.get('cost_usd', 0):.4f}")
             print(f"")
             print(f" Outputs:")
             print(f"    CSV Report: {result['output_path']}")
@@ -107,8 +117,10 @@ def main():
     
     finally:
         try:
-            langfuse.flush()
-            print(f"\n Langfuse data synchronized")
+            flush_tracing(timeout=30)
+            stats = tracing_stats()
+            print(f"\n Langfuse data handed off ({stats['score_scores']} scores in {stats['score_batches']} batches, "
+                  f"{stats['score_submit_seconds'] * 1000:.1f} ms on the evaluation path, {stats['score_dropped']} dropped)")
         except:
             pass
 
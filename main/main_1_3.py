@@ -8,6 +8,8 @@ from langfuse import observe,get_client
 repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, repo_path)
 from eval_pipeline.eval_1_3 import pipeline
+from modules.tracing import flush_tracing, tracing_stats
+from modules.metrics import metrics
 
 repo_root = os.path.dirname(os.path.dirname(__file__))
 dotenv_path = os.path.join(repo_root, ".env")
@@ -81,6 +83,14 @@ def main():
             print(f"    Success rate: {result.get('success_rate', 0):.1f}%")
             print(f"    Processing speed: {result['total_trends']/processing_time*60:.1f} trends/minute")
             print(f"")
+            usage = metrics.summary()
+            print(f" Calls (estimated cost ${usage['cost_usd']:.4f}):")
+            for call, stats in usage["calls"].items():
+                latency = stats.get("latency") or {}
+                p50, p99 = latency.get("p50_seconds"), latency.get("p99_seconds")
+                timing = f", p50 {p50:.2f}s, p99 {p99:.2f}s" if p50 is not None else ""
+                print(f"    {call}: {stats['count']} calls, {stats['errors']} errors{timing}, ${stats.get('cost_usd', 0):.4f}")
+            print(f"")
             print(f" Outputs:")
             print(f"    CSV Report: {result['output_path']}")
             print(f"    Langfuse Dashboard: Individual trend scores logged")
@@ -108,8 +118,10 @@ def main():
     
     finally:
         try:
-            langfuse.flush()
-            print(f"\n Langfuse data synchronized")
+            flush_tracing(timeout=30)
+            stats = tracing_stats()
+            print(f"\n Langfuse data handed off ({stats['score_scores']} scores in {stats['score_batches']} batches, "
+                  f"{stats['score_submit_seconds'] * 1000:.1f} ms on the evaluation path, {stats['score_dropped']} dropped)")
         except:
             pass
 
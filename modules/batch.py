@@ -0,0 +1,190 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import anthropic
+from langfuse import get_client
+from modules.tracing import traced
+from modules.metrics import metrics
+from modules.eval_functions import evaluation_cost, evaluation_request, json_prefix_verdict, response_text
+from modules.llm_clients import get_async_anthropic_client
+from modules.rate_limiter import get_anthropic_rate_limiter
+from modules.result_cache import result_cache
+from modules.rubrics import strip_json_fence
+from modules.storage import data_path, write_json_atomic
+
+langfuse = get_client()
+logger = logging.getLogger("Aqxle-eval")
+
+# "interactive" sends one messages.create per item; "batch" submits every
+# pending item through the Message Batches API (half price, no rate limits,
+# results within 24h) and scores the results as usual.
+EXECUTION_MODES = ("interactive", "batch")
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("EVAL_BATCH_POLL_INTERVAL_SECONDS", "30"))
+# The API accepts up to 100,000 requests per batch; larger jobs are split
+BATCH_MAX_REQUESTS = int(os.getenv("EVAL_BATCH_MAX_REQUESTS", "10000"))
+# Submitted batch ids, keyed by a hash of their requests, so a restarted job
+# re-attaches to its batches instead of paying for them again
+BATCH_STATE_DIR = os.getenv("EVAL_BATCH_STATE_DIR", data_path("batches"))
+
+JudgeInput = Tuple[Any, Any, Any]  # (suggestion_data, system_prompt, score_dimensions) as passed to evaluate()
+
+
+def check_mode(mode: str) -> None:
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode {mode!r}; expected one of {EXECUTION_MODES}")
+
+
+def _state_path(requests: List[Dict[str, Any]]) -> str:
+    canonical = json.dumps(requests, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return os.path.join(BATCH_STATE_DIR, f"{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}.json")
+
+
+async def _submit_or_attach(client, limiter, requests: List[Dict[str, Any]]) -> str:
+    """Batch id for these requests: the one submitted earlier if it still exists, else a new batch."""
+    path = _state_path(requests)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            batch_id = json.load(f)["batch_id"]
+        try:
+            batch = await limiter.run(lambda: client.messages.batches.retrieve(batch_id))
+        except anthropic.NotFoundError:
+            logger.warning("Saved batch %s no longer exists; resubmitting", batch_id)
+        else:
+            if batch.processing_status != "canceling":
+                print(f" Re-attached to batch {batch_id} ({len(requests)} requests)")
+                return batch_id
+
+    batch = await limiter.run(lambda: client.messages.batches.create(requests=requests))
+    write_json_atomic(path, {
+        "batch_id": batch.id,
+        "requests": len(requests),
+        "submitted_at": datetime.now(timezone.utc).isoformat(),
+    })
+    print(f" Submitted batch {batch.id} with {len(requests)} requests")
+    return batch.id
+
+
+async def _wait_for_batch(client, limiter, batch_id: str):
+    while True:
+        batch = await limiter.run(lambda: client.messages.batches.retrieve(batch_id))
+        counts = batch.request_counts
+        print(
+            f" Batch {batch_id}: {batch.processing_status} "
+            f"(processing={counts.processing}, succeeded={counts.succeeded}, errored={counts.errored})"
+        )
+        if batch.processing_status == "ended":
+            return batch
+        await asyncio.sleep(BATCH_POLL_INTERVAL_SECONDS)
+
+
+def _usable_output(message) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (output, None) for a complete JSON judge reply, (None, reason) for one
+    the interactive path should redo (it retries or quarantines as usual).
+    """
+    if message.stop_reason == "max_tokens":
+        return None, "was cut off at max_tokens"
+    try:
+        output = response_text(message)
+    except StopIteration:
+        return None, "returned no text"
+    if json_prefix_verdict(output) is False:
+        return None, "returned non-JSON text"
+    try:
+        json.loads(strip_json_fence(output))
+    except json.JSONDecodeError:
+        return None, "returned unparseable JSON"
+    return output, None
+
+
+@traced(as_type="span", name="Claude Message Batch", capture_input="hash")
+@metrics.timed("evaluate_batch")
+async def run_evaluation_batch(judge_inputs: Sequence[JudgeInput]) -> List[Optional[str]]:
+    """
+    Submit one evaluate() request per judge input as Message Batches (or
+    re-attach to the batches an interrupted run submitted), wait for them
+    to end and return the response texts in input order. Items that
+    errored, were canceled or expired, and replies that are truncated or
+    not valid JSON, come back as None.
+    """
+    client = get_async_anthropic_client()
+    limiter = get_anthropic_rate_limiter()
+    outputs: List[Optional[str]] = [None] * len(judge_inputs)
+
+    batch_ids = []
+    for start in range(0, len(judge_inputs), BATCH_MAX_REQUESTS):
+        requests = [
+            {"custom_id": f"item-{index}", "params": evaluation_request(*judge_input)}
+            for index, judge_input in enumerate(judge_inputs[start:start + BATCH_MAX_REQUESTS], start)
+        ]
+        batch_ids.append((await _submit_or_attach(client, limiter, requests), _state_path(requests)))
+
+    usage = {"input_tokens": 0, "output_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    failed = 0
+    for batch_id, state_path in batch_ids:
+        await _wait_for_batch(client, limiter, batch_id)
+        async for entry in await limiter.run(lambda: client.messages.batches.results(batch_id)):
+            index = int(entry.custom_id.split("-", 1)[1])
+            if entry.result.type != "succeeded":
+                failed += 1
+                logger.warning("Batch item %s %s", entry.custom_id, entry.result.type)
+                continue
+            message = entry.result.message
+            for field in usage:
+                usage[field] += getattr(message.usage, field, 0) or 0
+            output, reason = _usable_output(message)
+            if output is None:
+                failed += 1
+                logger.warning("Batch item %s %s", entry.custom_id, reason)
+                continue
+            outputs[index] = output
+        # the results are consumed; a rerun should submit a fresh batch
+        os.remove(state_path)
+
+    # the Batch API bills at half the interactive price
+    cost = evaluation_cost(usage["input_tokens"], usage["output_tokens"], usage["cache_creation_input_tokens"],
+                           usage["cache_read_input_tokens"], discount=0.5)
+    metrics.record_usage(
+        "evaluate_batch", cost_usd=cost["total"], input=usage["input_tokens"], output=usage["output_tokens"],
+        cache_read=usage["cache_read_input_tokens"], cache_write=usage["cache_creation_input_tokens"],
+    )
+    langfuse.update_current_span(
+        metadata={"batch_ids": [batch_id for batch_id, _ in batch_ids], "requests": len(judge_inputs), "failed": failed, "usage": usage}
+    )
+    return outputs
+
+
+async def batch_judge_outputs(judge_inputs: Sequence[JudgeInput], skip: Sequence[bool],
+                              bypass_cache: bool = False) -> List[Optional[str]]:
+    """
+    Batch-mode prefetch for a pipeline: run every judge input that is not
+    skipped (already checkpointed) or already in the result cache through
+    run_evaluation_batch. Returns one entry per input; None means "evaluate
+    as usual", which also covers batch items that failed.
+    """
+    pending = [
+        i for i, (suggestion_data, system_prompt, _) in enumerate(judge_inputs)
+        if not skip[i] and result_cache.lookup(system_prompt, suggestion_data, bypass=bypass_cache)[1] is None
+    ]
+    outputs: List[Optional[str]] = [None] * len(judge_inputs)
+    if not pending:
+        return outputs
+
+    print(f" Batch mode: submitting {len(pending)} of {len(judge_inputs)} items")
+    try:
+        results = await run_evaluation_batch([judge_inputs[i] for i in pending])
+    except anthropic.APIError as e:
+        # retries are exhausted; the batch ids stay saved for the next run
+        logger.warning("Batch submission failed (%s); evaluating every item interactively", e)
+        return outputs
+    for i, output in zip(pending, results):
+        outputs[i] = output
+    missing = sum(output is None for output in results)
+    if missing:
+        print(f" Batch mode: {missing} items failed in the batch and will be evaluated interactively")
+    return outputs
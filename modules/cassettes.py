@@ -0,0 +1,150 @@
+import os
+import glob
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from modules.storage import data_path
+
+logger = logging.getLogger("Aqxle-eval")
+
+# Record/replay of model calls. In "record" mode every judge, brand-context
+# and URL-extraction response is stored under a hash of its exact request;
+# in "replay" mode responses are served from the cassettes and a request
+# that was never recorded fails instead of reaching the network. Replayed
+# runs are reproducible and take milliseconds per call, so the non-LLM
+# parts (parsing, scoring, CSV, tracing) can be profiled at full scale.
+CASSETTE_MODE = os.getenv("EVAL_CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv("EVAL_CASSETTE_DIR", data_path("cassettes"))
+# Recorded responses are appended to disk (as one gzip member) this many at a time
+CASSETTE_FLUSH_RECORDS = int(os.getenv("EVAL_CASSETTE_FLUSH_RECORDS", "100"))
+
+OFF, RECORD, REPLAY = "off", "record", "replay"
+MODES = (OFF, RECORD, REPLAY)
+
+
+class CassetteMissError(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    """Hash of the call kind and the request exactly as sent (canonical JSON)."""
+    canonical = json.dumps([kind, request], sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """
+    One cassette per call kind: gzip-compressed JSON lines of
+    {"key", "response"} (or {"key", "error"} for a recorded failure).
+    Each recording process writes its own file, <kind>.<time>-<pid>.jsonl.gz,
+    so concurrent recorders never interleave. A request made more than once
+    (e.g. retried after a non-JSON reply) is recorded every time and replayed
+    in the same order, the last response repeating once they run out.
+    """
+
+    def __init__(self, directory: str = CASSETTE_DIR, mode: str = CASSETTE_MODE,
+                 flush_records: int = CASSETTE_FLUSH_RECORDS):
+        if mode not in MODES:
+            raise ValueError(f"EVAL_CASSETTE_MODE must be one of {MODES}, got {mode!r}")
+        self.directory = directory
+        self.mode = mode
+        self.flush_records = flush_records
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self._replay_counts: Dict[tuple, int] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._files: Dict[str, str] = {}
+        self.stats = {"replayed": 0, "recorded": 0, "misses": 0}
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    # ---- replay ----
+
+    def _cassette(self, kind: str) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            entries = self._loaded.get(kind)
+            if entries is None:
+                entries = {}
+                for path in sorted(glob.glob(os.path.join(self.directory, f"{kind}.*.jsonl.gz"))):
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                entries.setdefault(entry.pop("key"), []).append(entry)
+                self._loaded[kind] = entries
+            return entries
+
+    def replay(self, kind: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The recorded entry ({"response": ...} or {"error": ...}) for a request
+        when replaying, None otherwise. Raises CassetteMissError on a miss.
+        """
+        if not self.replaying:
+            return None
+        key = request_key(kind, request)
+        entries = self._cassette(kind).get(key)
+        if not entries:
+            self.stats["misses"] += 1
+            raise CassetteMissError(f"No recorded {kind} response for request {key[:12]} in {self.directory}")
+        with self._lock:
+            count = self._replay_counts.get((kind, key), 0)
+            self._replay_counts[(kind, key)] = count + 1
+            self.stats["replayed"] += 1
+        return entries[min(count, len(entries) - 1)]
+
+    # ---- record ----
+
+    def _add(self, kind: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.setdefault(kind, []).append(entry)
+            self.stats["recorded"] += 1
+            full = len(self._pending[kind]) >= self.flush_records
+        if full:
+            self.flush(kind)
+
+    def record(self, kind: str, request: Dict[str, Any], response: Any) -> None:
+        """Store a response (a pydantic SDK object or plain JSON data) when recording."""
+        if not self.recording:
+            return
+        if hasattr(response, "model_dump"):
+            response = response.model_dump(mode="json", exclude_none=True)
+        self._add(kind, {"key": request_key(kind, request), "response": response})
+
+    def record_error(self, kind: str, request: Dict[str, Any], error: Dict[str, Any]) -> None:
+        """Store a failure the caller wants replayed too (e.g. an aborted non-JSON reply)."""
+        if self.recording:
+            self._add(kind, {"key": request_key(kind, request), "error": error})
+
+    def flush(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            kinds = [kind] if kind else list(self._pending)
+            batches = {k: self._pending.pop(k, []) for k in kinds}
+            for k in kinds:
+                if batches[k] and k not in self._files:
+                    self._files[k] = os.path.join(self.directory, f"{k}.{time.time_ns()}-{os.getpid()}.jsonl.gz")
+            paths = {k: self._files.get(k) for k in kinds}
+        for k, entries in batches.items():
+            if not entries:
+                continue
+            os.makedirs(self.directory, exist_ok=True)
+            lines = "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in entries)
+            # gzip members concatenate, so each flush appends a complete member
+            with self._lock, open(paths[k], "ab") as f:
+                f.write(gzip.compress(lines.encode("utf-8")))
+            logger.info("Recorded %d %s responses to %s", len(entries), k, paths[k])
+
+
+cassettes = CassetteStore()
+atexit.register(cassettes.flush)
@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Iterable
+
+from modules.preflight import SKIPPED
+
+
+def checkpoint_path_for(output_path: str) -> str:
+    return output_path + ".checkpoint.jsonl"
+
+
+def item_key(kind: str, index: int, datapoint: Any) -> str:
+    """
+    Identity of one evaluated item: its kind, position and content hash.
+    A resumed run only reuses an entry if the same input sits at the same place.
+    """
+    content = json.dumps(datapoint, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    return f"{kind}:{index}:{digest}"
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of completed result rows for one pipeline run.
+
+    Each record is flushed and fsync'ed as soon as the item finishes, so a
+    crash or kill loses at most the items that were still in flight. A run
+    started with resume=True reloads the log and only evaluates the rest.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed: Dict[str, Dict[str, Any]] = self._load() if resume else {}
+        if not resume:
+            self.clear()
+
+    @classmethod
+    def for_output(cls, output_path: str, resume: bool = False) -> "Checkpoint":
+        return cls(checkpoint_path_for(output_path), resume=resume)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        completed = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a torn final line from a crash mid-write; that item is simply re-run
+                        continue
+                    completed[entry["key"]] = entry["row"]
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def get(self, key: str):
+        return self.completed.get(key)
+
+    def record(self, key: str, row: Dict[str, Any]) -> None:
+        line = json.dumps({"key": key, "row": row}, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        """Remove the log, e.g. once the final output has been written."""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def finish(self, statuses: Iterable[str]) -> bool:
+        """
+        Remove the log if every item succeeded (or was skipped by pre-flight);
+        otherwise keep it, so resume=True re-runs only the items that failed.
+        Returns whether the log was removed.
+        """
+        if all(status in ("success", SKIPPED) for status in statuses):
+            self.clear()
+            return True
+        return False
+
+
+async def run_checkpointed(checkpoint: Checkpoint, key: str, evaluate_item, *args):
+    """
+    Return the checkpointed row for key if there is one, otherwise await
+    evaluate_item(*args) and checkpoint its row when it succeeded (failed
+    items are left out so a resumed run retries them).
+    """
+    row = checkpoint.get(key)
+    if row is not None:
+        return row
+    row = await evaluate_item(*args)
+    if row.get("status") == "success":
+        checkpoint.record(key, row)
+    return row
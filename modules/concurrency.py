@@ -0,0 +1,37 @@
+import os
+import asyncio
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "4"))
+
+
+def resolve_concurrency(max_concurrency=None) -> int:
+    """Return the worker count to use: explicit argument, else EVAL_MAX_CONCURRENCY."""
+    if max_concurrency is None:
+        max_concurrency = DEFAULT_MAX_CONCURRENCY
+    return max(1, int(max_concurrency))
+
+
+async def gather_bounded(func, arg_tuples, max_concurrency=None, progress_callback=None):
+    """
+    Await func(*args) for every tuple in arg_tuples with at most
+    max_concurrency calls in flight.
+
+    Results are returned in input order. Each call runs as its own task,
+    which copies the caller's context, so Langfuse @observe spans nest under
+    the caller's trace. progress_callback(done, total) is called after each
+    completed call.
+    """
+    arg_tuples = list(arg_tuples)
+    semaphore = asyncio.Semaphore(resolve_concurrency(max_concurrency))
+    done = 0
+
+    async def run(args):
+        nonlocal done
+        async with semaphore:
+            result = await func(*args)
+        done += 1
+        if progress_callback is not None:
+            progress_callback(done, len(arg_tuples))
+        return result
+
+    return await asyncio.gather(*(run(args) for args in arg_tuples))
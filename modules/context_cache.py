@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from modules.storage import data_path, write_json_atomic
+
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("EVAL_CONTEXT_CACHE_TTL_SECONDS", str(24 * 3600)))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("EVAL_CONTEXT_CACHE_MAX_ENTRIES", "256"))
+CONTEXT_CACHE_DIR = os.getenv("EVAL_CONTEXT_CACHE_DIR", data_path("company_context"))
+
+
+def context_cache_key(company_name: str, model: str, system_prompt: str) -> str:
+    """Cache key for a brand context: brand + model + hash of the system prompt."""
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = f"{company_name.strip().casefold()}|{model}|{prompt_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompanyContextCache:
+    """
+    Two-tier brand-context cache: an in-process LRU in front of one JSON file
+    per key on disk. Entries older than ttl_seconds are treated as missing;
+    a ttl of 0 disables caching altogether.
+    """
+
+    def __init__(self, cache_dir: str = CONTEXT_CACHE_DIR, ttl_seconds: float = CONTEXT_CACHE_TTL_SECONDS,
+                 max_entries: int = CONTEXT_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _fresh(self, created_at: float) -> bool:
+        return (time.time() - created_at) < self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached context for key, or None if missing or expired."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, context = entry
+                if self._fresh(created_at):
+                    self._memory.move_to_end(key)
+                    return context
+                del self._memory[key]
+
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not self._fresh(entry.get("created_at", 0)):
+            return None
+
+        self._remember(key, entry["created_at"], entry["context"])
+        return entry["context"]
+
+    def put(self, key: str, context: str, **metadata) -> None:
+        """Store context in both tiers."""
+        if not self.enabled:
+            return
+
+        created_at = time.time()
+        self._remember(key, created_at, context)
+        try:
+            write_json_atomic(self._path(key), {"created_at": created_at, "context": context, **metadata})
+        except OSError as e:
+            print(f"WARNING: could not persist company context cache entry: {e}")
+
+    def _remember(self, key: str, created_at: float, context: str) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, context)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-process tier (the disk tier expires by TTL)."""
+        with self._lock:
+            self._memory.clear()
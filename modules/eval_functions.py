@@ -1,67 +1,311 @@
 import os
 import json
+import time
+import logging
 from dotenv import load_dotenv
 import requests
 from bs4 import BeautifulSoup
 
 import anthropic  
-from langfuse import get_client,observe
+from langfuse import get_client
+from modules.tracing import span_payload, traced
+from modules.metrics import metrics
+from modules.cassettes import cassettes
+from modules.llm_clients import get_anthropic_client, get_async_anthropic_client
+from modules.rate_limiter import get_anthropic_rate_limiter
 
-repo_root = os.path.dirname(os.path.dirname(__file__))
-dotenv_path = os.path.join(repo_root, ".env")
-
-load_dotenv(dotenv_path)
 langfuse = get_client()
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+logger = logging.getLogger("Aqxle-eval")
+
+client = get_anthropic_client()
+
+EVALUATION_MODEL = "claude-opus-4-1-20250805"  # Opus 4.1
+EVALUATION_MAX_TOKENS = 1500
+EVALUATION_TEMPERATURE = 0.1
+# Langfuse generation span of a judge call; its input is the prompt, hashed by default
+GENERATION_SPAN = "Claude LLM Call"
+
+# Mark the system prompt as cacheable so the 2nd..Nth call of a job reads
+# the instruction prompt + brand context from Anthropic's prompt cache.
+PROMPT_CACHING_ENABLED = os.getenv("EVAL_PROMPT_CACHING", "1").lower() not in ("0", "false", "no")
+
+# When the caller passes its rubric dimensions, force the reply through a
+# tool whose JSON schema has one {score, reasoning} object per dimension,
+# so the output is always well-formed JSON instead of free text.
+STRUCTURED_OUTPUT_ENABLED = os.getenv("EVAL_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+SCORE_TOOL_NAME = "submit_scores"
+
+# Stream judge replies and cancel the generation as soon as the text
+# cannot be the JSON the score parser expects (e.g. a prose refusal).
+# Requests that force the score tool are not streamed: their reply comes
+# as tool input, which the API already constrains to the schema.
+STREAM_EARLY_ABORT_ENABLED = os.getenv("EVAL_STREAM_EARLY_ABORT", "1").lower() not in ("0", "false", "no")
 
-if not ANTHROPIC_API_KEY:
-    raise ValueError("ANTHROPIC_API_KEY not found in .env file. Please set it before using the library.")
+# Stage (see modules.metrics) summing the time judge calls spend in the rate
+# limiter: waiting for a slot or the token buckets and backing off between
+# retries. The "evaluate" call latency covers only the provider call itself.
+RATE_LIMIT_WAIT_STAGE = "judge_rate_limit_wait"
 
-client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+# Cassette names of the recorded calls (see modules.cassettes)
+EVALUATE_CASSETTE = "evaluate"
+URL_EXTRACTION_CASSETTE = "url_extraction"
 
-@observe(as_type="generation", name="Claude LLM Call")
-def evaluate(suggestion_data, system_prompt):
+
+def system_prompt_segments(system_prompt):
+    """Normalise a system prompt (str or sequence of str) to its non-empty segments."""
+    if isinstance(system_prompt, str):
+        return [system_prompt]
+    return [segment for segment in system_prompt if segment]
+
+
+def system_prompt_text(system_prompt) -> str:
+    """Flatten a system prompt to the plain string the model sees."""
+    return "\n\n".join(system_prompt_segments(system_prompt))
+
+
+def _system_blocks(system_prompt):
     """
-    Evaluate suggestions using Anthropic's Claude model.
+    Build Anthropic system blocks from the prompt segments. With caching on,
+    a breakpoint goes after the first segment (the static instruction prompt,
+    shared across brands) and after the last one (instruction + brand
+    context, shared by every item of a job).
+    """
+    segments = system_prompt_segments(system_prompt)
+    if not PROMPT_CACHING_ENABLED:
+        return "\n\n".join(segments)
 
-    Parameters:
-        suggestion_data (dict): The data to evaluate (will be JSON serialized).
-        system_prompt (str): The system-level instructions for the model.
+    blocks = [{"type": "text", "text": segment} for segment in segments]
+    for i in {0, len(blocks) - 1}:
+        blocks[i]["cache_control"] = {"type": "ephemeral"}
+    return blocks
 
-    Returns:
-        str: The model's response text.
+
+def score_tool(score_dimensions):
+    """Tool definition whose input schema is the rubric: {dim: {"score": 1-3, "reasoning": str}}."""
+    dimension_schema = {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer", "enum": [1, 2, 3]},
+            "reasoning": {"type": "string"},
+        },
+        "required": ["score", "reasoning"],
+    }
+    return {
+        "name": SCORE_TOOL_NAME,
+        "description": "Submit the evaluation: a 1-3 score and the reasoning behind it for every rubric dimension.",
+        "input_schema": {
+            "type": "object",
+            "properties": {dim: dimension_schema for dim in score_dimensions},
+            "required": list(score_dimensions),
+        },
+    }
+
+
+def evaluation_request(suggestion_data, system_prompt, score_dimensions=None):
+    """
+    Build the messages.create kwargs shared by evaluate, evaluate_async and
+    batch mode. With score_dimensions (and structured output enabled) the
+    model is forced to answer through the score tool.
     """
     if not isinstance(suggestion_data, (dict, list)):
         raise TypeError("suggestion_data must be a dictionary or list.")
 
-    message = client.messages.create(
-        model="claude-opus-4-1-20250805",  # Opus 4.1
-        max_tokens=1500,
-        system=system_prompt,
-        messages=[{"role": "user", "content": json.dumps(suggestion_data)}],
-        temperature=0.1
+    request = {
+        "model": EVALUATION_MODEL,
+        "max_tokens": EVALUATION_MAX_TOKENS,
+        "system": _system_blocks(system_prompt),
+        "messages": [{"role": "user", "content": json.dumps(suggestion_data)}],
+        "temperature": EVALUATION_TEMPERATURE,
+    }
+    if score_dimensions and STRUCTURED_OUTPUT_ENABLED:
+        request["tools"] = [score_tool(score_dimensions)]
+        request["tool_choice"] = {"type": "tool", "name": SCORE_TOOL_NAME}
+    return request
+
+
+def response_text(message) -> str:
+    """
+    The judge output of a response as a string: the score tool's input
+    serialised as JSON when the model answered through the tool, otherwise
+    the first text block.
+    """
+    for block in message.content:
+        if getattr(block, "type", None) == "tool_use" and block.name == SCORE_TOOL_NAME:
+            return json.dumps(block.input, ensure_ascii=False)
+    return next(block.text for block in message.content if getattr(block, "type", None) == "text")
+
+
+class NonJSONResponseError(ValueError):
+    """The judge started answering with something other than JSON; the generation was cancelled."""
+
+    def __init__(self, prefix: str, partial_message=None):
+        super().__init__(f"Judge reply is not JSON, aborted after {len(prefix)} chars: {prefix[:120]!r}")
+        self.prefix = prefix
+        self.partial_message = partial_message
+
+
+def json_prefix_verdict(text: str):
+    """
+    Decide from the first characters of a reply whether it can still be the
+    JSON parse_scores_for_single_output accepts (optionally inside a ```json
+    fence). Returns True (looks like JSON), False (cannot be) or None (too
+    short to tell yet).
+    """
+    text = text.lstrip()
+    if not text:
+        return None
+    if text[0] in "{[":
+        return True
+    if "```".startswith(text):
+        return None
+    if text.startswith("```"):
+        fence = text[3:]
+        if "json".startswith(fence.lower()):
+            return None
+        if fence[:4].lower() == "json":
+            fence = fence[4:]
+        return json_prefix_verdict(fence)
+    return False
+
+
+def _streams(request) -> bool:
+    """Whether a request is streamed for the early abort (free-text replies only)."""
+    return STREAM_EARLY_ABORT_ENABLED and "tool_choice" not in request
+
+
+def _snapshot(stream):
+    try:
+        return stream.current_message_snapshot
+    except AssertionError:  # no event received yet
+        return None
+
+
+def _stream_message(request):
+    """Sync streamed messages.create that raises NonJSONResponseError on a non-JSON start."""
+    prefix = ""
+    with client.messages.stream(**request) as stream:
+        for text in stream.text_stream:
+            prefix += text
+            verdict = json_prefix_verdict(prefix)
+            if verdict is None:
+                continue
+            if not verdict:
+                # leaving the context manager closes the connection and stops the generation
+                raise NonJSONResponseError(prefix, _snapshot(stream))
+            break
+        return stream.get_final_message()
+
+
+async def _stream_message_async(async_client, request):
+    """Async counterpart of _stream_message."""
+    prefix = ""
+    async with async_client.messages.stream(**request) as stream:
+        async for text in stream.text_stream:
+            prefix += text
+            verdict = json_prefix_verdict(prefix)
+            if verdict is None:
+                continue
+            if not verdict:
+                raise NonJSONResponseError(prefix, _snapshot(stream))
+            break
+        return await stream.get_final_message()
+
+
+def _log_aborted_generation(error: NonJSONResponseError, suggestion_data, system_prompt):
+    if error.partial_message is not None:
+        _log_evaluation_generation(error.partial_message, suggestion_data, system_prompt)
+    logger.warning("Judge call aborted early: %s", error)
+    langfuse.update_current_generation(level="WARNING", status_message=str(error), output=error.prefix)
+
+
+def _replayed_message(request):
+    """The recorded judge reply when replaying cassettes, else None; a recorded early abort is raised again."""
+    entry = cassettes.replay(EVALUATE_CASSETTE, request)
+    if entry is None:
+        return None
+    if "error" in entry:
+        partial = entry["error"].get("partial_message")
+        raise NonJSONResponseError(
+            entry["error"]["prefix"], anthropic.types.Message.model_validate(partial) if partial else None
+        )
+    return anthropic.types.Message.model_validate(entry["response"])
+
+
+def _record_abort(request, error: NonJSONResponseError):
+    partial = error.partial_message
+    cassettes.record_error(EVALUATE_CASSETTE, request, {
+        "prefix": error.prefix,
+        "partial_message": partial.model_dump(mode="json", exclude_none=True) if hasattr(partial, "model_dump") else None,
+    })
+
+
+def _estimated_tokens(request) -> int:
+    """Rough token cost of a request for the tokens/min bucket (~4 chars per token plus max output)."""
+    chars = len(system_prompt_text([block["text"] for block in request["system"]])
+                if isinstance(request["system"], list) else request["system"])
+    chars += sum(len(m["content"]) for m in request["messages"])
+    return chars // 4 + request["max_tokens"]
+
+
+def _used_tokens(message) -> int:
+    usage = getattr(message, "usage", None)
+    return sum(
+        getattr(usage, field, 0) or 0
+        for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
     )
-    # Extract usage safely
-    usage = getattr(message, "usage", {})
-    input_tokens = getattr(usage, "input_tokens", 0)
-    output_tokens = getattr(usage, "output_tokens", 0)
-    cache_write_tokens = getattr(usage, "cache_write_input_tokens", 0)
-    cache_read_tokens = getattr(usage, "cache_read_input_tokens", 0)
 
+
+def evaluation_cost(input_tokens, output_tokens, cache_write_tokens=0, cache_read_tokens=0, discount=1.0):
+    """USD cost of judge-model tokens by kind, plus "total"; discount=0.5 for the Batch API."""
     # ---- Pricing (Anthropic Claude Opus 4.1 as of Sep 2025) ----
     # Input: $15 / MTok
     # Output: $75 / MTok
     # Prompt caching: Write $18.75 / MTok, Read $1.50 / MTok
-    input_cost = (input_tokens / 1_000_000) * 15
-    output_cost = (output_tokens / 1_000_000) * 75
-    cache_write_cost = (cache_write_tokens / 1_000_000) * 18.75
-    cache_read_cost = (cache_read_tokens / 1_000_000) * 1.5
-    total_cost = input_cost + output_cost + cache_write_cost + cache_read_cost
+    costs = {
+        "input": (input_tokens / 1_000_000) * 15 * discount,
+        "output": (output_tokens / 1_000_000) * 75 * discount,
+        "cache_write": (cache_write_tokens / 1_000_000) * 18.75 * discount,
+        "cache_read": (cache_read_tokens / 1_000_000) * 1.5 * discount,
+    }
+    costs["total"] = sum(costs.values())
+    return costs
+
+
+def _log_evaluation_generation(message, suggestion_data, system_prompt):
+    """Record usage and cost of a Claude evaluation call on the current Langfuse generation."""
+    # Extract usage safely
+    usage = getattr(message, "usage", {})
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    cache_read_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+
+    # ---- Prompt cache report ----
+    # read > 0: prefix served from cache (hit); write > 0: prefix cached by this call (miss)
+    cache_status = "hit" if cache_read_tokens else ("miss" if cache_write_tokens else "none")
+    logger.info(
+        "Claude call prompt cache %s: read=%d write=%d uncached_input=%d output=%d",
+        cache_status, cache_read_tokens, cache_write_tokens, input_tokens, output_tokens,
+    )
+
+    costs = evaluation_cost(input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
+    metrics.record_usage(
+        "evaluate", cost_usd=costs["total"], input=input_tokens, output=output_tokens,
+        cache_read=cache_read_tokens, cache_write=cache_write_tokens,
+    )
 
     # ---- Log to Langfuse ----
     langfuse.update_current_generation(
-        input={"system_prompt": system_prompt, "user_input": suggestion_data},
-        model="claude-opus-4-1-20250805",
+        input=span_payload(
+            GENERATION_SPAN, "input",
+            {"system_prompt": system_prompt_text(system_prompt), "user_input": suggestion_data}, mode="hash"
+        ),
+        model=EVALUATION_MODEL,
+        metadata={
+            "prompt_cache": cache_status,
+            "cache_read_input_tokens": cache_read_tokens,
+            "cache_creation_input_tokens": cache_write_tokens,
+        },
         usage_details={
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
@@ -69,18 +313,107 @@ def evaluate(suggestion_data, system_prompt):
             "cache_read_tokens": cache_read_tokens,
             "total_tokens": input_tokens + output_tokens + cache_write_tokens + cache_read_tokens,
         },
-        cost_details={
-            "input": input_cost,
-            "output": output_cost,
-            "cache_write": cache_write_cost,
-            "cache_read": cache_read_cost,
-            "total": total_cost,
-        }
+        cost_details=costs
     )
 
-    return message.content[0].text
 
-@observe(as_type="tool", name="Claude LLM Call for url extraction")
+@traced(as_type="generation", name=GENERATION_SPAN, capture_input="off")
+@metrics.timed("evaluate")
+def evaluate(suggestion_data, system_prompt, score_dimensions=None):
+    """
+    Evaluate suggestions using Anthropic's Claude model.
+
+    This blocking variant calls the API directly: it does not go through the
+    shared rate limiter (no requests/tokens-per-minute throttling, no
+    adaptive concurrency) and only has the SDK client's own retries
+    (EVAL_MAX_RETRIES). The pipelines use evaluate_async, which is rate-limited.
+
+    Parameters:
+        suggestion_data (dict): The data to evaluate (will be JSON serialized).
+        system_prompt (str | list[str]): The system-level instructions for the
+            model. A list is sent as separate cacheable blocks, e.g.
+            [instruction_prompt, brand_context].
+        score_dimensions (list[str], optional): Rubric dimensions. When given,
+            the reply is schema-constrained via tool use (see score_tool).
+
+    Returns:
+        str: The model's response text (JSON when score_dimensions is given).
+
+    Raises:
+        NonJSONResponseError: the reply started with non-JSON text and was
+            cancelled early (only with EVAL_STREAM_EARLY_ABORT on, and only
+            for free-text replies: score_dimensions replies are not streamed).
+    """
+    request = evaluation_request(suggestion_data, system_prompt, score_dimensions)
+    try:
+        message = _replayed_message(request)
+        if message is None:
+            if _streams(request):
+                message = _stream_message(request)
+            else:
+                message = client.messages.create(**request)
+            cassettes.record(EVALUATE_CASSETTE, request, message)
+    except NonJSONResponseError as e:
+        _record_abort(request, e)
+        _log_aborted_generation(e, suggestion_data, system_prompt)
+        raise
+    _log_evaluation_generation(message, suggestion_data, system_prompt)
+
+    return response_text(message)
+
+
+@traced(as_type="generation", name=GENERATION_SPAN, capture_input="off")
+async def evaluate_async(suggestion_data, system_prompt, score_dimensions=None):
+    """
+    Async variant of evaluate() running on the shared AsyncAnthropic client
+    of the current event loop. Calls go through the shared rate limiter,
+    which throttles to the configured requests/tokens per minute, adapts
+    concurrency to 429/529 responses and retries transient failures.
+    Every attempt is timed as an "evaluate" call; the time spent in the
+    limiter is recorded as the RATE_LIMIT_WAIT_STAGE stage.
+
+    Returns:
+        str: The model's response text (JSON when score_dimensions is given).
+
+    Raises:
+        NonJSONResponseError: as for evaluate().
+    """
+    request = evaluation_request(suggestion_data, system_prompt, score_dimensions)
+    async_client = get_async_anthropic_client()
+    call_seconds = []
+
+    @metrics.timed("evaluate")
+    async def call():
+        start = time.perf_counter()
+        try:
+            if _streams(request):
+                return await _stream_message_async(async_client, request)
+            return await async_client.messages.create(**request)
+        finally:
+            call_seconds.append(time.perf_counter() - start)
+
+    try:
+        # a replayed reply skips the rate limiter along with the network
+        message = _replayed_message(request)
+        if message is None:
+            start = time.perf_counter()
+            try:
+                message = await get_anthropic_rate_limiter().run(
+                    call, estimated_tokens=_estimated_tokens(request), actual_tokens=_used_tokens,
+                )
+            finally:
+                metrics.record_stage(RATE_LIMIT_WAIT_STAGE, time.perf_counter() - start - sum(call_seconds))
+            cassettes.record(EVALUATE_CASSETTE, request, message)
+    except NonJSONResponseError as e:
+        _record_abort(request, e)
+        _log_aborted_generation(e, suggestion_data, system_prompt)
+        raise
+    _log_evaluation_generation(message, suggestion_data, system_prompt)
+
+    return response_text(message)
+
+@traced(as_type="tool", name="Claude LLM Call for url extraction")
+@metrics.timed("url_extraction")
 def url_extracter_1_3(suggestion_data):
     """
     Extract URLs and numeric/statistical claims from any message.
@@ -104,20 +437,35 @@ def url_extracter_1_3(suggestion_data):
     if not isinstance(suggestion_data, str):
         suggestion_data = json.dumps(suggestion_data, indent=2)
 
+    request = dict(
+        model="claude-sonnet-4-20250514",
+        max_tokens=800,
+        system=system_prompt,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": suggestion_data}
+                ]
+            }
+        ],
+        temperature=0.1
+    )
+    # outside the try below: a replay miss must fail loudly, not look like "no URLs"
+    replayed = cassettes.replay(URL_EXTRACTION_CASSETTE, request)
+
     try:
-        resp = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=800,
-            system=system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": suggestion_data}
-                    ]
-                }
-            ],
-            temperature=0.1
+        if replayed is not None:
+            resp = anthropic.types.Message.model_validate(replayed["response"])
+        else:
+            resp = client.messages.create(**request)
+            cassettes.record(URL_EXTRACTION_CASSETTE, request, resp)
+        # Sonnet 4: $3 / MTok input, $15 / MTok output
+        input_tokens = getattr(resp.usage, "input_tokens", 0) or 0
+        output_tokens = getattr(resp.usage, "output_tokens", 0) or 0
+        metrics.record_usage(
+            "url_extraction", cost_usd=(input_tokens * 3 + output_tokens * 15) / 1_000_000,
+            input=input_tokens, output=output_tokens,
         )
 
         raw_output = resp.content[0].text.strip()
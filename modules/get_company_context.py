@@ -1,111 +1,233 @@
-import os
-from openai import OpenAI
-from langfuse import get_client,observe
-langfuse = get_client()
-@observe(as_type="generation", name="Get Brand Context")
-def get_company_context(company_name: str) -> str:
-    """
-    Fetches essential business and marketing context for a given company.
-    Uses OpenAI API and reads key from environment variable OPENAI_API_KEY.
-    
-    Args:
-        company_name (str): The name of the company to fetch context for.
-    
-    Returns:
-        str: A detailed context summary about the company in a fixed schema.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables.")
-    
-    client = OpenAI(api_key=api_key)
-    
-    system_prompt = """
-    You are a business analyst.
-    Given the company name, return essential context about their business, 
-    including: core business segments, product focus, geographic presence, 
-    customer base, growth strategy, and what they do NOT do.
-    Always return the company context 
-    in the following structured schema :
-
-    [Company Name]: Company Overview, Business Segments & Marketing Context
-
-    Core Business Segments
-    1. Segment Name
-       - Product Focus: ...
-       - Market Leadership: ...
-       - Innovation: ...
-       - Geographic Growth: ...
-       - Audience: ...
-
-    2. Segment Name
-       - Product Focus: ...
-       - Growth Drivers: ...
-       - Key Clients: ...
-       - Strategy: ...
-
-    3. Segment Name
-       - Service Focus: ...
-       - Market Position: ...
-       - Consultative Approach: ...
-
-    Comprehensive Business and Marketing Strategies
-    - Global Reach: ...
-    - Brand Differentiation: ...
-    - Expansion Goals: ...
-    - Product & Service Innovation: ...
-
-    Search Marketing Optimization Insights
-    - Keyword & Content Focus: ...
-    - Messaging Priorities: ...
-    - Campaign Localization: ...
-    - Multi-Channel Approach: ...
-
-    What [Company Name] Does Not Do
-    - Clearly list industries or products outside their scope.
-
-    Be structured, concise, and business-relevant. 
-    Do not invent unrelated industries or random details.
-    """
-    
-    # ---- Call OpenAI ----
-    response = client.chat.completions.create(
-        model="gpt-4.1-2025-04-14",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": company_name}
-        ],
-        temperature=0.2,
-    )
-
-    # ---- Extract usage safely ----
-    usage = getattr(response, "usage", {})
-    input_tokens = getattr(usage, "prompt_tokens", 0)
-    output_tokens = getattr(usage, "completion_tokens", 0)
-    total_tokens = getattr(usage, "total_tokens", input_tokens + output_tokens)
-
-    # ---- Pricing for GPT-4.1 (128k) ----
-    input_cost = (input_tokens / 1_000_000) * 5
-    output_cost = (output_tokens / 1_000_000) * 15
-    total_cost = input_cost + output_cost
-
-    # ---- Log to Langfuse ----
-    langfuse.update_current_generation(
-        input={"system_prompt": system_prompt, "company_name": company_name},
-        output=response.choices[0].message.content,
-        model="gpt-4.1-2025-04-14",
-        usage_details={
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "total_tokens": total_tokens,
-        },
-        cost_details={
-            "input": input_cost,
-            "output": output_cost,
-            "total": total_cost,
-        }
-    )
-
-    return response.choices[0].message.content.strip()
-
-
+import os
+import asyncio
+import threading
+from langfuse import get_client
+from openai.types.chat import ChatCompletion
+from modules.tracing import traced
+from modules.metrics import metrics
+from modules.cassettes import cassettes
+from modules.llm_clients import get_openai_client, get_async_openai_client
+from modules.context_cache import CompanyContextCache, context_cache_key
+langfuse = get_client()
+
+COMPANY_CONTEXT_MODEL = "gpt-4.1-2025-04-14"
+COMPANY_CONTEXT_TEMPERATURE = 0.2
+# Cassette name of the recorded calls (see modules.cassettes)
+COMPANY_CONTEXT_CASSETTE = "company_context"
+
+COMPANY_CONTEXT_SYSTEM_PROMPT = """
+    You are a business analyst.
+    Given the company name, return essential context about their business, 
+    including: core business segments, product focus, geographic presence, 
+    customer base, growth strategy, and what they do NOT do.
+    Always return the company context 
+    in the following structured schema :
+
+    [Company Name]: Company Overview, Business Segments & Marketing Context
+
+    Core Business Segments
+    1. Segment Name
+       - Product Focus: ...
+       - Market Leadership: ...
+       - Innovation: ...
+       - Geographic Growth: ...
+       - Audience: ...
+
+    2. Segment Name
+       - Product Focus: ...
+       - Growth Drivers: ...
+       - Key Clients: ...
+       - Strategy: ...
+
+    3. Segment Name
+       - Service Focus: ...
+       - Market Position: ...
+       - Consultative Approach: ...
+
+    Comprehensive Business and Marketing Strategies
+    - Global Reach: ...
+    - Brand Differentiation: ...
+    - Expansion Goals: ...
+    - Product & Service Innovation: ...
+
+    Search Marketing Optimization Insights
+    - Keyword & Content Focus: ...
+    - Messaging Priorities: ...
+    - Campaign Localization: ...
+    - Multi-Channel Approach: ...
+
+    What [Company Name] Does Not Do
+    - Clearly list industries or products outside their scope.
+
+    Be structured, concise, and business-relevant. 
+    Do not invent unrelated industries or random details.
+    """
+
+
+def _context_request(company_name: str) -> dict:
+    """Build the chat.completions.create kwargs for a company-context call."""
+    return {
+        "model": COMPANY_CONTEXT_MODEL,
+        "messages": [
+            {"role": "system", "content": COMPANY_CONTEXT_SYSTEM_PROMPT},
+            {"role": "user", "content": company_name}
+        ],
+        "temperature": COMPANY_CONTEXT_TEMPERATURE,
+    }
+
+
+def _replayed_context(request: dict):
+    """The recorded completion when replaying cassettes, else None."""
+    entry = cassettes.replay(COMPANY_CONTEXT_CASSETTE, request)
+    return ChatCompletion.model_validate(entry["response"]) if entry is not None else None
+
+
+def _log_context_generation(response, company_name: str):
+    """Record usage and cost of a company-context call on the current Langfuse generation."""
+    # ---- Extract usage safely ----
+    usage = getattr(response, "usage", {})
+    input_tokens = getattr(usage, "prompt_tokens", 0)
+    output_tokens = getattr(usage, "completion_tokens", 0)
+    total_tokens = getattr(usage, "total_tokens", input_tokens + output_tokens)
+
+    # ---- Pricing for GPT-4.1 (128k) ----
+    input_cost = (input_tokens / 1_000_000) * 5
+    output_cost = (output_tokens / 1_000_000) * 15
+    total_cost = input_cost + output_cost
+    metrics.record_usage("company_context", cost_usd=total_cost, input=input_tokens, output=output_tokens)
+
+    # ---- Log to Langfuse ----
+    langfuse.update_current_generation(
+        input={"system_prompt": COMPANY_CONTEXT_SYSTEM_PROMPT, "company_name": company_name},
+        output=response.choices[0].message.content,
+        model=COMPANY_CONTEXT_MODEL,
+        usage_details={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": total_tokens,
+        },
+        cost_details={
+            "input": input_cost,
+            "output": output_cost,
+            "total": total_cost,
+        }
+    )
+
+
+@traced(as_type="generation", name="Get Brand Context")
+@metrics.timed("company_context")
+def _fetch_company_context(company_name: str) -> str:
+    # ---- Call OpenAI ----
+    request = _context_request(company_name)
+    response = _replayed_context(request)
+    if response is None:
+        response = get_openai_client().chat.completions.create(**request)
+        cassettes.record(COMPANY_CONTEXT_CASSETTE, request, response)
+    _log_context_generation(response, company_name)
+
+    return response.choices[0].message.content.strip()
+
+
+@traced(as_type="generation", name="Get Brand Context")
+@metrics.timed("company_context")
+async def _fetch_company_context_async(company_name: str) -> str:
+    request = _context_request(company_name)
+    response = _replayed_context(request)
+    if response is None:
+        response = await get_async_openai_client().chat.completions.create(**request)
+        cassettes.record(COMPANY_CONTEXT_CASSETTE, request, response)
+    _log_context_generation(response, company_name)
+
+    return response.choices[0].message.content.strip()
+
+
+# ---- Caching ----
+# Brand context barely changes day to day, so it is cached (memory + disk,
+# see modules/context_cache.py) and concurrent lookups for the same brand
+# share one in-flight request.
+
+context_cache = CompanyContextCache()
+
+_sync_inflight_lock = threading.Lock()
+# cache key -> [lock, threads holding or waiting for it]; the entry is
+# dropped when the last of them is done, like the async tasks below
+_sync_inflight = {}
+_async_inflight = {}
+
+
+def _cache_key(company_name: str) -> str:
+    return context_cache_key(company_name, COMPANY_CONTEXT_MODEL, COMPANY_CONTEXT_SYSTEM_PROMPT)
+
+
+def _store(key: str, company_name: str, context: str):
+    context_cache.put(key, context, brand=company_name, model=COMPANY_CONTEXT_MODEL)
+
+
+@traced(as_type="span", name="Brand Context Lookup")
+def get_company_context(company_name: str, refresh: bool = False) -> str:
+    """
+    Fetches essential business and marketing context for a given company.
+    Uses OpenAI API and reads key from environment variable OPENAI_API_KEY.
+    Results are cached per brand for EVAL_CONTEXT_CACHE_TTL_SECONDS.
+    
+    Args:
+        company_name (str): The name of the company to fetch context for.
+        refresh (bool): Skip the cache lookup and fetch a fresh context.
+    
+    Returns:
+        str: A detailed context summary about the company in a fixed schema.
+    """
+    key = _cache_key(company_name)
+    if not refresh:
+        cached = context_cache.get(key)
+        if cached is not None:
+            return cached
+
+    with _sync_inflight_lock:
+        entry = _sync_inflight.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            # another thread may have filled the cache while we waited
+            if not refresh:
+                cached = context_cache.get(key)
+                if cached is not None:
+                    return cached
+
+            context = _fetch_company_context(company_name)
+            _store(key, company_name, context)
+            return context
+    finally:
+        with _sync_inflight_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _sync_inflight[key]
+
+
+@traced(as_type="span", name="Brand Context Lookup")
+async def get_company_context_async(company_name: str, refresh: bool = False) -> str:
+    """
+    Async variant of get_company_context() running on the shared AsyncOpenAI
+    client of the current event loop. Concurrent callers for the same brand
+    await a single request.
+    """
+    key = _cache_key(company_name)
+    if not refresh:
+        cached = context_cache.get(key)
+        if cached is not None:
+            return cached
+
+    inflight_key = (asyncio.get_running_loop(), key)
+    task = _async_inflight.get(inflight_key)
+    if task is None:
+        async def fetch():
+            context = await _fetch_company_context_async(company_name)
+            _store(key, company_name, context)
+            return context
+
+        task = asyncio.ensure_future(fetch())
+        _async_inflight[inflight_key] = task
+        task.add_done_callback(lambda _: _async_inflight.pop(inflight_key, None))
+
+    # shield so one cancelled caller does not cancel the request for the others
+    return await asyncio.shield(task)
@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from modules.storage import data_path
+from modules.metrics import metrics
+
+logger = logging.getLogger("Aqxle-eval-api")
+
+JOB_DB_PATH = os.getenv("EVAL_JOB_DB_PATH", data_path("jobs.sqlite3"))
+# Global cap: number of pipelines running at once across all job types
+JOB_WORKERS = int(os.getenv("EVAL_JOB_WORKERS", "4"))
+# How often idle workers re-check the table even without a wake-up
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("EVAL_JOB_POLL_INTERVAL_SECONDS", "5"))
+# A job interrupted this many times (e.g. it keeps crashing the process) is
+# marked failed at the next restart instead of being re-queued again
+JOB_MAX_ATTEMPTS = int(os.getenv("EVAL_JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def pipeline_limit_from_env(pipeline: str, default: int) -> int:
+    """Per-pipeline concurrency cap, e.g. EVAL_MAX_JOBS_AD_COPY for pipeline "ad_copy"."""
+    return int(os.getenv(f"EVAL_MAX_JOBS_{pipeline.upper()}", str(default)))
+
+
+class JobStore:
+    """SQLite-backed job table. Every state change is committed before it is acted on."""
+
+    def __init__(self, path: str = JOB_DB_PATH, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " pipeline TEXT NOT NULL,"
+            " brand TEXT NOT NULL,"
+            " date TEXT,"
+            " input_path TEXT NOT NULL,"
+            " output_path TEXT NOT NULL,"
+            " options TEXT NOT NULL DEFAULT '{}',"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " result TEXT,"
+            " error TEXT)"
+        )
+        self._add_missing_columns({"progress_done": "INTEGER NOT NULL DEFAULT 0", "progress_total": "INTEGER"})
+        # status/result lookups must stay O(log n) however many historical jobs exist
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_brand_date ON jobs (brand, date, status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_date ON jobs (date, status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at)")
+        self._conn.commit()
+
+    def _add_missing_columns(self, columns: Dict[str, str]) -> None:
+        """Bring tables created by older versions up to date."""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in columns.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def enqueue(self, job_id: str, pipeline: str, brand: str, date: Optional[str], input_path: str,
+                output_path: str, options: Optional[Dict[str, Any]] = None) -> None:
+        self._execute(
+            "INSERT INTO jobs (job_id, pipeline, brand, date, input_path, output_path, options, status, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, pipeline, brand, date, input_path, output_path, json.dumps(options or {}), QUEUED, time.time()),
+        )
+
+    def claim_next(self, pipelines: List[str]) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job of one of `pipelines` to running and return it."""
+        if not pipelines:
+            return None
+        placeholders = ",".join("?" for _ in pipelines)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND pipeline IN ({placeholders})"
+                " ORDER BY created_at LIMIT 1",
+                (QUEUED, *pipelines),
+            ).fetchone()
+            if row is None:
+                return None
+            started_at = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (RUNNING, started_at, row["job_id"]),
+            )
+            self._conn.commit()
+        job = self._to_dict(row)
+        job.update(status=RUNNING, started_at=started_at, attempts=job["attempts"] + 1)
+        return job
+
+    def mark_succeeded(self, job_id: str, result: Any) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = NULL WHERE job_id = ?",
+            (SUCCEEDED, time.time(), json.dumps(result, default=str), job_id),
+        )
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+            (FAILED, time.time(), error, job_id),
+        )
+
+    def update_progress(self, job_id: str, done: int, total: int) -> None:
+        self._execute(
+            "UPDATE jobs SET progress_done = ?, progress_total = ? WHERE job_id = ?", (done, total, job_id)
+        )
+
+    def requeue_interrupted(self) -> int:
+        """
+        Put jobs left running by a previous process back in the queue;
+        returns how many. Jobs that have already been started max_attempts
+        times are marked failed instead.
+        """
+        with self._lock:
+            given_up = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE status = ? AND attempts >= ?",
+                (FAILED, time.time(), f"Interrupted {self.max_attempts} times; not retried again",
+                 RUNNING, self.max_attempts),
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)
+            ).rowcount
+            self._conn.commit()
+        if given_up:
+            logger.warning("Marked %d interrupted job(s) failed after %d attempts", given_up, self.max_attempts)
+        return requeued
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, brand: Optional[str] = None, date: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs matching every given filter, served from the indexes above."""
+        clauses, params = [], []
+        for column, value in (("brand", brand), ("date", date), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["options"] = json.loads(job.get("options") or "{}")
+        if job.get("result"):
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+JobRunner = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Fixed pool of asyncio workers draining a JobStore.
+
+    `runners` maps a pipeline name to an async callable taking the job dict.
+    At most `workers` jobs run at once overall and at most
+    `pipeline_limits[name]` of a given pipeline. Jobs interrupted by a
+    restart are re-queued when the queue starts.
+    """
+
+    def __init__(self, store: JobStore, runners: Dict[str, JobRunner], workers: int = JOB_WORKERS,
+                 pipeline_limits: Optional[Dict[str, int]] = None):
+        self.store = store
+        self.runners = runners
+        self.workers = max(1, workers)
+        self.pipeline_limits = {name: self.workers for name in runners}
+        self.pipeline_limits.update(pipeline_limits or {})
+        self._running = {name: 0 for name in runners}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, job_id: str, pipeline: str, brand: str, date: Optional[str], input_path: str,
+               output_path: str, options: Optional[Dict[str, Any]] = None) -> None:
+        if pipeline not in self.runners:
+            raise ValueError(f"Unknown pipeline: {pipeline}")
+        self.store.enqueue(job_id, pipeline, brand, date, input_path, output_path, options)
+        self._notify()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        resumed = self.store.requeue_interrupted()
+        if resumed:
+            logger.info("Re-queued %d job(s) interrupted by the last shutdown", resumed)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"eval-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._notify()
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running stay 'running' and resume on next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _eligible_pipelines(self) -> List[str]:
+        return [name for name, running in self._running.items() if running < self.pipeline_limits[name]]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = self.store.claim_next(self._eligible_pipelines())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            pipeline = job["pipeline"]
+            self._running[pipeline] += 1
+            try:
+                logger.info("Worker %d starting job %s (%s, attempt %d)", index, job["job_id"], pipeline, job["attempts"])
+                with metrics.job_scope(job["job_id"], pipeline) as job_metrics:
+                    result = await self.runners[pipeline](job)
+                if isinstance(result, dict):
+                    # kept with the result so the breakdown outlives this process
+                    result = {**result, "metrics": job_metrics.summary()}
+                self.store.mark_succeeded(job["job_id"], result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Job %s failed: %s", job["job_id"], str(e))
+                self.store.mark_failed(job["job_id"], str(e))
+            finally:
+                self._running[pipeline] -= 1
+                self._notify()
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job row: status, progress, timings, call/stage metrics and output location."""
+    now = time.time()
+    started_at, finished_at = job.get("started_at"), job.get("finished_at")
+    result = job.get("result")
+    stored_metrics = None
+    if isinstance(result, dict) and "metrics" in result:
+        result = dict(result)
+        stored_metrics = result.pop("metrics")
+    return {
+        "job_id": job["job_id"],
+        "pipeline": job["pipeline"],
+        "brand": job["brand"],
+        "date": job["date"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "progress": {"done": job.get("progress_done") or 0, "total": job.get("progress_total")},
+        "timings": {
+            "created_at": job["created_at"],
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "queued_seconds": ((started_at or now) - job["created_at"]),
+            "run_seconds": ((finished_at or now) - started_at) if started_at else None,
+        },
+        "metrics": metrics.job_summary(job["job_id"]) or stored_metrics,
+        "output_path": job["output_path"],
+        "result": result,
+        "error": job.get("error"),
+    }
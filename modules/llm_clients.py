@@ -0,0 +1,110 @@
+import os
+import asyncio
+import weakref
+import threading
+
+import anthropic
+import httpx
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
+from openai import DefaultAsyncHttpxClient as OpenAIAsyncHttpxClient
+
+from modules.rate_limiter import MAX_RETRIES
+
+repo_root = os.path.dirname(os.path.dirname(__file__))
+dotenv_path = os.path.join(repo_root, ".env")
+
+load_dotenv(dotenv_path)
+
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+if not ANTHROPIC_API_KEY:
+    raise ValueError("ANTHROPIC_API_KEY not found in .env file. Please set it before using the library.")
+
+# Connection pool shared by every request made through one client
+HTTP_MAX_CONNECTIONS = int(os.getenv("EVAL_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("EVAL_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("EVAL_HTTP_KEEPALIVE_EXPIRY", "120"))
+# Per-request timeout; a hung call is retried instead of stalling its job
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("EVAL_REQUEST_TIMEOUT_SECONDS", "180"))
+
+_lock = threading.Lock()
+_sync_clients = {}
+# httpx async pools are bound to the event loop that opened them, so async
+# clients are kept per loop: the API server's loop reuses one client for its
+# whole lifetime, while each asyncio.run() from a script gets its own.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _openai_api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables.")
+    return api_key
+
+
+def get_anthropic_client() -> anthropic.Anthropic:
+    """Return the process-wide sync Anthropic client."""
+    with _lock:
+        if "anthropic" not in _sync_clients:
+            _sync_clients["anthropic"] = anthropic.Anthropic(
+                api_key=ANTHROPIC_API_KEY, timeout=REQUEST_TIMEOUT_SECONDS, max_retries=MAX_RETRIES
+            )
+        return _sync_clients["anthropic"]
+
+
+def get_openai_client() -> OpenAI:
+    """Return the process-wide sync OpenAI client."""
+    with _lock:
+        if "openai" not in _sync_clients:
+            _sync_clients["openai"] = OpenAI(api_key=_openai_api_key())
+        return _sync_clients["openai"]
+
+
+def _loop_clients() -> dict:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def get_async_anthropic_client() -> anthropic.AsyncAnthropic:
+    """Return the AsyncAnthropic client for the running event loop, creating it on first use."""
+    clients = _loop_clients()
+    if "anthropic" not in clients:
+        clients["anthropic"] = anthropic.AsyncAnthropic(
+            api_key=ANTHROPIC_API_KEY,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=_pool_limits()),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            # retries, backoff and rate limiting are handled by modules.rate_limiter
+            max_retries=0,
+        )
+    return clients["anthropic"]
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the AsyncOpenAI client for the running event loop, creating it on first use."""
+    clients = _loop_clients()
+    if "openai" not in clients:
+        clients["openai"] = AsyncOpenAI(
+            api_key=_openai_api_key(),
+            http_client=OpenAIAsyncHttpxClient(limits=_pool_limits()),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    return clients["openai"]
+
+
+async def close_async_clients():
+    """Close the async clients owned by the running event loop (call on shutdown)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        await client.close()
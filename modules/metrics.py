@@ -0,0 +1,291 @@
+import os
+import time
+import inspect
+import threading
+import functools
+import contextvars
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# In-process metrics: latency histograms plus token and cost counters for
+# every external call (judge, brand context, URL extraction), durations of
+# pipeline stages and of whole jobs. Everything is aggregated globally
+# (rendered for Prometheus by render_prometheus) and, inside a job_scope,
+# per job as well (JobMetrics.summary, shown in the job status).
+
+# Latency bucket bounds in seconds (Prometheus "le" labels)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600)
+# Recent samples kept per series for percentiles; bounds memory per series
+RESERVOIR_SIZE = int(os.getenv("EVAL_METRICS_RESERVOIR_SIZE", "2048"))
+# Finished jobs whose metrics stay in memory for the status endpoint
+JOBS_KEPT = int(os.getenv("EVAL_METRICS_JOBS_KEPT", "200"))
+
+TOKEN_KINDS = ("input", "output", "cache_read", "cache_write")
+PERCENTILES = (50, 90, 99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count, plus a reservoir of recent samples for percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        samples = sorted(self.recent)
+        result = {}
+        for p in PERCENTILES:
+            result[f"p{p}"] = samples[min(len(samples) - 1, int(len(samples) * p / 100))] if samples else None
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_seconds": self.sum / self.count if self.count else None,
+            **{f"{name}_seconds": value for name, value in self.percentiles().items()},
+            "max_seconds": self.max if self.count else None,
+        }
+
+
+class MetricSet:
+    """Histograms and counters keyed by (metric name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float, labels: Labels) -> None:
+        if not amount:
+            return
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+
+class JobMetrics(MetricSet):
+    def __init__(self, job_id: str, pipeline: str):
+        super().__init__()
+        self.job_id = job_id
+        self.pipeline = pipeline
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Per call: latency percentiles, errors, tokens and cost; per stage: durations."""
+        calls: Dict[str, Dict[str, Any]] = {}
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (name, labels), histogram in self.histograms.items():
+                label_map = dict(labels)
+                if name == "call_duration_seconds":
+                    entry = calls.setdefault(label_map["call"], {"count": 0, "errors": 0})
+                    entry["count"] += histogram.count
+                    if label_map.get("status") == "error":
+                        entry["errors"] += histogram.count
+                    else:
+                        entry["latency"] = histogram.summary()
+                elif name == "stage_duration_seconds":
+                    stages[label_map["stage"]] = {
+                        "count": histogram.count, "total_seconds": histogram.sum, "max_seconds": histogram.max
+                    }
+            for (name, labels), value in self.counters.items():
+                label_map = dict(labels)
+                entry = calls.setdefault(label_map["call"], {"count": 0, "errors": 0})
+                if name == "call_tokens_total":
+                    entry.setdefault("tokens", dict.fromkeys(TOKEN_KINDS, 0))[label_map["kind"]] += int(value)
+                elif name == "call_cost_usd_total":
+                    entry["cost_usd"] = round(value, 6)
+        total_cost = sum(entry.get("cost_usd", 0) for entry in calls.values())
+        end = self.finished or time.time()
+        return {
+            "wall_seconds": end - self.started,
+            "cost_usd": round(total_cost, 6),
+            "calls": calls,
+            "stages": stages,
+        }
+
+
+class MetricsRegistry(MetricSet):
+    def __init__(self):
+        super().__init__()
+        self.jobs: "OrderedDict[str, JobMetrics]" = OrderedDict()
+        self._current_job: contextvars.ContextVar[Optional[JobMetrics]] = contextvars.ContextVar(
+            "eval_job_metrics", default=None
+        )
+
+    # ---- recording ----
+
+    def _record(self, method: str, name: str, value: float, labels: Labels) -> None:
+        """Record globally and, inside a job_scope, on the current job too."""
+        job = self._current_job.get()
+        getattr(self, method)(name, value, labels)
+        if job is not None:
+            getattr(job, method)(name, value, labels)
+
+    def record_call(self, call: str, seconds: float, error: bool = False) -> None:
+        self._record("observe", "call_duration_seconds", seconds, _labels(call=call, status="error" if error else "ok"))
+
+    def record_usage(self, call: str, cost_usd: float = 0.0, **tokens: int) -> None:
+        """Tokens by kind (input, output, cache_read, cache_write) and cost of one call."""
+        for kind, count in tokens.items():
+            self._record("inc", "call_tokens_total", count or 0, _labels(call=call, kind=kind))
+        self._record("inc", "call_cost_usd_total", cost_usd, _labels(call=call))
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        job = self._current_job.get()
+        pipeline = job.pipeline if job is not None else ""
+        self._record("observe", "stage_duration_seconds", seconds, _labels(pipeline=pipeline, stage=stage))
+
+    # ---- scopes ----
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Time a pipeline stage (works around sync and async code alike)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def job_scope(self, job_id: str, pipeline: str) -> Iterator[JobMetrics]:
+        """Attribute everything recorded in this context (and tasks started from it) to a job."""
+        job = JobMetrics(job_id, pipeline)
+        with self._lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > JOBS_KEPT:
+                self.jobs.popitem(last=False)
+        token = self._current_job.set(job)
+        status = "failed"
+        try:
+            yield job
+            status = "succeeded"
+        finally:
+            self._current_job.reset(token)
+            job.finished = time.time()
+            self.observe("job_duration_seconds", job.finished - job.started, _labels(pipeline=pipeline, status=status))
+            self.inc("job_cost_usd_total", job.summary()["cost_usd"], _labels(pipeline=pipeline))
+
+    def job_summary(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return job.summary() if job is not None else None
+
+    def timed(self, call: str):
+        """Decorator recording latency and error status of every call of a sync or async function."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except BaseException:
+                        self.record_call(call, time.perf_counter() - start, error=True)
+                        raise
+                    self.record_call(call, time.perf_counter() - start)
+                    return result
+            else:
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        result = func(*args, **kwargs)
+                    except BaseException:
+                        self.record_call(call, time.perf_counter() - start, error=True)
+                        raise
+                    self.record_call(call, time.perf_counter() - start)
+                    return result
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        """Forget everything recorded so far (e.g. between benchmark runs)."""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.jobs.clear()
+
+    # ---- export ----
+
+    def summary(self) -> Dict[str, Any]:
+        """Process-wide view in the same shape as a job's summary."""
+        everything = JobMetrics("*", "")
+        with self._lock:
+            everything.histograms = {k: v for k, v in self.histograms.items() if k[0] != "job_duration_seconds"}
+            everything.counters = {k: v for k, v in self.counters.items() if k[0] != "job_cost_usd_total"}
+        summary = everything.summary()
+        summary.pop("wall_seconds")
+        return summary
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        help_text = {
+            "call_duration_seconds": ("histogram", "Latency of external calls (judge, brand context, URL extraction)"),
+            "stage_duration_seconds": ("histogram", "Duration of pipeline stages"),
+            "job_duration_seconds": ("histogram", "Duration of API jobs"),
+            "call_tokens_total": ("counter", "Tokens used by external calls, by kind"),
+            "call_cost_usd_total": ("counter", "Estimated cost of external calls in USD"),
+            "job_cost_usd_total": ("counter", "Estimated cost of API jobs in USD"),
+        }
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines: List[str] = []
+        seen = set()
+
+        def header(name):
+            if name not in seen:
+                seen.add(name)
+                kind, text = help_text.get(name, ("untyped", name))
+                lines.append(f"# HELP eval_{name} {text}")
+                lines.append(f"# TYPE eval_{name} {kind}")
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        for (name, labels), histogram in histograms:
+            header(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"eval_{name}_bucket{fmt(labels, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"eval_{name}_bucket{fmt(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"eval_{name}_sum{fmt(labels)} {histogram.sum}")
+            lines.append(f"eval_{name}_count{fmt(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"eval_{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,61 @@
+import os
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+# Rule-based screening that runs before any judge call. An item that fails
+# a rule is written as a "skipped" row with the reason instead of paying
+# the model to reply that there is nothing to evaluate.
+PREFLIGHT_ENABLED = os.getenv("EVAL_PREFLIGHT", "1").lower() not in ("0", "false", "no")
+# Serialized size above which an item is skipped (~4 chars per token, so 200k chars ~ 50k tokens)
+MAX_PAYLOAD_CHARS = int(os.getenv("EVAL_PREFLIGHT_MAX_PAYLOAD_CHARS", "200000"))
+
+SKIPPED = "skipped"
+
+
+def _is_blank(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return not value.strip()
+    if isinstance(value, (dict, list, tuple)):
+        return len(value) == 0
+    return False
+
+
+def _oversized(payload: Any) -> Optional[str]:
+    size = len(json.dumps(payload, ensure_ascii=False, default=str))
+    if size > MAX_PAYLOAD_CHARS:
+        return f"payload too large (over {MAX_PAYLOAD_CHARS} chars)"
+    return None
+
+
+def screen_trend(datapoint: Any, require_analysis: bool = True) -> Optional[str]:
+    """Reason a trend item should not be sent to the judge, or None if it is fine."""
+    if not PREFLIGHT_ENABLED:
+        return None
+    if not isinstance(datapoint, dict):
+        return f"item is a {type(datapoint).__name__}, expected an object"
+    if _is_blank(datapoint.get("trend")):
+        return "missing trend"
+    if require_analysis and _is_blank(datapoint.get("analysis")):
+        return "empty analysis"
+    return _oversized(datapoint)
+
+
+def screen_summary(summary_data: Any) -> Optional[str]:
+    """Reason a branded/non-branded summary block should not be judged, or None."""
+    if not PREFLIGHT_ENABLED:
+        return None
+    if not isinstance(summary_data, dict):
+        return f"item is a {type(summary_data).__name__}, expected an object"
+    if _is_blank(summary_data.get("summary")):
+        return "empty summary"
+    if _is_blank(summary_data.get("keywords")):
+        return "empty keywords"
+    return _oversized(summary_data)
+
+
+def skip_counts(reasons: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Per-reason count of skipped items (the None entries are items that passed)."""
+    return dict(Counter(reason for reason in reasons if reason is not None))
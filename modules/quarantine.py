@@ -0,0 +1,54 @@
+import os
+import time
+import hashlib
+from typing import Any, Optional
+
+from modules.storage import data_path, write_json_atomic
+from modules.result_cache import canonical_json
+from modules.eval_functions import NonJSONResponseError, evaluate_async, system_prompt_text
+
+QUARANTINE_DIR = os.getenv("EVAL_QUARANTINE_DIR", data_path("quarantine"))
+# Extra attempts for an item whose judge reply was aborted as non-JSON
+NON_JSON_RETRIES = int(os.getenv("EVAL_NON_JSON_RETRIES", "1"))
+
+QUARANTINED = "quarantined"
+
+
+class QuarantinedError(Exception):
+    """The item kept producing non-JSON judge replies and was set aside for review."""
+
+    def __init__(self, message: str, path: str):
+        super().__init__(f"{message} (quarantined to {path})")
+        self.path = path
+
+
+def quarantine_item(suggestion_data: Any, system_prompt, reply_prefix: str, label: str = "") -> str:
+    """Write the item, a hash of its prompt and the rejected reply to QUARANTINE_DIR; returns the file path."""
+    digest = hashlib.sha256(canonical_json(suggestion_data).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(QUARANTINE_DIR, time.strftime("%Y-%m-%d"), f"{digest}.json")
+    write_json_atomic(path, {
+        "label": label,
+        "quarantined_at": time.time(),
+        "system_prompt_sha256": hashlib.sha256(system_prompt_text(system_prompt).encode("utf-8")).hexdigest(),
+        "suggestion_data": suggestion_data,
+        "reply_prefix": reply_prefix,
+    })
+    return path
+
+
+async def evaluate_or_quarantine(suggestion_data, system_prompt, score_dimensions=None, label: str = "",
+                                 retries: Optional[int] = None) -> str:
+    """
+    evaluate_async() that retries an early-aborted non-JSON reply up to
+    `retries` times (EVAL_NON_JSON_RETRIES) and then quarantines the item,
+    raising QuarantinedError so the pipeline can mark its row.
+    """
+    retries = NON_JSON_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return await evaluate_async(suggestion_data, system_prompt, score_dimensions)
+        except NonJSONResponseError as e:
+            error = e
+            print(f" Non-JSON judge reply for {label or 'item'} (attempt {attempt + 1}/{retries + 1})")
+    path = quarantine_item(suggestion_data, system_prompt, error.prefix, label)
+    raise QuarantinedError(str(error), path)
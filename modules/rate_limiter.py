@@ -0,0 +1,194 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import weakref
+import threading
+from typing import Awaitable, Callable, Optional
+
+import anthropic
+
+logger = logging.getLogger("Aqxle-eval")
+
+# Static quota (0 = no static cap; the adaptive concurrency limit still applies)
+ANTHROPIC_REQUESTS_PER_MINUTE = float(os.getenv("EVAL_ANTHROPIC_RPM", "0"))
+ANTHROPIC_TOKENS_PER_MINUTE = float(os.getenv("EVAL_ANTHROPIC_TPM", "0"))
+# Adaptive (AIMD) concurrency window for in-flight requests
+ANTHROPIC_MAX_CONCURRENCY = int(os.getenv("EVAL_ANTHROPIC_MAX_CONCURRENCY", "16"))
+ANTHROPIC_MIN_CONCURRENCY = int(os.getenv("EVAL_ANTHROPIC_MIN_CONCURRENCY", "1"))
+# Retry policy
+MAX_RETRIES = int(os.getenv("EVAL_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("EVAL_RETRY_BASE_DELAY_SECONDS", "1"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("EVAL_RETRY_MAX_DELAY_SECONDS", "60"))
+
+# 408 timeout, 409 conflict, 429 rate limited, 5xx server errors, 529 overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Statuses that mean "you are sending too much": shrink the concurrency window
+BACKOFF_STATUS_CODES = {429, 529}
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`, holding at most one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float):
+        # a single request larger than the bucket can only ever wait for a full bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate_per_second)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, delta: float):
+        """Credit back (delta < 0) or charge extra (delta > 0) once the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, anthropic.APIConnectionError):  # includes APITimeoutError
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-requested delay from retry-after-ms / retry-after headers, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+    requested = retry_after_seconds(error) if error is not None else None
+    if requested is not None:
+        delay = max(delay, min(requested, RETRY_MAX_DELAY_SECONDS))
+    return delay
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared gate in front of one provider's API.
+
+    - requests/min and tokens/min token buckets (when configured)
+    - an AIMD concurrency window: +1/window per success, halved on 429/529
+      (at most once per second, so a burst of 429s counts as one signal)
+    - jittered exponential backoff honouring retry-after headers
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 16, min_concurrency: int = 1, max_retries: int = MAX_RETRIES):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.rate_limited_count = 0
+        self._last_decrease = 0.0
+        self._slot_freed = asyncio.Condition()
+
+    async def _acquire_slot(self):
+        async with self._slot_freed:
+            await self._slot_freed.wait_for(lambda: self.in_flight < int(self.concurrency_limit))
+            self.in_flight += 1
+
+    async def _release_slot(self):
+        async with self._slot_freed:
+            self.in_flight -= 1
+            self._slot_freed.notify_all()
+
+    def _on_success(self):
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+    def _on_backoff_signal(self):
+        self.rate_limited_count += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self._last_decrease = now
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+            logger.warning("Rate limited; concurrency window reduced to %d", int(self.concurrency_limit))
+
+    async def run(self, call: Callable[[], Awaitable], estimated_tokens: float = 0,
+                  actual_tokens: Optional[Callable[[object], float]] = None):
+        """
+        Await call() under the limiter, retrying retryable errors. After a
+        success, actual_tokens(result) reconciles the token bucket with the
+        real usage.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None:
+                await self.token_bucket.acquire(estimated_tokens)
+
+            await self._acquire_slot()
+            try:
+                result = await call()
+            except Exception as e:
+                if _status_code(e) in BACKOFF_STATUS_CODES:
+                    self._on_backoff_signal()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, e)
+                logger.warning(
+                    "Retryable error (%s), attempt %d/%d; retrying in %.1fs",
+                    type(e).__name__, attempt + 1, self.max_retries, delay,
+                )
+            else:
+                self._on_success()
+                if self.token_bucket is not None and actual_tokens is not None:
+                    self.token_bucket.adjust(actual_tokens(result) - estimated_tokens)
+                return result
+            finally:
+                await self._release_slot()
+
+            await asyncio.sleep(delay)
+
+
+_lock = threading.Lock()
+# asyncio primitives belong to one event loop, so limiters are kept per loop
+# (like the async clients in modules/llm_clients.py)
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_anthropic_rate_limiter() -> AdaptiveRateLimiter:
+    """Return the Anthropic limiter shared by every call on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        limiters = _limiters.setdefault(loop, {})
+        if "anthropic" not in limiters:
+            limiters["anthropic"] = AdaptiveRateLimiter(
+                requests_per_minute=ANTHROPIC_REQUESTS_PER_MINUTE,
+                tokens_per_minute=ANTHROPIC_TOKENS_PER_MINUTE,
+                max_concurrency=ANTHROPIC_MAX_CONCURRENCY,
+                min_concurrency=ANTHROPIC_MIN_CONCURRENCY,
+            )
+        return limiters["anthropic"]
@@ -0,0 +1,247 @@
+"""
+Offline re-scoring of stored evaluation results under new rubric weights.
+
+The judge's raw JSON reply is kept in the `reasoning` column of every
+result CSV, so a weight change does not need new judge calls: the raw
+per-dimension scores are parsed once into an (items x dimensions) matrix
+and any weight vector is applied to all rows in a single matrix product.
+
+    python -m modules.rescore --rubric ad_copy_trend --weights strategic=0.3,clarity=0 \\
+        --output rescored.csv evals/1.3_*.csv
+    python -m modules.rescore --rubric keyword_trend --row-type trend_analysis \\
+        --matrix trends.npz evals/1.2_*.csv
+
+--matrix caches the parsed matrix as .npz together with the rubric, row
+type and the paths, sizes and mtimes of the CSVs it was built from. A later
+run loads it only while all of those still match (without CSV arguments it
+re-checks the recorded ones) and rebuilds it otherwise.
+"""
+import io
+import os
+import json
+import time
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.rubrics import RUBRICS, Rubric, get_rubric, parse_judge_output, score_matrix, score_vector
+
+CSV_CHUNK_ROWS = int(os.getenv("EVAL_RESCORE_CHUNK_ROWS", "100000"))
+# Columns carried into the re-scored output to identify each row
+KEY_COLUMNS = ["type", "trend", "summary"]
+
+
+def _judge_json(text) -> Optional[dict]:
+    """Decode a stored judge reply; None for failed/skipped rows or broken JSON."""
+    if not isinstance(text, str) or not text.strip().startswith(("{", "```")):
+        return None
+    try:
+        output = parse_judge_output(text)
+    except ValueError:
+        return None
+    return output if isinstance(output, dict) else None
+
+
+def raw_score_matrix(rubric: Rubric, replies: Iterable) -> np.ndarray:
+    """(items x dimensions) raw scores in rubric order; all-NaN rows where a reply is unusable."""
+    empty = np.full(len(rubric.dimensions), np.nan)
+    rows = []
+    for reply in replies:
+        output = _judge_json(reply)
+        rows.append(empty if output is None else score_vector(rubric, output))
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(rubric.dimensions))
+
+
+def load_raw_scores(rubric: Rubric, csv_paths: Sequence[str], row_type: Optional[str] = None,
+                    chunk_rows: int = CSV_CHUNK_ROWS) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Read result CSVs in chunks and parse their `reasoning` column. Returns
+    the identifying columns of every scored row (source file, row number,
+    type/trend/summary, stored normalized_score) and the matching score matrix.
+    Rows with no usable judge reply (failed, skipped, quarantined) are dropped.
+    """
+    frames, matrices = [], []
+    for path in csv_paths:
+        offset = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            if row_type is not None and "type" in chunk:
+                chunk = chunk[chunk["type"] == row_type]
+            if "reasoning" not in chunk:
+                raise ValueError(f"{path} has no reasoning column")
+
+            matrix = raw_score_matrix(rubric, chunk["reasoning"])
+            usable = ~np.isnan(matrix).all(axis=1)
+            keys = chunk.loc[usable, [c for c in KEY_COLUMNS if c in chunk]].copy()
+            keys.insert(0, "row", chunk.index[usable])
+            keys.insert(0, "source", os.path.basename(path))
+            keys["stored_normalized_score"] = pd.to_numeric(
+                chunk.loc[usable, "normalized_score"] if "normalized_score" in chunk else np.nan, errors="coerce"
+            )
+            frames.append(keys)
+            matrices.append(matrix[usable])
+
+    keys = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["source", "row"])
+    matrix = np.concatenate(matrices) if matrices else np.empty((0, len(rubric.dimensions)))
+    return keys, matrix
+
+
+def source_stats(csv_paths: Sequence[str]) -> List[Dict]:
+    """Absolute path, size and mtime of each result CSV, to tell whether a saved matrix is still current."""
+    stats = []
+    for path in csv_paths:
+        st = os.stat(path)
+        stats.append({"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return sorted(stats, key=lambda source: source["path"])
+
+
+def save_raw_scores(path: str, rubric: Rubric, keys: pd.DataFrame, matrix: np.ndarray,
+                    csv_paths: Sequence[str] = (), row_type: Optional[str] = None) -> None:
+    np.savez_compressed(
+        path, rubric=rubric.name, dimensions=np.array(rubric.dimensions), scores=matrix,
+        keys=keys.to_json(orient="split", index=False),
+        sources=json.dumps(source_stats(csv_paths)), row_type=row_type or "",
+    )
+
+
+def saved_matrix_info(path: str) -> Dict:
+    """Rubric, dimensions, row type and sources a saved matrix was built with (sources None if not recorded)."""
+    with np.load(path, allow_pickle=False) as saved:
+        return {
+            "rubric": str(saved["rubric"]),
+            "dimensions": list(saved["dimensions"]),
+            "row_type": (str(saved["row_type"]) or None) if "row_type" in saved.files else None,
+            "sources": json.loads(str(saved["sources"])) if "sources" in saved.files else None,
+        }
+
+
+def load_saved_raw_scores(path: str, rubric: Rubric) -> Tuple[pd.DataFrame, np.ndarray]:
+    with np.load(path, allow_pickle=False) as saved:
+        if str(saved["rubric"]) != rubric.name or list(saved["dimensions"]) != rubric.dimensions:
+            raise ValueError(f"{path} holds scores for rubric {saved['rubric']}, not {rubric.name}")
+        keys = pd.read_json(io.StringIO(str(saved["keys"])), orient="split")
+        return keys, saved["scores"]
+
+
+def stale_reason(info: Dict, rubric: Rubric, csv_paths: Sequence[str], row_type: Optional[str]) -> Optional[str]:
+    """Why a saved matrix (see saved_matrix_info) does not match these inputs; None if it does."""
+    if info["rubric"] != rubric.name or info["dimensions"] != rubric.dimensions:
+        return f"it holds scores for rubric {info['rubric']}"
+    if info["sources"] is None:
+        return "it does not record the CSVs it was built from"
+    if info["row_type"] != row_type:
+        return f"it was built for row type {info['row_type']!r}, not {row_type!r}"
+    if sorted(os.path.abspath(p) for p in csv_paths) != [source["path"] for source in info["sources"]]:
+        return "it was built from other CSVs"
+    if source_stats(csv_paths) != info["sources"]:
+        return "a CSV changed since it was built"
+    return None
+
+
+def load_or_build_raw_scores(rubric: Rubric, csv_paths: Sequence[str], row_type: Optional[str] = None,
+                             matrix_path: Optional[str] = None) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    The raw scores of csv_paths: loaded from the .npz at matrix_path while it
+    matches the rubric, row type and CSVs, otherwise parsed from the CSVs
+    (and saved to matrix_path). With no csv_paths the CSVs and row type
+    recorded in the saved matrix are re-checked; if those CSVs are gone the
+    saved matrix is used as it is.
+    """
+    if matrix_path and os.path.exists(matrix_path):
+        info = saved_matrix_info(matrix_path)
+        reason = None
+        if not csv_paths and info["sources"] is not None:
+            csv_paths = [source["path"] for source in info["sources"]]
+            row_type = row_type if row_type is not None else info["row_type"]
+            if not all(os.path.exists(path) for path in csv_paths):
+                print(f" Source CSVs of {matrix_path} are gone; using it without re-checking")
+                csv_paths = []
+        if csv_paths:
+            reason = stale_reason(info, rubric, csv_paths, row_type)
+        if reason is None:
+            keys, matrix = load_saved_raw_scores(matrix_path, rubric)
+            print(f" Loaded {len(matrix)} scored rows from {matrix_path}")
+            return keys, matrix
+        print(f" Rebuilding {matrix_path}: {reason}")
+
+    if not csv_paths:
+        raise ValueError("no result CSVs given and no saved matrix to load")
+    keys, matrix = load_raw_scores(rubric, csv_paths, row_type=row_type)
+    print(f" Parsed {len(matrix)} scored rows from {len(csv_paths)} file(s)")
+    if matrix_path:
+        save_raw_scores(matrix_path, rubric, keys, matrix, csv_paths=csv_paths, row_type=row_type)
+        print(f" Saved score matrix to {matrix_path}")
+    return keys, matrix
+
+
+def weight_vector(rubric: Rubric, overrides: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """The rubric's weights with `overrides` applied, in rubric order."""
+    overrides = overrides or {}
+    unknown = set(overrides) - set(rubric.dimensions)
+    if unknown:
+        raise ValueError(f"Unknown dimensions for rubric {rubric.name}: {sorted(unknown)}")
+    return np.array([overrides.get(dim, rubric.weights[dim]) for dim in rubric.dimensions], dtype=np.float64)
+
+
+def rescore(rubric: Rubric, keys: pd.DataFrame, matrix: np.ndarray, weights: np.ndarray) -> pd.DataFrame:
+    """Score every row under the rubric's current weights and `weights` in one product."""
+    totals = score_matrix(rubric, matrix, np.vstack([rubric.weight_vector, weights]))
+    rescored = keys.copy()
+    rescored["normalized_score"] = totals["normalized_score"][0]
+    rescored["new_normalized_score"] = totals["normalized_score"][1]
+    rescored["delta"] = rescored["new_normalized_score"] - rescored["normalized_score"]
+    return rescored
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'strategic=0.3,clarity=0' -> {"strategic": 0.3, "clarity": 0.0}"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        dim, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Expected dimension=weight, got {part!r}")
+        weights[dim.strip()] = float(value)
+    return weights
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Re-score stored evaluation results with new rubric weights")
+    parser.add_argument("csv_paths", nargs="*", help="result CSVs written by the pipelines")
+    parser.add_argument("--rubric", required=True, choices=sorted(RUBRICS))
+    parser.add_argument("--weights", default="", help="dimension=weight overrides, e.g. strategic=0.3,clarity=0")
+    parser.add_argument("--row-type", help="only rows of this type (1.2 results: trend_analysis, branded_summary, ...)")
+    parser.add_argument("--matrix", help=".npz cache of the parsed scores; loaded while it matches the inputs, (re)written otherwise")
+    parser.add_argument("--output", help="write the per-row scores to this CSV")
+    args = parser.parse_args(argv)
+
+    rubric = get_rubric(args.rubric)
+    weights = weight_vector(rubric, parse_weights(args.weights))
+
+    start = time.perf_counter()
+    if not args.csv_paths and not (args.matrix and os.path.exists(args.matrix)):
+        parser.error("no result CSVs given and no saved --matrix to load")
+    keys, matrix = load_or_build_raw_scores(rubric, args.csv_paths, row_type=args.row_type, matrix_path=args.matrix)
+    loaded = time.perf_counter()
+
+    rescored = rescore(rubric, keys, matrix, weights)
+    scored = time.perf_counter()
+
+    print(f" Weights: {dict(zip(rubric.dimensions, weights.tolist()))}")
+    if len(rescored):
+        print(f" Mean normalized score: {rescored['normalized_score'].mean():.2f}% -> "
+              f"{rescored['new_normalized_score'].mean():.2f}%")
+        print(f" Mean |change|: {rescored['delta'].abs().mean():.2f} points, "
+              f"max: {rescored['delta'].abs().max():.2f} points")
+    print(f" Load: {loaded - start:.2f}s, re-score: {scored - loaded:.3f}s")
+
+    if args.output:
+        rescored.to_csv(args.output, index=False)
+        print(f" Wrote {args.output}")
+    return rescored
+
+
+if __name__ == "__main__":
+    main()
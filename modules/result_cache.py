@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+from modules.storage import data_path
+from modules.eval_functions import EVALUATION_MODEL, EVALUATION_TEMPERATURE, system_prompt_segments
+
+RESULT_CACHE_ENABLED = os.getenv("EVAL_RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+RESULT_CACHE_PATH = os.getenv("EVAL_RESULT_CACHE_PATH", data_path("result_cache.sqlite3"))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def canonical_json(data) -> str:
+    """Serialise data so that equal payloads always hash the same (sorted keys, no whitespace)."""
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def result_cache_key(system_prompt, datapoint, model: str = EVALUATION_MODEL,
+                     temperature: float = EVALUATION_TEMPERATURE) -> str:
+    """
+    Key for one judge call: hash of (instruction prompt, company context,
+    canonical datapoint, model, temperature). The first system prompt
+    segment is the instruction prompt, the rest is brand context.
+    """
+    segments = system_prompt_segments(system_prompt)
+    parts = {
+        "prompt": _sha256(segments[0] if segments else ""),
+        "context": _sha256("\n\n".join(segments[1:])),
+        "datapoint": _sha256(canonical_json(datapoint)),
+        "model": model,
+        "temperature": temperature,
+    }
+    return _sha256(canonical_json(parts))
+
+
+class ResultCache:
+    """SQLite store of raw judge outputs keyed by result_cache_key()."""
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, enabled: bool = RESULT_CACHE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations ("
+                " key TEXT PRIMARY KEY,"
+                " llm_output TEXT NOT NULL,"
+                " model TEXT,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT llm_output FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, llm_output: str, model: str = EVALUATION_MODEL) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO evaluations (key, llm_output, model, created_at) VALUES (?, ?, ?, ?)",
+                (key, llm_output, model, time.time()),
+            )
+            conn.commit()
+
+    def lookup(self, system_prompt, datapoint, bypass: bool = False) -> Tuple[str, Optional[str]]:
+        """
+        Return (key, cached_output). cached_output is None on a miss or when
+        bypass is set; the key is still returned so a fresh result can be stored.
+        """
+        key = result_cache_key(system_prompt, datapoint)
+        if bypass:
+            return key, None
+        return key, self.get(key)
+
+
+result_cache = ResultCache()
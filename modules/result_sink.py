@@ -0,0 +1,89 @@
+import os
+import csv
+import json
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+WRITE_NDJSON = os.getenv("EVAL_RESULT_NDJSON", "0").lower() in ("1", "true", "yes")
+# Most rows held back waiting for an earlier, slower row (see wait_for_room)
+MAX_PENDING_ROWS = int(os.getenv("EVAL_RESULT_MAX_PENDING_ROWS", "1000"))
+
+
+def ndjson_path_for(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + ".ndjson"
+
+
+class ResultSink:
+    """
+    Streams result rows to a CSV file and/or an NDJSON file as they complete.
+
+    Rows are added with their 0-based input index and written in input
+    order: a row that finishes early is held only until the rows before it
+    have been written. Every write is flushed, so the files can be read
+    while the job is still running. Producers await wait_for_room(index)
+    before computing a row, which keeps fewer than max_pending rows held
+    back however long one row takes.
+    """
+
+    def __init__(self, fieldnames: List[str], csv_path: Optional[str] = None, ndjson_path: Optional[str] = None,
+                 max_pending: int = MAX_PENDING_ROWS):
+        self.fieldnames = fieldnames
+        self.csv_path = csv_path
+        self.ndjson_path = ndjson_path
+        self.max_pending = max(1, max_pending)
+        self.rows_written = 0
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._next_index = 0
+        self._advanced = asyncio.Event()
+        self._lock = threading.Lock()
+        self._csv_file = self._csv_writer = self._ndjson_file = None
+
+        if csv_path:
+            os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+            self._csv_file = open(csv_path, "w", encoding="utf-8", newline="")
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=fieldnames, restval="")
+            self._csv_writer.writeheader()
+            self._csv_file.flush()
+        if ndjson_path:
+            os.makedirs(os.path.dirname(ndjson_path) or ".", exist_ok=True)
+            self._ndjson_file = open(ndjson_path, "w", encoding="utf-8")
+
+    def add(self, index: int, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending[index] = row
+            while self._next_index in self._pending:
+                self._write(self._pending.pop(self._next_index))
+                self._next_index += 1
+                self._advanced.set()
+
+    async def wait_for_room(self, index: int) -> None:
+        """Wait until row `index` is fewer than max_pending rows ahead of the next row to write."""
+        while index >= self._next_index + self.max_pending:
+            self._advanced.clear()
+            await self._advanced.wait()
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(row)
+            self._csv_file.flush()
+        if self._ndjson_file is not None:
+            self._ndjson_file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self._ndjson_file.flush()
+        self.rows_written += 1
+
+    def close(self) -> None:
+        """Write anything still held back (only possible if some index never arrived) and close."""
+        with self._lock:
+            for index in sorted(self._pending):
+                self._write(self._pending.pop(index))
+            for f in (self._csv_file, self._ndjson_file):
+                if f is not None:
+                    f.close()
+            self._csv_file = self._csv_writer = self._ndjson_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,193 @@
+import re
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class Rubric:
+    """
+    A scoring rubric: ordered dimensions with weights on a 1..scale_max scale.
+
+    Weights are compiled to a NumPy vector once, when the rubric is created,
+    so any number of judged items can be scored with one matrix product.
+
+    normalization:
+      "weighted_total" -> normalized % = weighted total / scale_max
+      "average"        -> normalized % = (weighted total / n dims) / max average
+                          (the legacy 1.2 news rubric, reported "out of 0.6")
+
+    broken_output_path: where a judge reply that is not valid JSON is dumped
+    for inspection (None = not dumped).
+    """
+
+    def __init__(self, name: str, weights: Dict[str, float], scale_max: int = 3,
+                 normalization: str = "weighted_total", broken_output_path: Optional[str] = "broken_llm_output.json"):
+        if normalization not in ("weighted_total", "average"):
+            raise ValueError(f"Unknown normalization: {normalization}")
+        self.name = name
+        self.weights = dict(weights)
+        self.dimensions: List[str] = list(weights)
+        self.scale_max = scale_max
+        self.normalization = normalization
+        self.broken_output_path = broken_output_path
+        self.weight_vector = np.array([weights[dim] for dim in self.dimensions], dtype=np.float64)
+        self.weight_vector.setflags(write=False)
+        # highest possible (weighted total / n dims), e.g. 3 x 1.0 / 5 = 0.6
+        self.max_average = scale_max * float(self.weight_vector.sum()) / len(self.dimensions)
+
+    def __repr__(self):
+        return f"Rubric({self.name!r}, {self.weights!r})"
+
+
+# name -> Rubric. Adding a rubric is a data change: register it here.
+RUBRICS: Dict[str, Rubric] = {}
+
+
+def register_rubric(rubric: Rubric) -> Rubric:
+    RUBRICS[rubric.name] = rubric
+    return rubric
+
+
+def get_rubric(name: str) -> Rubric:
+    if name not in RUBRICS:
+        raise ValueError(f"Unknown rubric: {name}")
+    return RUBRICS[name]
+
+
+# eval_pipeline.eval_1_3 (ad copy trends)
+register_rubric(Rubric("ad_copy_trend", {
+    "strategic": 0.2,
+    "non_obvious": 0.1,
+    "specificity": 0.2,
+    "impactful": 0.2,
+    "clarity": 0.1,
+    "actionable": 0.2
+}))
+# eval_pipeline.eval_1_2 (keyword trends and branded/non-branded summaries)
+register_rubric(Rubric("keyword_trend", {
+    "strategic": 0.2,
+    "non_obvious": 0.15,
+    "specificity": 0.15,
+    "impactful": 0.2,
+    "actionable": 0.3
+}, broken_output_path="broken_llm_output_1_2.json"))
+register_rubric(Rubric("keyword_summary", {
+    "clarity": 0.33,
+    "coverage": 0.34,
+    "correctness": 0.33
+}, broken_output_path="broken_llm_output_1_2.json"))
+# tests.test_1_2 (keyword category news, capitalised keys)
+register_rubric(Rubric("keyword_news", {
+    "Strategic": 0.2,
+    "Nonobvious": 0.15,
+    "Specificity": 0.15,
+    "Actionable": 0.3,
+    "Impactful": 0.2
+}, normalization="average", broken_output_path=None))
+
+
+def strip_json_fence(llm_output: str) -> str:
+    """The judge's reply without surrounding whitespace and an optional ```json fence."""
+    llm_output = llm_output.strip()
+    if llm_output.startswith("```"):
+        llm_output = re.sub(r"^```(?:json)?", "", llm_output, flags=re.IGNORECASE).strip()
+        llm_output = re.sub(r"```$", "", llm_output).strip()
+    return llm_output
+
+
+def parse_judge_output(llm_output: str, dump_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Strip an optional ```json fence and decode the judge's JSON reply. An
+    invalid reply is written to dump_path (when given) before ValueError is raised.
+    """
+    llm_output = strip_json_fence(llm_output)
+    try:
+        return json.loads(llm_output)
+    except json.JSONDecodeError as e:
+        if dump_path:
+            with open(dump_path, "w", encoding="utf-8") as f:
+                f.write(llm_output)
+        raise ValueError(f"Invalid JSON from LLM: {e}")
+
+
+def score_vector(rubric: Rubric, output_dict: Dict[str, Any]) -> np.ndarray:
+    """
+    Raw 1..scale_max scores in rubric order; NaN where a dimension is missing.
+    Raises ValueError when the decoded reply is not a JSON object.
+    """
+    if not isinstance(output_dict, dict):
+        raise ValueError(f"Judge reply is a JSON {type(output_dict).__name__}, not an object")
+    scores = np.full(len(rubric.dimensions), np.nan)
+    for i, dim in enumerate(rubric.dimensions):
+        entry = output_dict.get(dim)
+        if isinstance(entry, dict) and "score" in entry:
+            scores[i] = int(entry["score"])
+    return scores
+
+
+def score_matrix(rubric: Rubric, scores: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Vectorised scoring of an (items x dimensions) matrix of raw scores
+    (NaN = missing, counted as 0). `weights` overrides the rubric's vector
+    and may be 2-D (weight sets x dimensions), giving (weight sets x items)
+    results. Returns weighted_total, avg_score and normalized_score arrays.
+    """
+    weights = rubric.weight_vector if weights is None else np.asarray(weights, dtype=np.float64)
+    filled = np.nan_to_num(np.atleast_2d(scores), nan=0.0)
+    weighted_total = filled @ weights.T
+    if weights.ndim == 2:
+        weighted_total = weighted_total.T
+    avg_score = weighted_total / len(rubric.dimensions)
+    if rubric.normalization == "average":
+        normalized = avg_score / rubric.max_average * 100
+    else:
+        normalized = weighted_total / rubric.scale_max * 100
+    return {"weighted_total": weighted_total, "avg_score": avg_score, "normalized_score": normalized}
+
+
+def _summary(rubric: Rubric, raw_scores: Dict[str, Optional[int]], weighted_total: float, avg_score: float,
+             normalized: float) -> str:
+    lines = []
+    for dim, weight in rubric.weights.items():
+        weighted = raw_scores[dim] * weight if raw_scores[dim] is not None else 0.0
+        lines.append(f"{dim}: {raw_scores[dim]} × {weight} = {weighted:.2f}")
+    if rubric.normalization == "average":
+        lines.append(f"\nAverage Weighted Score: {avg_score:.2f} out of {rubric.max_average:.1f}")
+    else:
+        lines.append(f"\nWeighted Total: {weighted_total:.2f}")
+        lines.append(f"Average Score: {avg_score:.2f} out of {rubric.scale_max:.1f}")
+    lines.append(f"Normalized Score: {normalized:.2f}%")
+    return "\n".join(lines)
+
+
+def score_outputs(rubric: Rubric, llm_outputs: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Score many judge replies against one rubric with a single matrix product.
+    Each result has normalized_score, detailed_summary (the CSV text),
+    raw_scores, weighted_total and avg_score. Raises ValueError on invalid JSON.
+    """
+    matrix = np.array([
+        score_vector(rubric, parse_judge_output(output, rubric.broken_output_path)) for output in llm_outputs
+    ])
+    matrix = matrix.reshape(len(llm_outputs), len(rubric.dimensions))
+    totals = score_matrix(rubric, matrix)
+
+    results = []
+    for row, weighted_total, avg_score, normalized in zip(
+        matrix, totals["weighted_total"], totals["avg_score"], totals["normalized_score"]
+    ):
+        raw_scores = {dim: (None if np.isnan(value) else int(value)) for dim, value in zip(rubric.dimensions, row)}
+        results.append({
+            "normalized_score": float(normalized),
+            "detailed_summary": _summary(rubric, raw_scores, float(weighted_total), float(avg_score), float(normalized)),
+            "raw_scores": raw_scores,
+            "weighted_total": float(weighted_total),
+            "avg_score": float(avg_score)
+        })
+    return results
+
+
+def score_output(rubric: Rubric, llm_output: str) -> Dict[str, Any]:
+    """Score one judge reply; see score_outputs."""
+    return score_outputs(rubric, [llm_output])[0]
@@ -0,0 +1,19 @@
+import os
+import json
+import threading
+
+DATA_DIR = os.getenv("EVAL_DATA_DIR", "/home/azureuser/eval_data")
+
+
+def data_path(*parts: str) -> str:
+    """Return a path under EVAL_DATA_DIR (directories are created on first write)."""
+    return os.path.join(DATA_DIR, *parts)
+
+
+def write_json_atomic(path: str, payload) -> None:
+    """Write JSON via a temp file + rename so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
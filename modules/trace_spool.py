@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from opentelemetry import trace as otel_trace_api
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+
+from modules.storage import DATA_DIR
+
+logger = logging.getLogger("Aqxle-eval")
+
+# Local on-disk spool for Langfuse traffic. Spans and scores are written to
+# files as they are produced and a background exporter forwards them to
+# Langfuse, so a slow or unreachable Langfuse never holds up a pipeline.
+# Whatever is still spooled when the process exits is sent by the next one.
+SPOOL_ENABLED = os.getenv("EVAL_TRACE_SPOOL", "1").lower() not in ("0", "false", "no")
+SPOOL_DIR = os.getenv("EVAL_TRACE_SPOOL_DIR", os.path.join(DATA_DIR, "langfuse_spool"))
+# New writes are dropped (and counted) while the spool holds more than this
+SPOOL_MAX_BYTES = int(float(os.getenv("EVAL_TRACE_SPOOL_MAX_MB", "256")) * 1024 * 1024)
+# Files merged into one request: up to this many bytes of spans / score events
+EXPORT_BATCH_BYTES = int(os.getenv("EVAL_TRACE_EXPORT_BATCH_BYTES", str(2 * 1024 * 1024)))
+EXPORT_TIMEOUT_SECONDS = float(os.getenv("EVAL_TRACE_EXPORT_TIMEOUT_SECONDS", "10"))
+EXPORT_MAX_BACKOFF_SECONDS = float(os.getenv("EVAL_TRACE_EXPORT_MAX_BACKOFF_SECONDS", "60"))
+# How long an exiting process keeps forwarding before leaving the rest on disk
+EXPORT_EXIT_GRACE_SECONDS = float(os.getenv("EVAL_TRACE_EXPORT_EXIT_GRACE_SECONDS", "5"))
+
+LANGFUSE_HOST = os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com").rstrip("/")
+# Instrumentation scope of the spans the Langfuse SDK creates (langfuse 3.x)
+LANGFUSE_TRACER_NAME = "langfuse-sdk"
+
+SPANS = "spans"    # serialized OTLP ExportTraceServiceRequest
+SCORES = "scores"  # JSON list of Langfuse ingestion events
+ENDPOINTS = {SPANS: "/api/public/otel/v1/traces", SCORES: "/api/public/ingestion"}
+# A claimed file left behind by a crashed exporter is retried after this long
+STALE_CLAIM_SECONDS = 600
+
+
+class TraceSpool:
+    """Spool directory: one file per write, named so sorting gives write order."""
+
+    def __init__(self, directory: str = SPOOL_DIR, max_bytes: int = SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.wakeup = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, _, size in self._scan())
+        self._stats = {"written": 0, "dropped": 0}
+        # called after every write (tracing.py starts the exporter with it)
+        self.on_write: Optional[Callable[[], None]] = None
+
+    def _scan(self) -> List[Tuple[str, str, int]]:
+        """(path, kind, size) of the files ready to export, oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                name = entry.name
+                if name.endswith(".tmp"):
+                    continue
+                if ".claimed." in name:
+                    self._reclaim_if_stale(entry)
+                    continue
+                kind = name.rsplit(".", 1)[-1]
+                if kind in ENDPOINTS:
+                    entries.append((entry.path, kind, entry.stat().st_size))
+        return sorted(entries)
+
+    def _reclaim_if_stale(self, entry):
+        """Put back a file claimed by a process that has exited (or claimed long ago)."""
+        original, _, pid = entry.path.partition(".claimed.")
+        try:
+            if int(pid) == os.getpid():
+                return
+            os.kill(int(pid), 0)
+            alive = True
+        except (ValueError, ProcessLookupError):
+            alive = False
+        except OSError:
+            alive = True
+        try:
+            if not alive or time.time() - entry.stat().st_mtime > STALE_CLAIM_SECONDS:
+                os.replace(entry.path, original)
+        except OSError:
+            pass
+
+    def write(self, kind: str, payload: bytes) -> bool:
+        with self._lock:
+            if self._bytes + len(payload) > self.max_bytes:
+                self._stats["dropped"] += 1
+                return False
+            self._seq += 1
+            name = f"{time.time_ns():020d}-{os.getpid()}-{self._seq:06d}.{kind}"
+            self._bytes += len(payload)
+            self._stats["written"] += 1
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(payload)
+        os.replace(f"{path}.tmp", path)
+        self.wakeup.set()
+        if self.on_write is not None:
+            self.on_write()
+        return True
+
+    def claim(self, path: str) -> Optional[str]:
+        """Rename a file so no other exporter (e.g. another worker process) sends it too."""
+        claimed = f"{path}.claimed.{os.getpid()}"
+        try:
+            os.replace(path, claimed)
+            return claimed
+        except OSError:
+            return None
+
+    def release(self, claimed: str, delivered: bool) -> None:
+        if delivered:
+            try:
+                size = os.path.getsize(claimed)
+                os.remove(claimed)
+            except OSError:
+                return
+            with self._lock:
+                self._bytes = max(self._bytes - size, 0)
+        else:
+            os.replace(claimed, claimed.split(".claimed.", 1)[0])
+
+    def pending(self) -> List[Tuple[str, str, int]]:
+        return self._scan()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+class SpoolSpanExporter(SpanExporter):
+    """OTLP span exporter that writes the encoded request to the spool instead of the network."""
+
+    def __init__(self, spool: TraceSpool):
+        self.spool = spool
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        payload = encode_spans(spans).SerializeToString()
+        return SpanExportResult.SUCCESS if self.spool.write(SPANS, payload) else SpanExportResult.FAILURE
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+class SpoolSpanProcessor(BatchSpanProcessor):
+    """Batches the Langfuse SDK's spans into the spool; spans of other instrumentations are ignored."""
+
+    def __init__(self, spool: TraceSpool):
+        super().__init__(SpoolSpanExporter(spool))
+
+    def on_end(self, span) -> None:
+        scope = span.instrumentation_scope
+        if scope is not None and scope.name == LANGFUSE_TRACER_NAME:
+            super().on_end(span)
+
+
+def score_events(scores: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Langfuse ingestion events for create_score-style keyword dicts."""
+    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    events = []
+    for score in scores:
+        body = {
+            "id": score.get("score_id") or str(uuid.uuid4()),
+            "traceId": score.get("trace_id"),
+            "observationId": score.get("observation_id"),
+            "sessionId": score.get("session_id"),
+            "name": score["name"],
+            "value": score["value"],
+            "dataType": score.get("data_type"),
+            "comment": score.get("comment"),
+            "metadata": score.get("metadata"),
+            "environment": os.getenv("LANGFUSE_TRACING_ENVIRONMENT"),
+        }
+        events.append({
+            "id": str(uuid.uuid4()),
+            "timestamp": timestamp,
+            "type": "score-create",
+            "body": {key: value for key, value in body.items() if value is not None},
+        })
+    return events
+
+
+class SpoolExporter:
+    """
+    Background thread that forwards spooled files to Langfuse. Consecutive
+    files of the same kind are merged into one request (OTLP requests
+    concatenate; score events are joined into one ingestion batch). On a
+    failed request the files stay in the spool and the exporter backs off.
+    """
+
+    def __init__(self, spool: TraceSpool, host: str = LANGFUSE_HOST, public_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, batch_bytes: int = EXPORT_BATCH_BYTES):
+        self.spool = spool
+        self.host = host.rstrip("/")
+        self.batch_bytes = batch_bytes
+        public_key = public_key or os.getenv("LANGFUSE_PUBLIC_KEY", "")
+        secret_key = secret_key or os.getenv("LANGFUSE_SECRET_KEY", "")
+        self.headers = {
+            "Authorization": "Basic " + base64.b64encode(f"{public_key}:{secret_key}".encode("utf-8")).decode("ascii"),
+            "x_langfuse_sdk_name": "python",
+            "x_langfuse_public_key": public_key,
+        }
+        self._client = httpx.Client(timeout=EXPORT_TIMEOUT_SECONDS)
+        self._idle = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._failures = 0
+        self._stats = {"requests": 0, "files": 0, "failed_requests": 0, "last_error": None}
+
+    def start(self) -> "SpoolExporter":
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._run, name="langfuse-spool-exporter", daemon=True)
+                    thread.start()
+                    self._thread = thread
+        return self
+
+    def _next_group(self) -> Tuple[Optional[str], List[str]]:
+        pending = self.spool.pending()
+        if not pending:
+            return None, []
+        kind = pending[0][1]
+        group, size = [], 0
+        for path, file_kind, file_size in pending:
+            if file_kind != kind or (group and size + file_size > self.batch_bytes):
+                break
+            claimed = self.spool.claim(path)
+            if claimed:
+                group.append(claimed)
+                size += file_size
+        return kind, group
+
+    def _send(self, kind: str, paths: List[str]) -> None:
+        payloads = []
+        for path in paths:
+            with open(path, "rb") as f:
+                payloads.append(f.read())
+        if kind == SPANS:
+            response = self._client.post(
+                self.host + ENDPOINTS[SPANS], content=b"".join(payloads),
+                headers={**self.headers, "Content-Type": "application/x-protobuf"}
+            )
+        else:
+            batch = [event for payload in payloads for event in json.loads(payload)]
+            response = self._client.post(self.host + ENDPOINTS[SCORES], json={"batch": batch}, headers=self.headers)
+        if response.status_code >= 500 or response.status_code == 429:
+            raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+        if response.status_code >= 400:
+            # a request Langfuse will never accept; retrying would block the spool
+            logger.warning("Langfuse rejected %d spooled %s file(s): HTTP %s", len(paths), kind, response.status_code)
+
+    def _run(self):
+        while True:
+            kind, group = self._next_group()
+            if not group:
+                self._idle.set()
+                self.spool.wakeup.wait(1.0)
+                self.spool.wakeup.clear()
+                continue
+            self._idle.clear()
+            try:
+                self._send(kind, group)
+            except Exception as e:
+                for path in group:
+                    self.spool.release(path, delivered=False)
+                self._failures += 1
+                self._stats["failed_requests"] += 1
+                self._stats["last_error"] = str(e)
+                delay = min(EXPORT_MAX_BACKOFF_SECONDS, 0.5 * 2 ** min(self._failures, 10))
+                logger.warning("Langfuse export failed (%s); retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                continue
+            for path in group:
+                self.spool.release(path, delivered=True)
+            self._failures = 0
+            self._stats["requests"] += 1
+            self._stats["files"] += len(group)
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` for the spool to empty; whatever is left is sent by a later process."""
+        deadline = time.monotonic() + timeout
+        if self.spool.pending():
+            # files left by an earlier process, with nothing written by this one
+            self.start()
+        self.spool.wakeup.set()
+        while self.spool.pending() or not self._idle.is_set():
+            if time.monotonic() >= deadline or self._thread is None:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, **{f"spool_{k}": v for k, v in self.spool.stats().items()}}
+
+
+def install_span_spool(spool: TraceSpool) -> bool:
+    """
+    Add a SpoolSpanProcessor to the global tracer provider. The Langfuse
+    client must be created with LANGFUSE_TRACER_NAME in its
+    blocked_instrumentation_scopes, or every span is sent twice. Returns
+    False if the provider is not an SDK TracerProvider.
+    """
+    provider = otel_trace_api.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        return False
+    provider.add_span_processor(SpoolSpanProcessor(spool))
+    return True
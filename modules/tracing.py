@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import hashlib
+import inspect
+import threading
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langfuse import Langfuse, get_client, observe
+from opentelemetry import trace as otel_trace_api
+from modules.trace_spool import (
+    SPOOL_ENABLED, EXPORT_EXIT_GRACE_SECONDS, LANGFUSE_TRACER_NAME, SCORES, SpoolExporter, TraceSpool,
+    install_span_spool, score_events
+)
+
+logger = logging.getLogger("Aqxle-eval")
+
+# What a traced span records of its arguments (input) and return value
+# (output): "full" as @observe does, "truncate" long strings and lists,
+# "hash" long strings to a digest (repeated prompts stay recognisable),
+# or "off". EVAL_TRACE_CAPTURE sets the default, except for the output of
+# generation spans (the judge's and brand-context replies, kept whole for
+# debugging scores), which EVAL_TRACE_CAPTURE_GENERATION_OUTPUT sets.
+# EVAL_TRACE_CAPTURE_SPANS overrides both per span name, e.g.
+#   "Load Trend Data=off,Single Trend Evaluation=hash/truncate" (input/output).
+# Head-based sampling of whole traces is Langfuse's LANGFUSE_SAMPLE_RATE;
+# spans and scores of unsampled traces are not recorded at all.
+CAPTURE_MODES = ("full", "truncate", "hash", "off")
+CAPTURE_DEFAULT = os.getenv("EVAL_TRACE_CAPTURE", "truncate").lower()
+CAPTURE_GENERATION_OUTPUT = os.getenv("EVAL_TRACE_CAPTURE_GENERATION_OUTPUT", "full").lower()
+CAPTURE_MAX_CHARS = int(os.getenv("EVAL_TRACE_CAPTURE_MAX_CHARS", "1000"))
+CAPTURE_MAX_ITEMS = int(os.getenv("EVAL_TRACE_CAPTURE_MAX_ITEMS", "20"))
+# Strings shorter than this are kept as they are in hash mode
+HASH_MIN_CHARS = 200
+
+# Pending score batches (one per evaluated item) waiting for the emitter
+# thread. When full, new batches are dropped and counted rather than
+# slowing the evaluation down.
+SCORE_QUEUE_SIZE = int(os.getenv("EVAL_SCORE_QUEUE_SIZE", "1000"))
+# Score batches written to the spool as one file
+SPOOL_SCORE_BATCHES = 100
+
+
+def _start_spool():
+    """
+    Create the Langfuse client, routing spans and scores through the on-disk
+    spool when Langfuse is configured: the client's own span export is
+    blocked and a spool processor is added to the tracer provider instead.
+    The exporter thread starts with the first spooled write (or at exit, if
+    an earlier run left files behind), not at import.
+    """
+    if not (SPOOL_ENABLED and os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY")):
+        return get_client(), None, None
+    try:
+        spool = TraceSpool()
+    except OSError as e:
+        logger.warning("Langfuse spool unavailable (%s); sending directly", e)
+        return get_client(), None, None
+    client = Langfuse(blocked_instrumentation_scopes=[LANGFUSE_TRACER_NAME])
+    try:
+        installed = install_span_spool(spool)
+    except Exception as e:
+        logger.warning("Langfuse span spool failed to install: %s", e)
+        installed = False
+    if not installed:
+        logger.warning("No SDK tracer provider for the span spool; spans of this run are not exported")
+    exporter = SpoolExporter(spool)
+    spool.on_write = exporter.start
+    return client, spool, exporter
+
+
+langfuse, trace_spool, spool_exporter = _start_spool()
+
+
+class ScoreEmitter:
+    """
+    Background thread that hands buffered score batches to Langfuse.
+
+    The evaluation path only pays for one non-blocking queue put per item.
+    With a spool, queued batches are written to it together as ingestion
+    events; without one, the create_score calls run here and the SDK ships
+    them. stats() reports what tracing has cost.
+    """
+
+    def __init__(self, max_batches: int = SCORE_QUEUE_SIZE, spool: Optional[TraceSpool] = None):
+        self.spool = spool
+        self._queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=max_batches)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"batches": 0, "scores": 0, "dropped": 0, "errors": 0, "submit_seconds": 0.0, "emit_seconds": 0.0}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="langfuse-score-emitter", daemon=True)
+                self._thread.start()
+
+    def submit(self, batch: List[Dict[str, Any]]) -> bool:
+        if not batch:
+            return True
+        start = time.perf_counter()
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(batch)
+            accepted = True
+        except queue.Full:
+            accepted = False
+        with self._lock:
+            self._stats["submit_seconds"] += time.perf_counter() - start
+            if not accepted:
+                self._stats["dropped"] += len(batch)
+        if not accepted:
+            logger.warning("Score queue full; dropped %d scores", len(batch))
+        return accepted
+
+    def _emit(self, scores: List[Dict[str, Any]]) -> int:
+        """Hand scores over; returns how many failed."""
+        if self.spool is not None:
+            try:
+                written = self.spool.write(SCORES, json.dumps(score_events(scores), default=str).encode("utf-8"))
+            except OSError as e:
+                logger.warning("Failed to spool %d scores: %s", len(scores), e)
+                written = False
+            return 0 if written else len(scores)
+        errors = 0
+        for score in scores:
+            try:
+                langfuse.create_score(**score)
+            except Exception as e:
+                errors += 1
+                logger.warning("Failed to emit score %s: %s", score.get("name"), e)
+        return errors
+
+    def _run(self):
+        while True:
+            batches = [self._queue.get()]
+            while self.spool is not None and len(batches) < SPOOL_SCORE_BATCHES:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            start = time.perf_counter()
+            scores = [score for batch in batches for score in batch]
+            errors = self._emit(scores)
+            with self._lock:
+                self._stats["batches"] += len(batches)
+                self._stats["scores"] += len(scores) - errors
+                self._stats["errors"] += errors
+                self._stats["emit_seconds"] += time.perf_counter() - start
+            for _ in batches:
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted batch has been handed to Langfuse; False on timeout."""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending_batches"] = self._queue.qsize()
+        return stats
+
+
+score_emitter = ScoreEmitter(spool=trace_spool)
+
+
+def _parse_capture_overrides(spec: str) -> Dict[str, Tuple[str, str]]:
+    overrides = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, modes = part.rpartition("=")
+        input_mode, _, output_mode = modes.strip().lower().partition("/")
+        overrides[name.strip()] = (input_mode, output_mode or input_mode)
+    return overrides
+
+
+CAPTURE_OVERRIDES = _parse_capture_overrides(os.getenv("EVAL_TRACE_CAPTURE_SPANS", ""))
+for _modes in [(CAPTURE_DEFAULT, CAPTURE_GENERATION_OUTPUT), *CAPTURE_OVERRIDES.values()]:
+    for _mode in _modes:
+        if _mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown trace capture mode {_mode!r}; expected one of {CAPTURE_MODES}")
+
+
+def capture_modes(name: str, capture_input: Optional[str] = None, capture_output: Optional[str] = None,
+                  as_type: str = "span") -> Tuple[str, str]:
+    """(input mode, output mode) for a span: env override, else the decorator's, else the default."""
+    if name in CAPTURE_OVERRIDES:
+        return CAPTURE_OVERRIDES[name]
+    output_default = CAPTURE_GENERATION_OUTPUT if as_type == "generation" else CAPTURE_DEFAULT
+    return capture_input or CAPTURE_DEFAULT, capture_output or output_default
+
+
+def reduce_payload(value: Any, mode: str) -> Any:
+    """Apply a capture mode to a JSON-like value (strings, dicts, lists, scalars)."""
+    if mode == "full":
+        return value
+    if mode == "off":
+        return None
+    if isinstance(value, str):
+        if mode == "hash" and len(value) >= HASH_MIN_CHARS:
+            return f"sha256:{hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]} ({len(value)} chars)"
+        if mode == "truncate" and len(value) > CAPTURE_MAX_CHARS:
+            return f"{value[:CAPTURE_MAX_CHARS]}... [{len(value)} chars]"
+        return value
+    if isinstance(value, dict):
+        items = list(value.items())
+        reduced = {str(k): reduce_payload(v, mode) for k, v in items[:CAPTURE_MAX_ITEMS]}
+        if len(items) > CAPTURE_MAX_ITEMS:
+            reduced["..."] = f"{len(items) - CAPTURE_MAX_ITEMS} more keys"
+        return reduced
+    if isinstance(value, (list, tuple)):
+        reduced = [reduce_payload(v, mode) for v in value[:CAPTURE_MAX_ITEMS]]
+        if len(value) > CAPTURE_MAX_ITEMS:
+            reduced.append(f"... {len(value) - CAPTURE_MAX_ITEMS} more items")
+        return reduced
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return reduce_payload(str(value), mode)
+
+
+def is_sampled() -> bool:
+    """Whether the current span is recorded (False inside a trace dropped by LANGFUSE_SAMPLE_RATE)."""
+    span = otel_trace_api.get_current_span()
+    return span.is_recording() and span.get_span_context().trace_flags.sampled
+
+
+def update_current_trace(**kwargs) -> None:
+    """langfuse.update_current_trace, skipped for unsampled traces (the SDK fails on their non-recording spans)."""
+    if is_sampled():
+        langfuse.update_current_trace(**kwargs)
+
+
+def span_payload(name: str, which: str, value: Any, mode: Optional[str] = None) -> Any:
+    """
+    A value for update_current_span/generation(input=/output=) under the
+    span's capture mode; `mode` is the code default, as for traced().
+    """
+    input_mode, output_mode = capture_modes(name, mode, mode)
+    return reduce_payload(value, input_mode if which == "input" else output_mode)
+
+
+def traced(as_type: str = "span", name: Optional[str] = None, capture_input: Optional[str] = None,
+           capture_output: Optional[str] = None) -> Callable:
+    """
+    @observe with a capture mode for the span's input and output (see
+    CAPTURE_MODES). Arguments are recorded by parameter name; nothing is
+    serialized for spans of unsampled traces.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+        input_mode, output_mode = capture_modes(span_name, capture_input, capture_output, as_type)
+        if input_mode == output_mode == "full":
+            return observe(as_type=as_type, name=span_name)(func)
+
+        signature = inspect.signature(func)
+        update = langfuse.update_current_generation if as_type == "generation" else langfuse.update_current_span
+
+        # "full" is recorded by @observe itself
+        def record_input(args, kwargs):
+            if input_mode in ("off", "full") or not is_sampled():
+                return
+            bound = signature.bind_partial(*args, **kwargs)
+            update(input={key: reduce_payload(value, input_mode) for key, value in bound.arguments.items()})
+
+        def record_output(result):
+            if output_mode not in ("off", "full") and is_sampled():
+                update(output=reduce_payload(result, output_mode))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                record_input(args, kwargs)
+                result = await func(*args, **kwargs)
+                record_output(result)
+                return result
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                record_input(args, kwargs)
+                result = func(*args, **kwargs)
+                record_output(result)
+                return result
+
+        return observe(as_type=as_type, name=span_name, capture_input=input_mode == "full",
+                       capture_output=output_mode == "full")(wrapper)
+
+    return decorator
+
+
+class TraceScores:
+    """
+    Scores for one evaluated item, collected while it is scored and
+    submitted to the emitter as a single batch by emit(). Scores of a
+    trace that was not sampled are discarded.
+    """
+
+    def __init__(self, trace_id: Optional[str], observation_id: Optional[str] = None, sampled: bool = True):
+        self.trace_id = trace_id
+        self.observation_id = observation_id
+        self.sampled = sampled
+        self.scores: List[Dict[str, Any]] = []
+
+    @classmethod
+    def current(cls) -> "TraceScores":
+        """Buffer bound to the current trace and span (call inside the item's @observe span)."""
+        return cls(langfuse.get_current_trace_id(), langfuse.get_current_observation_id(), sampled=is_sampled())
+
+    def add(self, name: str, value: Any, data_type: str = "NUMERIC", comment: Optional[str] = None, **extra):
+        self.scores.append({
+            "name": name,
+            "value": value,
+            "trace_id": self.trace_id,
+            "observation_id": self.observation_id,
+            "data_type": data_type,
+            "comment": comment,
+            **extra
+        })
+
+    def emit(self) -> bool:
+        batch, self.scores = self.scores, []
+        if not self.sampled:
+            return True
+        return score_emitter.submit(batch)
+
+
+def flush_tracing(timeout: Optional[float] = None) -> None:
+    """
+    Drain buffered scores, then flush the Langfuse client. With the spool
+    this only writes local files; forwarding happens in the background.
+    """
+    score_emitter.flush(timeout)
+    langfuse.flush()
+
+
+def tracing_stats() -> Dict[str, Any]:
+    stats = {f"score_{k}": v for k, v in score_emitter.stats().items()}
+    if spool_exporter is not None:
+        stats.update(spool_exporter.stats())
+    return stats
+
+
+def _shutdown_tracing():
+    flush_tracing(timeout=10)
+    if spool_exporter is not None and not spool_exporter.drain(EXPORT_EXIT_GRACE_SECONDS):
+        print(f" Langfuse export incomplete; the rest stays spooled in {trace_spool.directory} for the next run")
+
+
+atexit.register(_shutdown_tracing)
@@ -0,0 +1,146 @@
+"""
+Sensitivity of scores and rankings to rubric weights, from stored results.
+
+Every candidate weight vector is stacked into one (candidates x dimensions)
+matrix and applied to the (items x dimensions) raw scores of past runs in a
+single product (see modules.rescore for how the scores are loaded). For
+each candidate it reports the mean normalized score and how the ranking of
+items within each result file moves against the current weights.
+
+    python -m modules.weight_sweep --rubric ad_copy_trend --set actionable=0.3 \\
+        --grid strategic=0.1:0.3:0.05 --renormalize evals/1.3_*.csv
+"""
+import os
+import time
+import argparse
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.rubrics import RUBRICS, Rubric, get_rubric, score_matrix
+from modules.rescore import load_or_build_raw_scores, parse_weights, weight_vector
+
+BASELINE = "current"
+
+
+def parse_grid(spec: str) -> Tuple[str, List[float]]:
+    """'actionable=0.1:0.4:0.1' -> ("actionable", [0.1, 0.2, 0.3, 0.4]); 'actionable=0.2,0.3' also works."""
+    dim, sep, values = spec.partition("=")
+    if not sep:
+        raise ValueError(f"Expected dimension=start:stop:step or dimension=v1,v2, got {spec!r}")
+    if ":" in values:
+        start, stop, step = (float(v) for v in values.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return dim.strip(), [round(start + i * step, 10) for i in range(count)]
+    return dim.strip(), [float(v) for v in values.split(",") if v.strip()]
+
+
+def candidate_weights(rubric: Rubric, sets: Sequence[str] = (), grids: Sequence[str] = (),
+                      renormalize: bool = False) -> Tuple[List[str], np.ndarray]:
+    """
+    Candidate labels and their (candidates x dimensions) weight matrix; row 0
+    is always the rubric's current weights. Each --set is one candidate and
+    the --grid axes form a cartesian product. With renormalize, dimensions
+    not named by a candidate are scaled so the weights keep their current sum.
+    """
+    overrides: List[Dict[str, float]] = [parse_weights(spec) for spec in sets]
+    if grids:
+        axes = [parse_grid(spec) for spec in grids]
+        for values in itertools.product(*(vals for _, vals in axes)):
+            overrides.append(dict(zip((dim for dim, _ in axes), values)))
+
+    labels, rows = [BASELINE], [rubric.weight_vector]
+    total = float(rubric.weight_vector.sum())
+    for override in overrides:
+        weights = weight_vector(rubric, override)
+        if renormalize:
+            free = np.array([dim not in override for dim in rubric.dimensions])
+            free_sum = weights[free].sum()
+            if free_sum > 0:
+                weights[free] *= max(total - weights[~free].sum(), 0.0) / free_sum
+        labels.append(",".join(f"{dim}={value:g}" for dim, value in override.items()))
+        rows.append(weights)
+    return labels, np.vstack(rows)
+
+
+def sweep(rubric: Rubric, keys: pd.DataFrame, matrix: np.ndarray, labels: Sequence[str],
+          weights: np.ndarray, top_k: int = 10) -> pd.DataFrame:
+    """
+    One row per candidate: its weights, mean normalized score and change vs
+    the current weights, and ranking shifts within each source file
+    (Spearman correlation, top-k overlap, share of items that change rank,
+    largest move).
+    """
+    normalized = score_matrix(rubric, matrix, weights)["normalized_score"]  # candidates x items
+    scores = pd.DataFrame(normalized.T, columns=range(len(labels)))
+    groups = keys["source"].to_numpy() if "source" in keys else np.zeros(len(keys))
+    ranks = scores.groupby(groups).rank(ascending=False, method="average")
+
+    spearman = np.zeros(len(labels))
+    overlap = np.zeros(len(labels))
+    for _, index in ranks.groupby(groups).groups.items():
+        group_ranks = ranks.loc[index]
+        spearman += group_ranks.corrwith(group_ranks[0]).fillna(1.0).to_numpy()
+        k = min(top_k, len(index))
+        order = np.argsort(-scores.loc[index].to_numpy(), axis=0, kind="stable")[:k]
+        baseline_top = set(order[:, 0])
+        overlap += np.array([len(baseline_top.intersection(order[:, c])) / k for c in range(len(labels))])
+    group_count = max(len(set(groups)), 1)
+    shifts = (ranks.sub(ranks[0], axis=0)).abs()
+
+    report = pd.DataFrame({"candidate": labels})
+    for i, dim in enumerate(rubric.dimensions):
+        report[dim] = weights[:, i]
+    report["mean_normalized_score"] = normalized.mean(axis=1) if normalized.shape[1] else np.nan
+    report["mean_change"] = report["mean_normalized_score"] - report["mean_normalized_score"][0]
+    report["spearman"] = spearman / group_count
+    report[f"top{top_k}_overlap"] = overlap / group_count
+    report["rank_changed"] = (shifts > 0).mean(axis=0).to_numpy() if len(shifts) else 0.0
+    report["max_rank_shift"] = shifts.max(axis=0).to_numpy() if len(shifts) else 0.0
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Sweep rubric weights over stored evaluation results")
+    parser.add_argument("csv_paths", nargs="*", help="result CSVs written by the pipelines")
+    parser.add_argument("--rubric", required=True, choices=sorted(RUBRICS))
+    parser.add_argument("--set", action="append", default=[], dest="sets",
+                        help="one candidate as dimension=weight overrides (repeatable)")
+    parser.add_argument("--grid", action="append", default=[], dest="grids",
+                        help="sweep a dimension: dimension=start:stop:step or dimension=v1,v2 (repeatable, cartesian)")
+    parser.add_argument("--renormalize", action="store_true", help="rescale the other weights to keep the current sum")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--row-type", help="only rows of this type (1.2 results: trend_analysis, branded_summary, ...)")
+    parser.add_argument("--matrix", help=".npz cache of the parsed scores; loaded while it matches the inputs, (re)written otherwise")
+    parser.add_argument("--output", help="write the per-candidate report to this CSV")
+    args = parser.parse_args(argv)
+
+    rubric = get_rubric(args.rubric)
+    labels, weights = candidate_weights(rubric, args.sets, args.grids, args.renormalize)
+    if len(labels) == 1:
+        parser.error("no candidates: pass --set and/or --grid")
+
+    start = time.perf_counter()
+    if not args.csv_paths and not (args.matrix and os.path.exists(args.matrix)):
+        parser.error("no result CSVs given and no saved --matrix to load")
+    keys, matrix = load_or_build_raw_scores(rubric, args.csv_paths, row_type=args.row_type, matrix_path=args.matrix)
+    loaded = time.perf_counter()
+
+    report = sweep(rubric, keys, matrix, labels, weights, top_k=args.top_k)
+    swept = time.perf_counter()
+
+    print(f" {len(labels) - 1} candidates x {len(matrix)} scored rows "
+          f"(load {loaded - start:.2f}s, sweep {swept - loaded:.2f}s)")
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_rows", 200):
+        print(report.round(3).to_string(index=False))
+
+    if args.output:
+        report.to_csv(args.output, index=False)
+        print(f" Wrote {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
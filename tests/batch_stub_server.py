@@ -0,0 +1,191 @@
+"""
+Local stand-in for the Anthropic Message Batches API, for running batch
+mode (mode="batch") offline.
+
+    python -m tests.batch_stub_server --port 8765
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 python main/main_1_3.py
+
+Every request succeeds with a judge response that gives each rubric
+dimension (from the forced score tool, or the prompt's output format) a
+score derived from the request content, so repeated runs are reproducible. --error-every N marks every
+Nth request as errored to exercise the interactive fallback.
+"""
+import re
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BATCHES_PATH = "/v1/messages/batches"
+DIMENSION_PATTERN = re.compile(r'"(\w+)"\s*:\s*\{\s*"score"')
+
+
+def _system_text(params) -> str:
+    system = params.get("system", "")
+    if isinstance(system, list):
+        return "\n\n".join(block.get("text", "") for block in system)
+    return system
+
+
+def stub_judgement(params) -> dict:
+    """
+    Deterministic judge output covering every rubric dimension: those of the
+    forced score tool's schema, else those named in the prompt's output format.
+    """
+    tools = params.get("tools") or []
+    if tools:
+        dimensions = list(tools[0]["input_schema"]["properties"])
+    else:
+        dimensions = list(dict.fromkeys(DIMENSION_PATTERN.findall(_system_text(params))))
+    seed = hashlib.sha256(json.dumps(params.get("messages", []), sort_keys=True).encode("utf-8")).digest()
+    return {
+        dim: {"score": 1 + seed[i % len(seed)] % 3, "reasoning": "stub batch judgement"}
+        for i, dim in enumerate(dimensions)
+    }
+
+
+def stub_content(params) -> list:
+    """Message content blocks: a tool_use block when a tool is forced, otherwise JSON text."""
+    judgement = stub_judgement(params)
+    tool_choice = params.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool":
+        return [{"type": "tool_use", "id": "toolu_stub", "name": tool_choice["name"], "input": judgement}]
+    return [{"type": "text", "text": json.dumps(judgement)}]
+
+
+def _timestamp(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+class StubBatchStore:
+    def __init__(self, processing_seconds: float = 0.0, error_every: int = 0):
+        self.processing_seconds = processing_seconds
+        self.error_every = error_every
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def create(self, requests):
+        batch_id = f"msgbatch_stub_{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self.batches[batch_id] = {"requests": requests, "created": datetime.now(timezone.utc), "submitted": time.monotonic()}
+        return self.describe(batch_id)
+
+    def _ended(self, batch) -> bool:
+        return time.monotonic() - batch["submitted"] >= self.processing_seconds
+
+    def _errored(self, position: int) -> bool:
+        return self.error_every > 0 and (position + 1) % self.error_every == 0
+
+    def describe(self, batch_id: str, base_url: str = ""):
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        total = len(batch["requests"])
+        ended = self._ended(batch)
+        errored = sum(self._errored(i) for i in range(total)) if ended else 0
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else total,
+                "succeeded": total - errored if ended else 0,
+                "errored": errored,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": _timestamp(batch["created"]),
+            "expires_at": _timestamp(batch["created"] + timedelta(hours=24)),
+            "ended_at": _timestamp(datetime.now(timezone.utc)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}{BATCHES_PATH}/{batch_id}/results" if ended else None,
+        }
+
+    def results(self, batch_id: str):
+        for position, request in enumerate(self.batches[batch_id]["requests"]):
+            params = request["params"]
+            if self._errored(position):
+                result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": "stub error"}}}
+            else:
+                result = {
+                    "type": "succeeded",
+                    "message": {
+                        "id": f"msg_stub_{position}",
+                        "type": "message",
+                        "role": "assistant",
+                        "model": params.get("model", "stub"),
+                        "content": stub_content(params),
+                        "stop_reason": "tool_use" if params.get("tools") else "end_turn",
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": len(json.dumps(params)) // 4, "output_tokens": 200},
+                    },
+                }
+            yield {"custom_id": request["custom_id"], "result": result}
+
+
+def make_handler(store: StubBatchStore):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _base_url(self) -> str:
+            return f"http://{self.headers.get('Host')}"
+
+        def do_POST(self):
+            if self.path.rstrip("/") != BATCHES_PATH:
+                return self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            batch = store.create(payload.get("requests", []))
+            self._send_json(200, store.describe(batch["id"], self._base_url()))
+
+        def do_GET(self):
+            parts = self.path.split("?", 1)[0].rstrip("/")
+            if parts.startswith(BATCHES_PATH + "/"):
+                batch_id, _, tail = parts[len(BATCHES_PATH) + 1:].partition("/")
+                batch = store.describe(batch_id, self._base_url())
+                if batch is not None and not tail:
+                    return self._send_json(200, batch)
+                if batch is not None and tail == "results" and batch["processing_status"] == "ended":
+                    body = "".join(json.dumps(line) + "\n" for line in store.results(batch_id)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/binary")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(port: int = 0, processing_seconds: float = 0.0, error_every: int = 0):
+    """Start the stub on a background thread; returns (server, base_url). Stop with server.shutdown()."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StubBatchStore(processing_seconds, error_every)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stub of the Message Batches API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--processing-seconds", type=float, default=2.0, help="how long each batch stays in_progress")
+    parser.add_argument("--error-every", type=int, default=0, help="mark every Nth request as errored")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(StubBatchStore(args.processing_seconds, args.error_every)))
+    print(f"Stub batch server listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,329 @@
+"""
+Offline benchmark of both pipelines and the API against the fake LLM
+clients in tests/fake_llm.py. Reports throughput, judge-call latency
+percentiles, errors, estimated cost and memory per scenario.
+
+    python -m tests.benchmark --items 200 --latency lognormal:0.8:0.5
+    python -m tests.benchmark --rate-limited 0.05 --overloaded 0.02 --malformed 0.02 --retry-base-delay 0.1
+    python -m tests.benchmark --scenarios api --jobs 8 --job-items 25 --output bench.json
+
+Everything runs in a temporary EVAL_DATA_DIR (and working directory), so
+no real data, cache or Langfuse project is touched. --output writes the
+report as JSON for comparing runs, e.g. in CI.
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+from tests.fake_llm import FakeLLMConfig, install_fake_clients
+
+SCENARIOS = ("ad_copy", "keyword", "api")
+BRAND = "BenchBrand"
+
+
+# ---- Synthetic inputs ----
+
+def ad_copy_input(items: int, tag: str = "") -> Dict[str, Any]:
+    return {"top_k_trends": [
+        {
+            "trend": f"{tag}trend {i}",
+            "industry_score": 50 + i % 50,
+            "analysis": {
+                "summary": f"Search interest in trend {i} grew week over week across the category. " * 4,
+                "ad_copy": [f"Headline {i}.{n}: save on trend {i} today" for n in range(5)],
+                "keywords": [f"trend {i} keyword {n}" for n in range(10)],
+            },
+        }
+        for i in range(items)
+    ]}
+
+
+def keyword_input(items: int, tag: str = "") -> Dict[str, Any]:
+    """Segmented input: one segment (branded + non-branded summary) per ten items, trends for the rest."""
+    segments = max(1, items // 10)
+    summary = lambda kind, s: {
+        "summary": f"{kind} searches in segment {s} are led by comparison and price queries. " * 3,
+        "keywords": [f"{tag}{kind} segment {s} keyword {n}" for n in range(15)],
+    }
+    return {
+        "search_volume_analysis": {
+            "is_segmented": True,
+            "segmented_analysis": {
+                f"{tag}segment {s}": {"top_branded": summary("branded", s), "top_non_branded": summary("non-branded", s)}
+                for s in range(segments)
+            },
+        },
+        "trend_analysis": [
+            {"trend": f"{tag}keyword trend {i}", "analysis": f"Volume for keyword trend {i} rose sharply. " * 3}
+            for i in range(max(0, items - 2 * segments))
+        ],
+    }
+
+
+# ---- Measurement ----
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    from modules.metrics import Histogram
+
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    return histogram.summary()
+
+
+class Measurement:
+    """Wall time, memory, judge-call metrics and injected faults of one scenario."""
+
+    def __init__(self, fake_anthropic, trace_memory: bool):
+        self.fake = fake_anthropic.messages
+        self.trace_memory = trace_memory
+
+    def __enter__(self) -> "Measurement":
+        from modules.metrics import metrics
+
+        metrics.reset()
+        self._faults = dict(self.fake.stats)
+        if self.trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        from modules.metrics import metrics
+
+        self.wall_seconds = time.perf_counter() - self._start
+        self.traced_peak_mb = None
+        if self.trace_memory:
+            self.traced_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        self.metrics = metrics.summary()
+        self.faults = {key: value - self._faults.get(key, 0) for key, value in self.fake.stats.items()
+                       if value - self._faults.get(key, 0)}
+        return False
+
+    def report(self, items: int, result_counts: Dict[str, int]) -> Dict[str, Any]:
+        judge = self.metrics["calls"].get("evaluate", {})
+        latency = judge.get("latency") or {}
+        return {
+            "items": items,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "items_per_second": round(items / self.wall_seconds, 2) if self.wall_seconds else None,
+            **result_counts,
+            "judge_calls": judge.get("count", 0),
+            "judge_errors": judge.get("errors", 0),
+            "judge_p50_seconds": latency.get("p50_seconds"),
+            "judge_p99_seconds": latency.get("p99_seconds"),
+            "cost_usd": self.metrics["cost_usd"],
+            "peak_rss_mb": peak_rss_mb(),
+            "traced_peak_mb": self.traced_peak_mb,
+            "injected": self.faults,
+            "stages": {name: round(stage["total_seconds"], 3) for name, stage in self.metrics["stages"].items()},
+        }
+
+
+def _counts(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    total = sum(r.get("total_items", r.get("total_trends", 0)) for r in results)
+    counts = {key: sum(r.get(key, 0) for r in results) for key in ("successful", "skipped", "quarantined")}
+    counts["failed"] = total - sum(counts.values())
+    return counts
+
+
+# ---- Scenarios ----
+
+def run_pipeline(name: str, args, workdir: str, fakes) -> Dict[str, Any]:
+    if name == "ad_copy":
+        from eval_pipeline.eval_1_3 import pipeline_async
+        payload = ad_copy_input(args.items)
+    else:
+        from eval_pipeline.eval_1_2 import pipeline_async
+        payload = keyword_input(args.items)
+    input_path = os.path.join(workdir, f"{name}_input.json")
+    output_path = os.path.join(workdir, f"{name}_output.csv")
+    with open(input_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+
+    with Measurement(fakes[0], args.trace_memory) as measurement:
+        result = asyncio.run(pipeline_async(
+            input_path, output_path, BRAND, max_concurrency=args.concurrency, bypass_cache=True
+        ))
+    items = result.get("total_items", result.get("total_trends", 0))
+    return measurement.report(items, _counts([result]))
+
+
+def run_api(args, workdir: str, fakes) -> Dict[str, Any]:
+    """Submit --jobs jobs (alternating ad copy / keyword) through the API and poll them to completion."""
+    import api_server
+    from fastapi.testclient import TestClient
+
+    headers = {"x-api-key": api_server.API_KEY}
+    submit_seconds, job_seconds, results = [], [], []
+    with TestClient(api_server.app) as client, Measurement(fakes[0], args.trace_memory) as measurement:
+        job_ids = []
+        for j in range(args.jobs):
+            tag = f"job{j} "
+            if j % 2 == 0:
+                route, body = "/run-ad-copy-eval", {"data": ad_copy_input(args.job_items, tag)["top_k_trends"]}
+            else:
+                route, body = "/run-keyword-eval", {"data": keyword_input(args.job_items, tag)}
+            start = time.perf_counter()
+            response = client.post(route, json={"brand": BRAND, "date": "bench", "bypass_cache": True, **body},
+                                   headers=headers)
+            submit_seconds.append(time.perf_counter() - start)
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+
+        pending = set(job_ids)
+        while pending:
+            time.sleep(0.05)
+            for job_id in list(pending):
+                job = client.get(f"/jobs/{job_id}", headers=headers).json()
+                if job["status"] in ("succeeded", "failed"):
+                    pending.discard(job_id)
+                    timings = job["timings"]
+                    job_seconds.append(timings["finished_at"] - timings["created_at"])
+                    results.append(job.get("result") or {})
+        metrics_scrape = client.get("/metrics")
+
+    items = sum(r.get("total_items", r.get("total_trends", 0)) for r in results)
+    report = measurement.report(items, _counts(results))
+    report.update({
+        "jobs": args.jobs,
+        "jobs_per_second": round(args.jobs / measurement.wall_seconds, 3),
+        "job_latency": latency_summary(job_seconds),
+        "submit_latency": latency_summary(submit_seconds),
+        "metrics_endpoint_bytes": len(metrics_scrape.content) if metrics_scrape.status_code == 200 else None,
+    })
+    return report
+
+
+# ---- CLI ----
+
+def _prepare_environment(args, workdir: str):
+    """Must run before any repo module is imported: they read their settings at import time."""
+    os.environ["EVAL_DATA_DIR"] = workdir
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("EVAL_API_KEY", "benchmark")
+    # judged items go to Langfuse only if the caller explicitly configured it
+    if not args.langfuse:
+        for name in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY"):
+            os.environ.pop(name, None)
+    if args.retry_base_delay is not None:
+        os.environ["EVAL_RETRY_BASE_DELAY_SECONDS"] = str(args.retry_base_delay)
+    if args.concurrency is not None:
+        os.environ["EVAL_MAX_CONCURRENCY"] = str(args.concurrency)
+    # the score parser dumps unparseable replies into the working directory
+    os.chdir(workdir)
+
+
+def print_report(report: Dict[str, Dict[str, Any]]):
+    columns = [
+        ("scenario", 9, None), ("items", 6, "items"), ("wall s", 8, "wall_seconds"), ("items/s", 8, "items_per_second"),
+        ("p50 s", 7, "judge_p50_seconds"), ("p99 s", 7, "judge_p99_seconds"), ("ok", 6, "successful"),
+        ("failed", 6, "failed"), ("quar.", 6, "quarantined"), ("cost $", 8, "cost_usd"), ("rss MB", 8, "peak_rss_mb"),
+    ]
+    fmt = lambda value: "-" if value is None else (f"{value:.3f}" if isinstance(value, float) else str(value))
+    print(" ".join(title.rjust(width) for title, width, _ in columns))
+    for scenario, row in report.items():
+        print(" ".join(
+            (scenario if key is None else fmt(row.get(key))).rjust(width) for _, width, key in columns
+        ))
+    for scenario, row in report.items():
+        if row.get("injected"):
+            print(f" {scenario} judge calls: {row['injected']}")
+        if "job_latency" in row:
+            latency = row["job_latency"]
+            print(f" {scenario} job latency: p50 {fmt(latency['p50_seconds'])}s, p99 {fmt(latency['p99_seconds'])}s "
+                  f"({row['jobs_per_second']} jobs/s)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipelines and API against fake LLM clients")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--items", type=int, default=100, help="items per pipeline scenario")
+    parser.add_argument("--jobs", type=int, default=6, help="jobs submitted in the api scenario")
+    parser.add_argument("--job-items", type=int, default=20, help="items per api job")
+    parser.add_argument("--concurrency", type=int, default=None, help="max concurrent judge calls (EVAL_MAX_CONCURRENCY)")
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="judge latency: fixed:S, uniform:MIN:MAX, "
+                                                                      "lognormal:MEDIAN:SIGMA or exponential:MEAN")
+    parser.add_argument("--context-latency", default="fixed:1.0", help="brand-context call latency, same format")
+    parser.add_argument("--rate-limited", type=float, default=0.0, help="share of judge calls answered with 429")
+    parser.add_argument("--overloaded", type=float, default=0.0, help="share of judge calls answered with 529")
+    parser.add_argument("--timeout", type=float, default=0.0, help="share of judge calls that time out")
+    parser.add_argument("--timeout-seconds", type=float, default=5.0, help="how long a timed-out call hangs")
+    parser.add_argument("--malformed", type=float, default=0.0, help="share of replies that are truncated JSON")
+    parser.add_argument("--prose", type=float, default=0.0, help="share of replies that are prose instead of JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--retry-base-delay", type=float, default=None, help="EVAL_RETRY_BASE_DELAY_SECONDS for the run")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peaks (slows the run)")
+    parser.add_argument("--langfuse", action="store_true", help="keep LANGFUSE_* keys from the environment")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output and logs")
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {sorted(unknown)}")
+    config = FakeLLMConfig(
+        latency=args.latency, context_latency=args.context_latency, rate_limited=args.rate_limited,
+        overloaded=args.overloaded, timeout=args.timeout, timeout_seconds=args.timeout_seconds,
+        malformed=args.malformed, prose=args.prose, seed=args.seed,
+    )
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="eval-bench-") as workdir:
+        cwd = os.getcwd()
+        _prepare_environment(args, workdir)
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        try:
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                fakes = install_fake_clients(config)
+                for scenario in scenarios:
+                    if scenario == "api":
+                        report[scenario] = run_api(args, workdir, fakes)
+                    else:
+                        report[scenario] = run_pipeline(scenario, args, workdir, fakes)
+        finally:
+            logging.disable(logging.NOTSET)
+            os.chdir(cwd)
+
+    print_report(report)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "scenarios": report}, f, indent=2)
+        print(f" Report written to {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
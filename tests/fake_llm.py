@@ -0,0 +1,259 @@
+"""
+Deterministic in-process stand-ins for the Anthropic and OpenAI async
+clients, for benchmarking the pipelines offline (see tests/benchmark.py).
+
+    from tests.fake_llm import FakeLLMConfig, install_fake_clients
+    install_fake_clients(FakeLLMConfig(latency="lognormal:0.8:0.5", rate_limited=0.05, malformed=0.02))
+
+Judge replies reuse the batch stub's scores (derived from the request
+content). Every judge call draws its latency and any injected fault
+(429, 529, timeout, malformed JSON, prose reply) from a generator seeded
+by the request content and attempt number, so a run is reproducible
+whatever order the calls happen to be made in. Only the interactive
+paths are faked; batch mode has tests/batch_stub_server.py.
+"""
+import json
+import math
+import random
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from typing import Callable, Dict
+
+import anthropic
+import httpx
+from anthropic.types import Message
+from openai.types.chat import ChatCompletion
+
+from tests.batch_stub_server import stub_content
+
+ANTHROPIC_URL = "https://api.anthropic.com/v1/messages"
+# Share of a streamed reply's latency spent before the first text chunk
+FIRST_TOKEN_SHARE = 0.2
+STREAM_CHUNKS = 20
+PROSE_REPLY = "I need to see the actual analysis before I can evaluate it. Please provide the full LLM output. "
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency distribution from "fixed:S", "uniform:MIN:MAX", "lognormal:MEDIAN:SIGMA"
+    or "exponential:MEAN" (seconds); returns a sampler taking a Random.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(":") if v]
+    try:
+        if kind == "fixed":
+            (seconds,) = values
+            return lambda rng: seconds
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == "exponential":
+            (mean,) = values
+            return lambda rng: rng.expovariate(1.0 / mean)
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r}; expected fixed:S, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA or exponential:MEAN")
+
+
+class FakeLLMConfig:
+    """Latency distributions and per-call fault rates (0..1) of the fake judge."""
+
+    def __init__(self, latency: str = "lognormal:0.8:0.5", context_latency: str = "fixed:1.0",
+                 rate_limited: float = 0.0, overloaded: float = 0.0, timeout: float = 0.0,
+                 timeout_seconds: float = 5.0, malformed: float = 0.0, prose: float = 0.0, seed: int = 0):
+        if rate_limited + overloaded + timeout + malformed + prose > 1:
+            raise ValueError("Fault rates add up to more than 1")
+        self.latency = parse_latency(latency)
+        self.context_latency = parse_latency(context_latency)
+        # checked in this order against one uniform draw per call
+        self.faults = [
+            ("rate_limited", rate_limited), ("overloaded", overloaded), ("timeout", timeout),
+            ("malformed", malformed), ("prose", prose),
+        ]
+        self.timeout_seconds = timeout_seconds
+        self.seed = seed
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeAnthropicMessages:
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.stats = Counter()
+        self._attempts = Counter()
+        self._cached_prefixes = set()
+        self._lock = threading.Lock()
+
+    def _draw(self, request) -> random.Random:
+        key = json.dumps([request.get("system"), request.get("messages")], sort_keys=True, default=str)
+        with self._lock:
+            self._attempts[key] += 1
+            attempt = self._attempts[key]
+        seed = hashlib.sha256(f"{self.config.seed}:{attempt}:{key}".encode("utf-8")).digest()
+        return random.Random(seed)
+
+    def _fault(self, rng: random.Random):
+        draw, threshold = rng.random(), 0.0
+        for name, rate in self.config.faults:
+            threshold += rate
+            if draw < threshold:
+                return name
+        return None
+
+    def _usage(self, request, text: str) -> Dict[str, int]:
+        usage = {"input_tokens": 0, "output_tokens": _tokens(text),
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        system = request.get("system") or []
+        blocks = system if isinstance(system, list) else [{"type": "text", "text": system}]
+        for block in blocks:
+            tokens = _tokens(block.get("text", ""))
+            if block.get("cache_control"):
+                digest = hashlib.sha256(block["text"].encode("utf-8")).hexdigest()
+                with self._lock:
+                    hit = digest in self._cached_prefixes
+                    self._cached_prefixes.add(digest)
+                usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] += tokens
+            else:
+                usage["input_tokens"] += tokens
+        usage["input_tokens"] += sum(_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+        return usage
+
+    def _message(self, request, content) -> Message:
+        text = "".join(block.get("text", "") for block in content) or json.dumps(content[0].get("input", {}))
+        return Message.model_validate({
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": request.get("model", "fake"),
+            "content": content, "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": self._usage(request, text),
+        })
+
+    async def _reply(self, request):
+        """(message, latency) for one call, raising the injected API error if any."""
+        rng = self._draw(request)
+        latency = self.config.latency(rng)
+        fault = self._fault(rng)
+        self.stats["calls"] += 1
+        self.stats[fault or "ok"] += 1
+
+        http_request = httpx.Request("POST", ANTHROPIC_URL)
+        if fault == "rate_limited":
+            await asyncio.sleep(0.01)
+            raise anthropic.RateLimitError(
+                "Rate limited (injected)", response=httpx.Response(429, request=http_request), body=None
+            )
+        if fault == "overloaded":
+            await asyncio.sleep(0.01)
+            raise anthropic.APIStatusError(
+                "Overloaded (injected)", response=httpx.Response(529, request=http_request), body=None
+            )
+        if fault == "timeout":
+            await asyncio.sleep(self.config.timeout_seconds)
+            raise anthropic.APITimeoutError(request=http_request)
+
+        content = stub_content(request)
+        if fault == "malformed":
+            text = json.dumps(content[0].get("input") or json.loads(content[0]["text"]))
+            content = [{"type": "text", "text": text[:len(text) // 2]}]
+        elif fault == "prose":
+            content = [{"type": "text", "text": PROSE_REPLY * 10}]
+        return self._message(request, content), latency
+
+    async def create(self, **request) -> Message:
+        message, latency = await self._reply(request)
+        await asyncio.sleep(latency)
+        return message
+
+    def stream(self, **request) -> "FakeMessageStream":
+        return FakeMessageStream(self, request)
+
+
+class FakeMessageStream:
+    """Async context manager mimicking AsyncMessageStreamManager/AsyncMessageStream."""
+
+    def __init__(self, messages: FakeAnthropicMessages, request):
+        self._messages = messages
+        self._request = request
+        self.current_message_snapshot = None
+
+    async def __aenter__(self) -> "FakeMessageStream":
+        self._message, latency = await self._messages._reply(self._request)
+        await asyncio.sleep(latency * FIRST_TOKEN_SHARE)
+        self._remaining = latency * (1 - FIRST_TOKEN_SHARE)
+        self._chunk_delay = self._remaining / STREAM_CHUNKS
+        self.current_message_snapshot = self._message
+        self.text_stream = self._text_stream()
+        return self
+
+    async def __aexit__(self, *exc) -> bool:
+        return False
+
+    async def _text_stream(self):
+        text = "".join(block.text for block in self._message.content if block.type == "text")
+        if not text:
+            return
+        size = max(1, math.ceil(len(text) / STREAM_CHUNKS))
+        for start in range(0, len(text), size):
+            yield text[start:start + size]
+            await asyncio.sleep(self._chunk_delay)
+            self._remaining -= self._chunk_delay
+
+    async def get_final_message(self) -> Message:
+        async for _ in self.text_stream:
+            pass
+        # a tool_use reply streams no text but still takes its full latency
+        await asyncio.sleep(max(0.0, self._remaining))
+        return self._message
+
+
+class FakeAnthropic:
+    def __init__(self, config: FakeLLMConfig):
+        self.messages = FakeAnthropicMessages(config)
+
+    async def close(self):
+        pass
+
+
+class _FakeCompletions:
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.calls = 0
+        self._rng = random.Random(config.seed)
+
+    async def create(self, **request) -> ChatCompletion:
+        self.calls += 1
+        await asyncio.sleep(self.config.context_latency(self._rng))
+        company = request["messages"][-1]["content"]
+        content = f"{company}: Company Overview, Business Segments & Marketing Context\n(benchmark stand-in)"
+        prompt_tokens = sum(_tokens(m["content"]) for m in request["messages"])
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl_fake", "object": "chat.completion", "created": 0, "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(content),
+                      "total_tokens": prompt_tokens + _tokens(content)},
+        })
+
+
+class FakeOpenAI:
+    def __init__(self, config: FakeLLMConfig):
+        self.chat = type("FakeChat", (), {})()
+        self.chat.completions = _FakeCompletions(config)
+
+    async def close(self):
+        pass
+
+
+def install_fake_clients(config: FakeLLMConfig):
+    """Route the pipelines' async judge and brand-context calls to fakes; returns (anthropic, openai) fakes."""
+    import modules.eval_functions as eval_functions
+    import modules.get_company_context as get_company_context
+
+    fake_anthropic, fake_openai = FakeAnthropic(config), FakeOpenAI(config)
+    eval_functions.get_async_anthropic_client = lambda: fake_anthropic
+    get_company_context.get_async_openai_client = lambda: fake_openai
+    return fake_anthropic, fake_openai
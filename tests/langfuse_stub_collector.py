@@ -0,0 +1,116 @@
+"""
+Local stand-in for the Langfuse ingestion endpoints, for exercising the
+trace spool (modules/trace_spool.py) offline.
+
+    python -m tests.langfuse_stub_collector --port 8766 --delay 2
+    LANGFUSE_HOST=http://127.0.0.1:8766 LANGFUSE_PUBLIC_KEY=pk LANGFUSE_SECRET_KEY=sk python main/main_1_3.py
+
+Accepts OTLP span exports and score ingestion batches and counts what it
+received (GET /stats). --delay makes every request slow and --fail-first N
+answers the first N requests with 503, to check that pipelines do not wait
+on Langfuse and that spooled data is retried.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+TRACES_PATH = "/api/public/otel/v1/traces"
+INGESTION_PATH = "/api/public/ingestion"
+
+
+class StubCollector:
+    def __init__(self, delay_seconds: float = 0.0, fail_first: int = 0):
+        self.delay_seconds = delay_seconds
+        self.fail_first = fail_first
+        self.stats = {"requests": 0, "failed_requests": 0, "spans": 0, "scores": 0, "span_names": {}, "score_names": {}}
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.stats["requests"] <= self.fail_first:
+                self.stats["failed_requests"] += 1
+                return True
+        return False
+
+    def record_spans(self, body: bytes) -> int:
+        request = ExportTraceServiceRequest()
+        request.ParseFromString(body)
+        names = [span.name for rs in request.resource_spans for ss in rs.scope_spans for span in ss.spans]
+        with self._lock:
+            self.stats["spans"] += len(names)
+            for name in names:
+                self.stats["span_names"][name] = self.stats["span_names"].get(name, 0) + 1
+        return len(names)
+
+    def record_scores(self, payload: dict) -> list:
+        events = payload.get("batch", [])
+        with self._lock:
+            for event in events:
+                if event.get("type") == "score-create":
+                    name = event["body"]["name"]
+                    self.stats["scores"] += 1
+                    self.stats["score_names"][name] = self.stats["score_names"].get(name, 0) + 1
+        return events
+
+
+def make_handler(collector: StubCollector):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if collector.delay_seconds:
+                time.sleep(collector.delay_seconds)
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path not in (TRACES_PATH, INGESTION_PATH):
+                return self._send_json(404, {"message": self.path})
+            if collector.should_fail():
+                return self._send_json(503, {"message": "stub collector unavailable"})
+            if path == TRACES_PATH:
+                collector.record_spans(body)
+                return self._send_json(200, {})
+            events = collector.record_scores(json.loads(body or b"{}"))
+            self._send_json(207, {"successes": [{"id": e.get("id"), "status": 201} for e in events], "errors": []})
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with collector._lock:
+                    return self._send_json(200, collector.stats)
+            self._send_json(404, {"message": self.path})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_collector(port: int = 0, delay_seconds: float = 0.0, fail_first: int = 0):
+    """Start the stub on a background thread; returns (server, collector, base_url). Stop with server.shutdown()."""
+    collector = StubCollector(delay_seconds, fail_first)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(collector))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, collector, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Langfuse ingestion endpoints")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering each request")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(StubCollector(args.delay, args.fail_first)))
+    print(f"Stub Langfuse collector listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
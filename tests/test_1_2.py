@@ -10,10 +10,10 @@ import json
 import sys
 import os
 import pandas as pd
-import re
 from typing import List, Dict, Any
 
 from prompts.prompts import instruction_prompt_1_2
+from modules.rubrics import get_rubric, score_output
 from tests.functions import evaluate, get_company_context
 
 
@@ -58,53 +58,9 @@ def load_suggestion_data(file_path: str) -> List[Dict[str, any]]:
 def parse_scores(llm_output: str):
     """
     Parse dimension scores (1-3 scale) and compute weighted + normalized scores.
-    Returns a dict with both raw + calculated values.
+    Returns the score summary text.
     """
-    dimensions = {
-        "Strategic": 0.2,
-        "Nonobvious": 0.15,
-        "Specificity": 0.15,
-        "Actionable": 0.3,
-        "Impactful": 0.2
-    }
-
-    parsed_scores = {}
-    weighted_scores = {}
-
-    llm_output = llm_output.strip()
-    if llm_output.startswith("```"):
-        llm_output = re.sub(r"^```(?:json)?", "", llm_output, flags=re.IGNORECASE).strip()
-        llm_output = re.sub(r"```$", "", llm_output).strip()
-    
-    try:
-        output_dict = json.loads(llm_output)
-    except json.JSONDecodeError:
-        raise ValueError("LLM output is not valid JSON")
-
-
-    for dim, weight in dimensions.items():
-        if dim in output_dict and "score" in output_dict[dim]:
-            parsed_scores[dim] = int(output_dict[dim]["score"])
-            weighted_scores[dim] = parsed_scores[dim] * weight
-        else:
-            parsed_scores[dim] = None
-            weighted_scores[dim] = 0.0
-
-
-    avg_score = sum(weighted_scores.values()) / len(dimensions)
-
-    normalized_pct = (avg_score / 0.6) * 100
-
-    summary_lines = []
-    for dim, weight in dimensions.items():
-        summary_lines.append(
-            f"{dim}: {parsed_scores[dim]} × {weight} = {weighted_scores[dim]:.2f}"
-        )
-
-    summary_lines.append(f"\nAverage Weighted Score: {avg_score:.2f} out of 0.6")
-    summary_lines.append(f"Normalized Score: {normalized_pct:.2f}%")
-
-    return "\n".join(summary_lines)
+    return score_output(get_rubric("keyword_news"), llm_output)["detailed_summary"]
 
 
 def pipeline(input, output, brand):
@@ -4,8 +4,8 @@ import json
 import sys
 import os
 import pandas as pd
-import re
 from prompts.prompts import instruction_prompt_1_3
+from modules.rubrics import get_rubric, score_output
 from tests.functions import evaluate,get_company_context
 from datetime import datetime
 
@@ -23,59 +23,7 @@ def parse_scores_for_single_output(llm_output: str):
     Parse dimension scores and return all scores for comprehensive logging.
     Returns detailed breakdown for CSV + all individual scores for Langfuse.
     """
-    dimensions = {
-        "strategic": 0.2,
-        "non_obvious": 0.1,
-        "specificity": 0.2,
-        "impactful": 0.2,
-        "clarity": 0.1,
-        "actionable": 0.2
-    }
-    
-    parsed_scores = {}
-    weighted_scores = {}
-
-    llm_output = llm_output.strip()
-    if llm_output.startswith("```"):
-        llm_output = re.sub(r"^```(?:json)?", "", llm_output, flags=re.IGNORECASE).strip()
-        llm_output = re.sub(r"```$", "", llm_output).strip()
-    
-    try:
-        output_dict = json.loads(llm_output)
-    except json.JSONDecodeError as e:
-        with open("broken_llm_output.json", "w", encoding="utf-8") as f:
-            f.write(llm_output)
-        raise ValueError(f"Invalid JSON from LLM: {e}")
-
-    for dim, weight in dimensions.items():
-        if dim in output_dict and "score" in output_dict[dim]:
-            parsed_scores[dim] = int(output_dict[dim]["score"])
-            weighted_scores[dim] = parsed_scores[dim] * weight
-        else:
-            parsed_scores[dim] = None
-            weighted_scores[dim] = 0.0
-
-    weighted_total = sum(weighted_scores.values())
-    avg_score = weighted_total / len(dimensions)
-    normalized_pct = (weighted_total / 3.0) * 100
-
- 
-    summary_lines = []
-    for dim, weight in dimensions.items():
-        summary_lines.append(
-            f"{dim}: {parsed_scores[dim]} × {weight} = {weighted_scores[dim]:.2f}"
-        )
-    summary_lines.append(f"\nWeighted Total: {weighted_total:.2f}")
-    summary_lines.append(f"Average Score: {avg_score:.2f} out of 3.0")
-    summary_lines.append(f"Normalized Score: {normalized_pct:.2f}%")
-
-    return {
-        "normalized_score": normalized_pct,
-        "detailed_summary": "\n".join(summary_lines),
-        "raw_scores": parsed_scores,
-        "weighted_total": weighted_total,
-        "avg_score": avg_score
-    }
+    return score_output(get_rubric("ad_copy_trend"), llm_output)
 
 def evaluate_single_trend(datapoint, full_instruction_prompt, trend_index, total_trends, brand):
     """
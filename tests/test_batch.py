@@ -0,0 +1,90 @@
+"""Batch mode against tests/batch_stub_server.py: fallback, retries and re-attaching to a saved batch."""
+import asyncio
+import json
+
+import anthropic
+import httpx
+import pytest
+from anthropic.types import Message
+
+import modules.batch as batch
+import modules.rate_limiter as rate_limiter
+from modules.rubrics import RUBRICS
+from tests.batch_stub_server import start_stub_server
+
+
+def _judge_inputs(n):
+    return [({"trend": f"trend {i}"}, "Score the trend.", RUBRICS["ad_copy_trend"].dimensions) for i in range(n)]
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    """The stub server plus a batch module pointed at it, with saved batch ids under tmp_path."""
+    server, base_url = start_stub_server(error_every=3)
+    client = anthropic.AsyncAnthropic(api_key="test", base_url=base_url, max_retries=0)
+    monkeypatch.setattr(batch, "get_async_anthropic_client", lambda: client)
+    monkeypatch.setattr(batch, "BATCH_STATE_DIR", str(tmp_path / "batches"))
+    monkeypatch.setattr(batch, "BATCH_POLL_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY_SECONDS", 0.01)
+    yield server, client
+    server.shutdown()
+
+
+def test_errored_items_fall_back_and_state_is_removed(stub, tmp_path):
+    outputs = asyncio.run(batch.run_evaluation_batch(_judge_inputs(6)))
+    # the stub errors every 3rd request
+    assert [output is None for output in outputs] == [False, False, True, False, False, True]
+    assert all(json.loads(output) for output in outputs if output is not None)
+    assert list((tmp_path / "batches").glob("*.json")) == []
+
+
+def test_restart_reattaches_to_saved_batch(stub):
+    _, client = stub
+    requests = [{"custom_id": "item-0", "params": {"model": "m", "max_tokens": 10, "messages": []}}]
+
+    async def submit_twice():
+        limiter = rate_limiter.get_anthropic_rate_limiter()
+        return (await batch._submit_or_attach(client, limiter, requests),
+                await batch._submit_or_attach(client, limiter, requests))
+
+    first, second = asyncio.run(submit_twice())
+    assert first == second
+
+
+def test_create_is_retried_on_overload(stub):
+    _, client = stub
+    create = client.messages.batches.create
+    calls = []
+
+    async def flaky_create(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            response = httpx.Response(529, request=httpx.Request("POST", "http://stub/v1/messages/batches"))
+            raise anthropic.APIStatusError("Overloaded", response=response, body=None)
+        return await create(**kwargs)
+
+    client.messages.batches.create = flaky_create
+    outputs = asyncio.run(batch.run_evaluation_batch(_judge_inputs(2)))
+    assert len(calls) == 2
+    assert all(output is not None for output in outputs)
+
+
+def _message(content, stop_reason="end_turn"):
+    return Message.model_validate({
+        "id": "msg", "type": "message", "role": "assistant", "model": "m", "content": content,
+        "stop_reason": stop_reason, "stop_sequence": None, "usage": {"input_tokens": 1, "output_tokens": 1},
+    })
+
+
+@pytest.mark.parametrize("message, reason", [
+    (_message([{"type": "text", "text": '{"clarity": {"score": 4'}], "max_tokens"), "was cut off at max_tokens"),
+    (_message([{"type": "text", "text": '{"clarity": {"score": 4'}]), "returned unparseable JSON"),
+    (_message([{"type": "text", "text": "I cannot score this."}]), "returned non-JSON text"),
+])
+def test_unusable_replies_go_to_interactive_path(message, reason):
+    assert batch._usable_output(message) == (None, reason)
+
+
+def test_fenced_json_reply_is_used():
+    text = '```json\n{"clarity": {"score": 4}}\n```'
+    assert batch._usable_output(_message([{"type": "text", "text": text}])) == (text, None)
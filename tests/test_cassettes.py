@@ -0,0 +1,64 @@
+"""Record/replay cassettes through the 1.3 pipeline, with the fake LLM clients standing in for the APIs."""
+import json
+
+import pytest
+
+import modules.eval_functions as eval_functions
+import modules.get_company_context as get_company_context
+from eval_pipeline.eval_1_3 import pipeline
+from modules.cassettes import RECORD, REPLAY, CassetteMissError, CassetteStore
+from tests.benchmark import ad_copy_input
+from tests.fake_llm import FakeLLMConfig, install_fake_clients
+
+
+@pytest.fixture
+def fakes():
+    return install_fake_clients(FakeLLMConfig(latency="fixed:0.01", context_latency="fixed:0.01"))
+
+
+def _use_cassettes(monkeypatch, directory, mode):
+    store = CassetteStore(str(directory), mode=mode)
+    monkeypatch.setattr(eval_functions, "cassettes", store)
+    monkeypatch.setattr(get_company_context, "cassettes", store)
+    # every run asks for the brand context, instead of finding it cached by an earlier one
+    monkeypatch.setattr(get_company_context.context_cache, "get", lambda key: None)
+    return store
+
+
+def _run(tmp_path, payload, brand="Brand"):
+    input_path = tmp_path / "input.json"
+    input_path.write_text(json.dumps(payload), encoding="utf-8")
+    return pipeline(str(input_path), str(tmp_path / "output.csv"), brand, bypass_cache=True)
+
+
+def _record(tmp_path, monkeypatch, payload):
+    store = _use_cassettes(monkeypatch, tmp_path / "cassettes", RECORD)
+    _run(tmp_path, payload)
+    store.flush()
+
+
+def test_replay_serves_recorded_calls(tmp_path, monkeypatch, fakes):
+    fake_anthropic, fake_openai = fakes
+    _record(tmp_path, monkeypatch, ad_copy_input(4))
+    calls = (fake_anthropic.messages.stats["calls"], fake_openai.chat.completions.calls)
+
+    store = _use_cassettes(monkeypatch, tmp_path / "cassettes", REPLAY)
+    result = _run(tmp_path, ad_copy_input(4))
+    assert result["successful"] == 4
+    assert store.stats["misses"] == 0
+    assert (fake_anthropic.messages.stats["calls"], fake_openai.chat.completions.calls) == calls
+
+
+def test_judge_miss_fails_the_run(tmp_path, monkeypatch, fakes):
+    _record(tmp_path, monkeypatch, ad_copy_input(2))
+    store = _use_cassettes(monkeypatch, tmp_path / "cassettes", REPLAY)
+    with pytest.raises(CassetteMissError):
+        _run(tmp_path, ad_copy_input(2, tag="unrecorded "))
+    assert store.stats["misses"] >= 1
+
+
+def test_brand_context_miss_fails_the_run(tmp_path, monkeypatch, fakes):
+    _record(tmp_path, monkeypatch, ad_copy_input(2))
+    _use_cassettes(monkeypatch, tmp_path / "cassettes", REPLAY)
+    with pytest.raises(CassetteMissError):
+        _run(tmp_path, ad_copy_input(2), brand="Unrecorded Brand")
@@ -0,0 +1,79 @@
+"""Checkpoint log and resuming an interrupted or partly failed 1.3 run."""
+import json
+import asyncio
+
+import anthropic
+import httpx
+
+from eval_pipeline.eval_1_3 import pipeline
+from modules.checkpoint import Checkpoint, checkpoint_path_for, run_checkpointed
+from tests.benchmark import ad_copy_input
+from tests.fake_llm import FakeLLMConfig, install_fake_clients
+
+
+def test_resume_reloads_log_and_ignores_torn_line(tmp_path):
+    path = str(tmp_path / "out.csv.checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    checkpoint.record("trend:1:a", {"status": "success", "score": 1})
+    checkpoint.record("trend:2:b", {"status": "success", "score": 2})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "trend:3:c", "row": {"sta')
+
+    resumed = Checkpoint(path, resume=True)
+    assert resumed.completed == {"trend:1:a": {"status": "success", "score": 1},
+                                 "trend:2:b": {"status": "success", "score": 2}}
+    assert Checkpoint(path).completed == {}
+    assert not (tmp_path / "out.csv.checkpoint.jsonl").exists()
+
+
+def test_run_checkpointed_records_only_successes(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "log.jsonl"))
+
+    async def evaluate(status):
+        return {"status": status}
+
+    async def run():
+        await run_checkpointed(checkpoint, "ok", evaluate, "success")
+        await run_checkpointed(checkpoint, "bad", evaluate, "failed")
+        # a checkpointed key is not evaluated again
+        return await run_checkpointed(checkpoint, "ok", evaluate, "failed")
+
+    asyncio.run(run())
+    assert Checkpoint(checkpoint.path, resume=True).completed == {"ok": {"status": "success"}}
+
+
+def test_finish_keeps_log_while_items_failed(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "log.jsonl"))
+    checkpoint.record("ok", {"status": "success"})
+    assert checkpoint.finish(["success", "failed"]) is False
+    assert (tmp_path / "log.jsonl").exists()
+    assert checkpoint.finish(["success", "skipped"]) is True
+    assert not (tmp_path / "log.jsonl").exists()
+
+
+def test_pipeline_resume_retries_only_failed_trends(tmp_path):
+    payload = ad_copy_input(4)
+    input_path, output_path = tmp_path / "input.json", tmp_path / "output.csv"
+    input_path.write_text(json.dumps(payload), encoding="utf-8")
+
+    fake_anthropic, _ = install_fake_clients(FakeLLMConfig(latency="fixed:0.01", context_latency="fixed:0.01"))
+    reply = fake_anthropic.messages._reply
+
+    async def reject_trend_2(request):
+        if "trend 2" in request["messages"][0]["content"]:
+            response = httpx.Response(400, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+            raise anthropic.BadRequestError("rejected (injected)", response=response, body=None)
+        return await reply(request)
+
+    fake_anthropic.messages._reply = reject_trend_2
+    first = pipeline(str(input_path), str(output_path), "Brand", bypass_cache=True)
+    assert first["successful"] == 3
+    log = Checkpoint(checkpoint_path_for(str(output_path)), resume=True)
+    assert len(log.completed) == 3
+
+    fake_anthropic.messages._reply = reply
+    calls = fake_anthropic.messages.stats["calls"]
+    second = pipeline(str(input_path), str(output_path), "Brand", bypass_cache=True, resume=True)
+    assert second["successful"] == 4
+    assert fake_anthropic.messages.stats["calls"] == calls + 1
+    assert not (tmp_path / "output.csv.checkpoint.jsonl").exists()
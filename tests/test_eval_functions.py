@@ -0,0 +1,79 @@
+"""Early abort of streamed judge replies that cannot be JSON; judge call timing."""
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+
+import modules.eval_functions as eval_functions
+import modules.rate_limiter as rate_limiter
+from modules.metrics import metrics
+from modules.eval_functions import NonJSONResponseError, evaluate_async, json_prefix_verdict
+from tests.fake_llm import PROSE_REPLY, FakeLLMConfig, install_fake_clients
+
+DIMENSIONS = ["strategic", "non_obvious", "specificity", "impactful", "clarity", "actionable"]
+
+
+@pytest.mark.parametrize("prefix, verdict", [
+    ("", None), ("  \n", None), ('{"strategic"', True), ("[", True),
+    ("`", None), ("```", None), ("```js", None), ("```JSON\n{", True), ("```\n{", True),
+    ("I need", False), ("```python", False), ("```json\nSure", False),
+])
+def test_json_prefix_verdict(prefix, verdict):
+    assert json_prefix_verdict(prefix) is verdict
+
+
+@pytest.fixture
+def fake_anthropic(monkeypatch):
+    fake, _ = install_fake_clients(FakeLLMConfig(latency="fixed:0.05", prose=1.0))
+    streamed = []
+    stream = fake.messages.stream
+    monkeypatch.setattr(fake.messages, "stream", lambda **request: streamed.append(request) or stream(**request))
+    fake.streamed = streamed
+    return fake
+
+
+def test_prose_reply_is_aborted_after_its_first_chunk(fake_anthropic):
+    with pytest.raises(NonJSONResponseError) as raised:
+        asyncio.run(evaluate_async({"trend": "t"}, "Score this."))
+    assert len(fake_anthropic.streamed) == 1
+    # the first of the stream's 20 chunks decides it
+    assert PROSE_REPLY.startswith(raised.value.prefix)
+    assert len(raised.value.prefix) < len(PROSE_REPLY)
+
+
+def test_forced_score_tool_reply_is_not_streamed(fake_anthropic):
+    # the fake still answers in prose; unstreamed, it comes back whole instead of raising
+    reply = asyncio.run(evaluate_async({"trend": "t"}, "Score this.", score_dimensions=DIMENSIONS))
+    assert fake_anthropic.streamed == []
+    assert reply == PROSE_REPLY * 10
+
+
+def test_streaming_off_skips_the_early_abort(fake_anthropic, monkeypatch):
+    monkeypatch.setattr(eval_functions, "STREAM_EARLY_ABORT_ENABLED", False)
+    assert asyncio.run(evaluate_async({"trend": "t"}, "Score this.")) == PROSE_REPLY * 10
+    assert fake_anthropic.streamed == []
+
+
+def test_call_latency_excludes_rate_limiter_backoff(fake_anthropic, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY_SECONDS", 0.001)
+    reply = fake_anthropic.messages._reply
+    rejected = []
+
+    async def rate_limited_once(request):
+        if not rejected:
+            rejected.append(request)
+            response = httpx.Response(429, headers={"retry-after-ms": "300"},
+                                      request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+            raise anthropic.RateLimitError("rate limited", response=response, body=None)
+        return await reply(request)
+
+    monkeypatch.setattr(fake_anthropic.messages, "_reply", rate_limited_once)
+    with metrics.job_scope("timing", "test") as job:
+        asyncio.run(evaluate_async({"trend": "t"}, "Score this.", score_dimensions=DIMENSIONS))
+    summary = job.summary()
+
+    judge = summary["calls"]["evaluate"]
+    assert (judge["count"], judge["errors"]) == (2, 1)
+    assert judge["latency"]["max_seconds"] < 0.3
+    assert summary["stages"][eval_functions.RATE_LIMIT_WAIT_STAGE]["total_seconds"] >= 0.3
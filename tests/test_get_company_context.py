@@ -0,0 +1,35 @@
+"""Concurrent sync brand-context lookups share one fetch and leave no per-brand lock behind."""
+import time
+import uuid
+import threading
+
+import modules.get_company_context as get_company_context
+
+
+def test_concurrent_lookups_share_one_fetch_and_drop_their_lock(monkeypatch):
+    fetched = []
+
+    def fetch(company_name):
+        fetched.append(company_name)
+        time.sleep(0.05)
+        return f"{company_name} context"
+
+    monkeypatch.setattr(get_company_context, "_fetch_company_context", fetch)
+    brand = f"Brand {uuid.uuid4().hex}"
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_company_context.get_company_context(brand)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [f"{brand} context"] * 8
+    assert fetched == [brand]
+    assert get_company_context._sync_inflight == {}
+
+    get_company_context.get_company_context(brand, refresh=True)
+    assert len(fetched) == 2
+    assert get_company_context._sync_inflight == {}
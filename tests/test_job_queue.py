@@ -0,0 +1,76 @@
+"""SQLite job queue: claiming, re-queueing after a restart, the attempts cap and job status."""
+import asyncio
+
+import pytest
+
+from modules.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobStore, job_summary
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+    yield store
+    store.close()
+
+
+def _enqueue(store, job_id, pipeline="ad_copy"):
+    store.enqueue(job_id, pipeline, "Brand", "2026-01-01", f"/in/{job_id}.json", f"/out/{job_id}.csv")
+
+
+def test_claim_next_takes_oldest_queued_job_of_eligible_pipelines(store):
+    _enqueue(store, "a", pipeline="keyword")
+    _enqueue(store, "b")
+    _enqueue(store, "c")
+
+    job = store.claim_next(["ad_copy"])
+    assert (job["job_id"], job["status"], job["attempts"]) == ("b", RUNNING, 1)
+    assert store.get("b")["status"] == RUNNING
+    assert store.claim_next(["ad_copy"])["job_id"] == "c"
+    assert store.claim_next(["ad_copy"]) is None
+    assert store.claim_next([]) is None
+    assert store.get("a")["status"] == QUEUED
+
+
+def test_requeue_interrupted_until_max_attempts(store):
+    _enqueue(store, "a")
+    store.claim_next(["ad_copy"])
+
+    # first restart: one attempt so far, back in the queue
+    assert store.requeue_interrupted() == 1
+    job = store.get("a")
+    assert (job["status"], job["started_at"], job["attempts"]) == (QUEUED, None, 1)
+
+    # second attempt interrupted too: max_attempts=2 reached, so it fails
+    assert store.claim_next(["ad_copy"])["attempts"] == 2
+    assert store.requeue_interrupted() == 0
+    job = store.get("a")
+    assert job["status"] == FAILED
+    assert "Interrupted 2 times" in job["error"]
+    assert job["finished_at"] is not None
+
+
+def test_queue_runs_jobs_and_records_status(store):
+    async def ok(job):
+        return {"total_items": 3}
+
+    async def broken(job):
+        raise RuntimeError("bad input")
+
+    async def run():
+        queue = JobQueue(store, {"ad_copy": ok, "keyword": broken}, workers=2)
+        await queue.start()
+        queue.submit("good", "ad_copy", "Brand", None, "/in/good.json", "/out/good.csv")
+        queue.submit("bad", "keyword", "Brand", None, "/in/bad.json", "/out/bad.csv")
+        for _ in range(200):
+            if all(store.get(job_id)["status"] in (SUCCEEDED, FAILED) for job_id in ("good", "bad")):
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(run())
+    good, bad = job_summary(store.get("good")), job_summary(store.get("bad"))
+    assert (good["status"], good["result"], good["attempts"]) == (SUCCEEDED, {"total_items": 3}, 1)
+    assert good["timings"]["run_seconds"] is not None
+    assert (bad["status"], bad["error"]) == (FAILED, "bad input")
+    with pytest.raises(ValueError):
+        JobQueue(store, {"ad_copy": ok}).submit("x", "unknown", "Brand", None, "/in", "/out")
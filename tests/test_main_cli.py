@@ -0,0 +1,52 @@
+"""Smoke tests of the main/ CLI entry points against the fake LLM clients."""
+import json
+
+import pytest
+
+from tests.benchmark import ad_copy_input, keyword_input
+from tests.fake_llm import FakeLLMConfig, install_fake_clients
+
+
+@pytest.fixture(autouse=True)
+def fake_clients():
+    from modules.metrics import metrics
+
+    install_fake_clients(FakeLLMConfig(latency="fixed:0.01", context_latency="fixed:0.01"))
+    metrics.reset()
+
+
+def _run_cli(cli, tmp_path, monkeypatch, payload):
+    input_path = tmp_path / "input.json"
+    input_path.write_text(json.dumps(payload), encoding="utf-8")
+    output_path = tmp_path / "output.csv"
+    pipeline = cli.pipeline
+    # the scripts hard-code their paths; run the real pipeline on temporary ones
+    monkeypatch.setattr(cli, "pipeline", lambda _in, _out, brand: pipeline(
+        str(input_path), str(output_path), brand, bypass_cache=True
+    ))
+    monkeypatch.setattr(cli, "verify_langfuse_connection", lambda: True)
+    cli.main()
+    return output_path.read_text(encoding="utf-8").splitlines()[0]
+
+
+def test_main_1_2_completes_and_prints_call_summary(tmp_path, monkeypatch, capsys):
+    import main.main_1_2 as cli
+
+    header = _run_cli(cli, tmp_path, monkeypatch, keyword_input(12))
+    # the column order of the original DataFrame output, "trend" last
+    assert header == "type,summary,normalized_score,score_summary,reasoning,status,trend"
+    out = capsys.readouterr().out
+    assert "EVALUATION COMPLETED SUCCESSFULLY" in out
+    assert "Datapoints processed: 12" in out
+    assert "Evaluation failed" not in out
+    assert "    evaluate: 12 calls, 0 errors" in out
+
+
+def test_main_1_3_completes_and_prints_call_summary(tmp_path, monkeypatch, capsys):
+    import main.main_1_3 as cli
+
+    _run_cli(cli, tmp_path, monkeypatch, ad_copy_input(5))
+    out = capsys.readouterr().out
+    assert "EVALUATION COMPLETED SUCCESSFULLY" in out
+    assert "Trends processed: 5" in out
+    assert "    evaluate: 5 calls, 0 errors" in out
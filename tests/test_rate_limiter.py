@@ -0,0 +1,100 @@
+"""AdaptiveRateLimiter: AIMD concurrency window, retry-after and retry policy."""
+import time
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+
+import modules.rate_limiter as rate_limiter
+from modules.rate_limiter import AdaptiveRateLimiter, backoff_delay, retry_after_seconds
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY_SECONDS", 0.001)
+
+
+def _error(status, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+    if status == 429:
+        return anthropic.RateLimitError("rate limited", response=response, body=None)
+    return anthropic.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+def _flaky(*errors, result="ok"):
+    """A call raising `errors` in turn, then returning `result`; counts its attempts."""
+    remaining = list(errors)
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    return call, attempts
+
+
+def test_window_is_halved_on_429_then_grows_additively():
+    limiter = AdaptiveRateLimiter(max_concurrency=8)
+    call, attempts = _flaky(_error(429))
+    assert asyncio.run(limiter.run(call)) == "ok"
+    assert len(attempts) == 2
+    assert limiter.rate_limited_count == 1
+    # halved to 4, then +1/window for the success
+    assert limiter.concurrency_limit == pytest.approx(4 + 1 / 4)
+
+    for _ in range(3):
+        asyncio.run(limiter.run(_flaky()[0]))
+    assert 4.25 < limiter.concurrency_limit < 5
+
+
+def test_additive_increase_stops_at_max_and_decrease_at_min():
+    limiter = AdaptiveRateLimiter(max_concurrency=3, min_concurrency=2)
+    limiter.concurrency_limit = 2.0
+
+    async def successes():
+        for _ in range(50):
+            await limiter.run(_flaky()[0])
+
+    asyncio.run(successes())
+    assert limiter.concurrency_limit == 3
+
+    limiter._on_backoff_signal()
+    assert limiter.concurrency_limit == 2
+
+
+def test_burst_of_429s_counts_as_one_decrease():
+    limiter = AdaptiveRateLimiter(max_concurrency=16)
+    call, attempts = _flaky(_error(429), _error(529), _error(429))
+    asyncio.run(limiter.run(call))
+    assert len(attempts) == 4
+    assert limiter.rate_limited_count == 3
+    assert int(limiter.concurrency_limit) == 8
+
+
+def test_retry_after_is_honoured():
+    assert retry_after_seconds(_error(429, {"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(_error(429)) is None
+    assert backoff_delay(0, _error(429, {"retry-after": "3"})) >= 3.0
+
+    limiter = AdaptiveRateLimiter()
+    call, attempts = _flaky(_error(429, {"retry-after-ms": "200"}))
+    asyncio.run(limiter.run(call))
+    assert attempts[1] - attempts[0] >= 0.2
+
+
+def test_non_retryable_errors_and_exhausted_retries_raise():
+    limiter = AdaptiveRateLimiter(max_retries=2)
+    call, attempts = _flaky(_error(400))
+    with pytest.raises(anthropic.APIStatusError):
+        asyncio.run(limiter.run(call))
+    assert len(attempts) == 1
+
+    call, attempts = _flaky(_error(500), _error(503), _error(500))
+    with pytest.raises(anthropic.APIStatusError):
+        asyncio.run(limiter.run(call))
+    assert len(attempts) == 3
+    assert limiter.in_flight == 0
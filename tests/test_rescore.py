@@ -0,0 +1,58 @@
+"""Re-scoring from stored CSVs and when a saved --matrix is reused or rebuilt."""
+import os
+import json
+
+import pandas as pd
+
+from modules.rescore import main
+
+DIMENSIONS = ["strategic", "non_obvious", "specificity", "impactful", "clarity", "actionable"]
+
+
+def _write_results(path, scores):
+    rows = [
+        {"type": "trend", "trend": f"trend {i}", "normalized_score": "",
+         "reasoning": json.dumps({dim: {"score": score} for dim in DIMENSIONS})}
+        for i, score in enumerate(scores)
+    ]
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def _rescore(capsys, *args):
+    rescored = main(["--rubric", "ad_copy_trend", *args])
+    return rescored, capsys.readouterr().out
+
+
+def test_matrix_is_reused_until_a_source_changes(tmp_path, capsys):
+    csv_path, matrix = str(tmp_path / "results.csv"), str(tmp_path / "scores.npz")
+    _write_results(csv_path, [3, 2])
+
+    rescored, out = _rescore(capsys, "--matrix", matrix, csv_path)
+    assert "Parsed 2 scored rows" in out and "Saved score matrix" in out
+    assert rescored["normalized_score"].round(2).tolist() == [100.0, 66.67]
+
+    _, out = _rescore(capsys, "--matrix", matrix, csv_path)
+    assert "Loaded 2 scored rows" in out
+    # without CSV arguments the recorded sources are re-checked
+    _, out = _rescore(capsys, "--matrix", matrix)
+    assert "Loaded 2 scored rows" in out
+
+    _write_results(csv_path, [1, 1, 1])
+    os.utime(csv_path, ns=(0, os.stat(csv_path).st_mtime_ns + 10 ** 9))
+    rescored, out = _rescore(capsys, "--matrix", matrix)
+    assert "Rebuilding" in out and "a CSV changed" in out
+    assert len(rescored) == 3
+
+
+def test_matrix_is_rebuilt_for_another_row_type_or_other_csvs(tmp_path, capsys):
+    csv_path, other_path, matrix = str(tmp_path / "a.csv"), str(tmp_path / "b.csv"), str(tmp_path / "scores.npz")
+    _write_results(csv_path, [3])
+    _write_results(other_path, [2, 2])
+    _rescore(capsys, "--matrix", matrix, csv_path)
+
+    _, out = _rescore(capsys, "--matrix", matrix, "--row-type", "trend", csv_path)
+    assert "Rebuilding" in out and "row type" in out
+
+    rescored, out = _rescore(capsys, "--matrix", matrix, "--row-type", "trend", other_path)
+    assert "Rebuilding" in out and "other CSVs" in out
+    assert len(rescored) == 2
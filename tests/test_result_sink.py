@@ -0,0 +1,38 @@
+"""ResultSink ordering and the bound on rows held back behind a slow one."""
+import csv
+import json
+import asyncio
+
+from modules.concurrency import gather_bounded
+from modules.result_sink import ResultSink
+
+
+def test_rows_are_written_in_input_order(tmp_path):
+    csv_path, ndjson_path = tmp_path / "out.csv", tmp_path / "out.ndjson"
+    with ResultSink(["i", "v"], csv_path=str(csv_path), ndjson_path=str(ndjson_path)) as sink:
+        for i in (2, 0, 3, 1):
+            sink.add(i, {"i": i, "v": f"row {i}"})
+        assert sink.rows_written == 4
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        assert [row["i"] for row in csv.DictReader(f)] == ["0", "1", "2", "3"]
+    assert [json.loads(line)["i"] for line in ndjson_path.read_text(encoding="utf-8").splitlines()] == [0, 1, 2, 3]
+
+
+def test_slow_row_holds_back_at_most_max_pending_rows(tmp_path):
+    pending_sizes = []
+
+    async def run():
+        with ResultSink(["i"], csv_path=str(tmp_path / "out.csv"), max_pending=3) as sink:
+            async def produce(i):
+                await sink.wait_for_room(i)
+                await asyncio.sleep(0.2 if i == 0 else 0.001)
+                sink.add(i, {"i": i})
+                pending_sizes.append(len(sink._pending))
+
+            await gather_bounded(produce, [(i,) for i in range(50)], max_concurrency=8)
+            return sink.rows_written
+
+    assert asyncio.run(run()) == 50
+    # rows 1 and 2 wait behind row 0; row 3 does not start until row 0 is written
+    assert max(pending_sizes) == 2
@@ -0,0 +1,36 @@
+"""Rubric scoring and where unparseable judge replies are dumped."""
+import json
+
+import pytest
+
+from modules.rubrics import get_rubric, score_output
+
+
+def test_score_output_weights_and_normalizes():
+    rubric = get_rubric("keyword_summary")
+    reply = "```json\n" + json.dumps({"clarity": {"score": 3}, "coverage": {"score": 2}, "correctness": {"score": 1}}) + "\n```"
+    result = score_output(rubric, reply)
+    assert result["raw_scores"] == {"clarity": 3, "coverage": 2, "correctness": 1}
+    assert result["weighted_total"] == pytest.approx(3 * 0.33 + 2 * 0.34 + 1 * 0.33)
+    assert result["normalized_score"] == pytest.approx(result["weighted_total"] / 3 * 100)
+
+
+@pytest.mark.parametrize("rubric_name, dump_name", [
+    ("ad_copy_trend", "broken_llm_output.json"),
+    ("keyword_trend", "broken_llm_output_1_2.json"),
+    ("keyword_summary", "broken_llm_output_1_2.json"),
+    ("keyword_news", None),
+])
+def test_invalid_reply_is_dumped_to_the_rubrics_path(tmp_path, monkeypatch, rubric_name, dump_name):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match="Invalid JSON"):
+        score_output(get_rubric(rubric_name), '{"strategic": {"score": 3')
+    assert [p.name for p in tmp_path.iterdir()] == ([dump_name] if dump_name else [])
+    if dump_name:
+        assert (tmp_path / dump_name).read_text(encoding="utf-8") == '{"strategic": {"score": 3'
+
+
+@pytest.mark.parametrize("reply", ["[1, 2, 3]", '"all good"', "3"])
+def test_reply_that_is_not_an_object_raises_value_error(reply):
+    with pytest.raises(ValueError, match="not an object"):
+        score_output(get_rubric("ad_copy_trend"), reply)
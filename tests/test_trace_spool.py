@@ -0,0 +1,54 @@
+"""The Langfuse span spool, end to end against tests/langfuse_stub_collector.py."""
+import os
+import sys
+import subprocess
+import textwrap
+
+from tests.langfuse_stub_collector import start_stub_collector
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import sys
+    import threading
+    sys.path.insert(0, {repo_root!r})
+    import modules.tracing as tracing
+
+    def exporter_running():
+        return any(t.name == "langfuse-spool-exporter" for t in threading.enumerate())
+
+    print("exporter after import:", exporter_running())
+
+    @tracing.traced(as_type="span", name="Outer")
+    def outer():
+        return inner()
+
+    @tracing.traced(as_type="generation", name="Inner")
+    def inner():
+        return "x"
+
+    outer()
+    tracing.flush_tracing(timeout=5)
+    print("exporter after spans:", exporter_running())
+""")
+
+
+def test_spans_go_through_the_spool_once_and_exporter_starts_lazily(tmp_path):
+    server, collector, base_url = start_stub_collector()
+    try:
+        env = dict(
+            os.environ, LANGFUSE_HOST=base_url, LANGFUSE_PUBLIC_KEY="pk-test", LANGFUSE_SECRET_KEY="sk-test",
+            EVAL_DATA_DIR=str(tmp_path),
+        )
+        script = SCRIPT.format(repo_root=REPO_ROOT)
+        result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=60)
+    finally:
+        server.shutdown()
+
+    assert result.returncode == 0, result.stderr
+    assert "exporter after import: False" in result.stdout
+    assert "exporter after spans: True" in result.stdout
+    # exported by the spool only; the SDK's own processor is blocked
+    assert collector.stats["span_names"] == {"Outer": 1, "Inner": 1}
+    assert collector.stats["failed_requests"] == 0
+    assert os.listdir(tmp_path / "langfuse_spool") == []
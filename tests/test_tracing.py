@@ -0,0 +1,16 @@
+"""Trace capture modes: what a traced span records of its input and output."""
+from modules.tracing import CAPTURE_MAX_CHARS, capture_modes, reduce_payload
+
+
+def test_generation_output_is_kept_whole_by_default():
+    assert capture_modes("Claude LLM Call", capture_input="off", as_type="generation") == ("off", "full")
+    assert capture_modes("Some Span") == ("truncate", "truncate")
+    assert capture_modes("Some Chain", capture_input="hash", as_type="chain") == ("hash", "truncate")
+
+
+def test_reduce_payload_modes():
+    reply = "x" * (CAPTURE_MAX_CHARS + 500)
+    assert reduce_payload(reply, "full") == reply
+    assert reduce_payload(reply, "off") is None
+    assert reduce_payload(reply, "truncate").endswith(f"... [{len(reply)} chars]")
+    assert reduce_payload({"reply": reply}, "hash")["reply"].startswith("sha256:")